@@ -0,0 +1,294 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Benchmarks of deep archive generation on synthetic bundles.
+
+For each combination of bundle sizes given on the command line, this makes a synthetic bundle (see
+``synthbundle``) and times, in a fresh process so that peak memory is its own:
+
+• ``comprehend``: cataloging the bundle with ``comprehenddirectory``
+• ``resolve``: resolving references from the bundle label with ``resolvelabels``
+• ``hashing``: computing the MD5 digest of every file, with nothing cached
+• ``aip``: making the AIP end to end—manifests, digests, and label—as ``pds-deep-archive`` does
+• ``sip``: then making the SIP end to end, re-using the AIP's digests as ``pds-deep-archive`` does
+• ``registry``: optionally, making a deep archive from a stand-in PDS API serving the bundle
+
+Results, including wall clock and CPU time of each phase and peak resident set size (``null`` where
+there's no ``resource`` module to tell it), go out as JSON so they can be compared from run to run.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from pds2.aipgen import VERSION
+from pds2.aipgen.aip import process as aipprocess
+from pds2.aipgen.hashing import digestfile
+from pds2.aipgen.hashing import DigestStore
+from pds2.aipgen.interfaces import IDigestStore
+from pds2.aipgen.registry import generatedeeparchive
+from pds2.aipgen.sip import produce as sipprocess
+from pds2.aipgen.standin import Registry
+from pds2.aipgen.standin import StandInServer
+from pds2.aipgen.utils import comprehenddirectory
+from pds2.aipgen.utils import createschema
+from pds2.aipgen.utils import getdigest
+from pds2.aipgen.utils import getlabelinfo
+from pds2.aipgen.utils import labelcache
+from pds2.aipgen.utils import resolvelabels
+from synthbundle import makebundle
+from zope.component import getGlobalSiteManager  # type: ignore
+from zope.component import provideUtility  # type: ignore
+
+try:
+    import resource
+except ImportError:  # There's no ``resource`` on Windows, so no peak memory there
+    resource = None  # type: ignore
+
+# Constants
+# ---------
+
+_baseurl = "https://pds.example.org/data/"  # For SIPs
+_site = "PDS_ATM"  # For labels
+_rssunits = 1 if sys.platform == "darwin" else 1024  # ``ru_maxrss`` is bytes on macOS, KiB elsewhere
+
+# Logging:
+_logger = logging.getLogger("benchmark")
+
+
+# Classes
+# -------
+
+
+class _Phases(object):
+    """Times phases of a benchmark run, noting wall clock and CPU time and peak memory after each."""
+
+    def __init__(self):
+        """Start with no phases timed."""
+        self.results = {}
+
+    def time(self, name, function, *args, **kwargs):
+        """Time calling ``function`` with ``args`` and ``kwargs`` as the phase ``name``; return what it returns."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = function(*args, **kwargs)
+        self.results[name] = {
+            "wall": time.perf_counter() - wall,
+            "cpu": time.process_time() - cpu,
+            "peak_rss": _peakrss(),
+        }
+        _logger.info("⏱ %s took %.3f s", name, self.results[name]["wall"])
+        return result
+
+
+# Functions
+# ---------
+
+
+def _peakrss():
+    """Return the peak resident set size of this process so far, in bytes, or ``None`` if we can't tell."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _rssunits
+
+
+def _hashall(filepaths):
+    """Digest every file in ``filepaths`` and return how many bytes that was."""
+    total = 0
+    for filepath in filepaths:
+        digestfile(filepath, ("md5",))
+        total += os.path.getsize(filepath)
+    return total
+
+
+def _registry(bundledir, lidvid, allcollections):
+    """Make a deep archive of ``lidvid`` in ``bundledir`` from a stand-in PDS API; return the seconds to make it."""
+    server = StandInServer(("127.0.0.1", 0), Registry.fromdirectory(bundledir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        start = time.perf_counter()
+        generatedeeparchive(server.url, lidvid, _site, allcollections)
+        return time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run(parameters):
+    """Run one benchmark with the given ``parameters`` (a dict) and return the results (another dict)."""
+    logging.basicConfig(level=parameters["loglevel"], format="%(levelname)s %(message)s")
+    logging.getLogger("pds2").setLevel(logging.WARNING)
+    workdir, phases = tempfile.mkdtemp(prefix="benchmark"), _Phases()
+    allcollections = not parameters["latest_only"]
+    try:
+        bundledir = os.path.join(workdir, "bundle")
+        bundlefn = phases.time(
+            "generate",
+            makebundle,
+            bundledir,
+            parameters["collections"],
+            parameters["products"],
+            parameters["file_size"],
+            parameters["versions"],
+            parameters["lid_only"],
+        )
+        con = sqlite3.connect(os.path.join(workdir, "catalog.sqlite3"))
+        with con:
+            createschema(con)
+        phases.time("comprehend", comprehenddirectory, bundledir, con, parameters["workers"])
+        info = getlabelinfo(bundlefn)
+        labels = phases.time("resolve", resolvelabels, con, info.lid, info.vid, allcollections)
+        filepaths = sorted(
+            {
+                row[0]
+                for lidvid in labels
+                for row in con.execute("SELECT filepath FROM label_file_references WHERE lid = ? AND vid = ?", lidvid)
+            }
+        )
+        size = phases.time("hashing", _hashall, filepaths)
+
+        # Now as ``pds-deep-archive`` does it, starting over with cold caches
+        getdigest.cache_clear()
+        labelcache.clear()
+        outdir = os.path.join(workdir, "out")
+        os.mkdir(outdir)
+        cwd, store = os.getcwd(), DigestStore(("md5",))
+        provideUtility(store)
+        os.chdir(outdir)
+        try:
+            ts = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0, tzinfo=None)
+            with open(bundlefn, "rb") as bundle:
+                dummy, dummy, aiplabel = phases.time("aip", aipprocess, bundle, allcollections, con, ts)
+                with open(aiplabel, "rb") as aipstream:
+                    phases.time(
+                        "sip", sipprocess, bundle, "md5", None, False, _site, _baseurl, aipstream, allcollections, con, ts
+                    )
+        finally:
+            os.chdir(cwd)
+            getGlobalSiteManager().unregisterUtility(store, IDigestStore)
+        con.close()
+
+        if parameters["registry"]:
+            lidvid = f"{info.lid}::{info.vid}"
+            os.chdir(outdir)
+            try:
+                elapsed = _registry(bundledir, lidvid, allcollections)
+            finally:
+                os.chdir(cwd)
+            phases.results["registry"] = {"wall": elapsed, "peak_rss": _peakrss()}
+            _logger.info("⏱ registry took %.3f s", elapsed)
+
+        hashing = phases.results["hashing"]["wall"]
+        return {
+            "parameters": {k: v for k, v in parameters.items() if k != "loglevel"},
+            "labels": len(labels),
+            "files": len(filepaths),
+            "bytes": size,
+            "hashing_mb_per_s": size / hashing / 1e6 if hashing else None,
+            "phases": phases.results,
+            "peak_rss": _peakrss(),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    """Check the command line, run the benchmarks it asks for, and write their results as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark deep archive generation on synthetic bundles")
+    parser.add_argument("--collections", type=int, nargs="+", default=[4], metavar="N", help="Numbers of collections")
+    parser.add_argument(
+        "--products", type=int, nargs="+", default=[1000], metavar="N", help="Numbers of products per collection"
+    )
+    parser.add_argument("--file-size", type=int, default=1024, metavar="BYTES", help="Bytes per data file")
+    parser.add_argument("--versions", type=int, default=1, metavar="N", help="Versions of each collection")
+    parser.add_argument("--lid-only", action="store_true", help="Refer to collections by lid only")
+    parser.add_argument("--latest-only", action="store_true", help="Include only the latest of lid-only collections")
+    parser.add_argument("--workers", type=int, default=1, metavar="N", help="Processes to comprehend labels with")
+    parser.add_argument("--registry", action="store_true", help="Also time registry mode against a stand-in PDS API")
+    parser.add_argument("--repeat", type=int, default=1, metavar="N", help="Times to run each benchmark")
+    parser.add_argument("-o", "--output", metavar="RESULTS.JSON", help="Where to write results; default stdout")
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_const",
+        dest="loglevel",
+        const=logging.WARNING,
+        default=logging.INFO,
+        help="Don't log progress",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=args.loglevel, format="%(levelname)s %(message)s")
+
+    runs, context = [], multiprocessing.get_context("spawn")
+    for collections, products, repetition in itertools.product(args.collections, args.products, range(args.repeat)):
+        parameters = {
+            "collections": collections,
+            "products": products,
+            "file_size": args.file_size,
+            "versions": args.versions,
+            "lid_only": args.lid_only,
+            "latest_only": args.latest_only,
+            "workers": args.workers,
+            "registry": args.registry,
+            "loglevel": args.loglevel,
+        }
+        _logger.info("🏁 %d collections × %d products, run %d", collections, products, repetition + 1)
+        # A fresh process for every run so each gets its own peak memory and cold caches
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            runs.append(executor.submit(run, parameters).result())
+
+    results = {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w") as o:
+            json.dump(results, o, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Synthetic PDS4 bundles for benchmarking.
+
+This makes bundles of any size: a bundle label referring to ``collections`` product collections,
+each of which (in each of ``versions`` versions) lists up to ``products`` observational products
+in its inventory, and each product has a label and a data file of ``filesize`` bytes. Later versions
+of a collection list more of the products, the way bundles tend to grow. The bundle refers to its
+collections by lid only or by lidvid.
+
+Run this as a program to make a bundle you can then try with ``pds-deep-archive`` yourself; it prints
+the path of the new bundle's label on the standard output, so you can say, for example::
+
+    pds-deep-archive --site PDS_ATM --bundle-base-url https://example.org/ --disable-url-validation \
+        $(python synthbundle.py /tmp/bundle)
+"""
+import argparse
+import os
+import random
+import sys
+
+
+# Constants
+# ---------
+
+_lidprefix = "urn:nasa:pds:synthetic"  # Logical identifiers of everything we make start with this
+_blocksize = 2 ** 16  # Size of the block of random bytes data files are made from
+_pdsnamespace = "http://pds.nasa.gov/pds4/pds/v1"  # For the labels
+
+_bundlelabel = """<?xml version="1.0" encoding="UTF-8"?>
+<Product_Bundle xmlns="{ns}">
+    <Identification_Area>
+        <logical_identifier>{lid}</logical_identifier>
+        <version_id>1.0</version_id>
+        <title>Synthetic Bundle of {collections} Collections</title>
+        <information_model_version>1.11.0.0</information_model_version>
+        <product_class>Product_Bundle</product_class>
+    </Identification_Area>
+    <Bundle>
+        <bundle_type>Archive</bundle_type>
+    </Bundle>
+    <File_Area_Text>
+        <File>
+            <file_name>readme.txt</file_name>
+        </File>
+    </File_Area_Text>
+{members}</Product_Bundle>
+"""
+_memberentry = """    <Bundle_Member_Entry>
+        <{kind}>{reference}</{kind}>
+        <member_status>Primary</member_status>
+        <reference_type>bundle_has_data_collection</reference_type>
+    </Bundle_Member_Entry>
+"""
+_collectionlabel = """<?xml version="1.0" encoding="UTF-8"?>
+<Product_Collection xmlns="{ns}">
+    <Identification_Area>
+        <logical_identifier>{lid}</logical_identifier>
+        <version_id>{vid}</version_id>
+        <title>Synthetic Collection {lid}</title>
+        <information_model_version>1.11.0.0</information_model_version>
+        <product_class>Product_Collection</product_class>
+    </Identification_Area>
+    <Collection>
+        <collection_type>Data</collection_type>
+    </Collection>
+    <File_Area_Inventory>
+        <File>
+            <file_name>{inventory}</file_name>
+        </File>
+    </File_Area_Inventory>
+</Product_Collection>
+"""
+_productlabel = """<?xml version="1.0" encoding="UTF-8"?>
+<Product_Observational xmlns="{ns}">
+    <Identification_Area>
+        <logical_identifier>{lid}</logical_identifier>
+        <version_id>1.0</version_id>
+        <title>Synthetic Product {lid}</title>
+        <information_model_version>1.11.0.0</information_model_version>
+        <product_class>Product_Observational</product_class>
+    </Identification_Area>
+    <File_Area_Observational>
+        <File>
+            <file_name>{datafile}</file_name>
+        </File>
+    </File_Area_Observational>
+</Product_Observational>
+"""
+
+
+# Functions
+# ---------
+
+
+def makebundle(dn, collections=4, products=100, filesize=1024, versions=1, lidonly=False, seed=0):
+    """Make a synthetic bundle.
+
+    Make a bundle as described in this module's docstring in a new directory ``dn`` and return the
+    path to its bundle label. Data files are made from random bytes from a generator seeded with
+    ``seed`` so the same arguments always make the same bundle.
+    """
+    os.makedirs(dn)
+    block = random.Random(seed).randbytes(_blocksize)
+    with open(os.path.join(dn, "readme.txt"), "w") as o:
+        o.write("This bundle is synthetic and for benchmarking only.\n")
+    members = []
+    for c in range(collections):
+        collectionlid, cdn = f"{_lidprefix}:collection_{c}", os.path.join(dn, f"collection_{c}")
+        os.makedirs(os.path.join(cdn, "data"))
+        for p in range(products):
+            _makeproduct(os.path.join(cdn, "data"), f"{collectionlid}:product_{p}", f"product_{p}", filesize, block)
+        for v in range(1, versions + 1):
+            vid, inventory = f"{v}.0", f"collection_{c}_inventory_v{v}.csv"
+            with open(os.path.join(cdn, inventory), "w", newline="") as o:
+                # Each version lists more of the products, ending with all of them
+                for p in range(-(-products * v // versions)):
+                    o.write(f"P,{collectionlid}:product_{p}::1.0\r\n")
+            with open(os.path.join(cdn, f"collection_{c}_v{v}.xml"), "w") as o:
+                o.write(_collectionlabel.format(ns=_pdsnamespace, lid=collectionlid, vid=vid, inventory=inventory))
+            if not lidonly:
+                members.append(_memberentry.format(kind="lidvid_reference", reference=f"{collectionlid}::{vid}"))
+        if lidonly:
+            members.append(_memberentry.format(kind="lid_reference", reference=collectionlid))
+    bundlefn = os.path.join(dn, "bundle.xml")
+    with open(bundlefn, "w") as o:
+        o.write(_bundlelabel.format(ns=_pdsnamespace, lid=_lidprefix, collections=collections, members="".join(members)))
+    return bundlefn
+
+
+def _makeproduct(dn, lid, name, filesize, block):
+    """Make a product with logical identifier ``lid`` in ``dn`` with label and data files named after ``name``.
+
+    The data file is ``filesize`` bytes made from the ``block``, starting with the ``lid`` so every
+    file's digest differs.
+    """
+    datafile = name + ".dat"
+    with open(os.path.join(dn, name + ".xml"), "w") as o:
+        o.write(_productlabel.format(ns=_pdsnamespace, lid=lid, datafile=datafile))
+    with open(os.path.join(dn, datafile), "wb") as o:
+        data = lid.encode("utf-8")[:filesize]
+        o.write(data)
+        remaining = filesize - len(data)
+        while remaining > 0:
+            chunk = block[:remaining]
+            o.write(chunk)
+            remaining -= len(chunk)
+
+
+def main():
+    """Make a synthetic bundle in the directory named on the command line and print the path to its label."""
+    parser = argparse.ArgumentParser(description="Make a synthetic PDS4 bundle for benchmarking")
+    parser.add_argument("--collections", type=int, default=4, help="Number of collections [%(default)s]")
+    parser.add_argument("--products", type=int, default=100, help="Products per collection [%(default)s]")
+    parser.add_argument("--file-size", type=int, default=1024, help="Bytes per data file [%(default)s]")
+    parser.add_argument("--versions", type=int, default=1, help="Versions of each collection [%(default)s]")
+    parser.add_argument("--lid-only", action="store_true", help="Refer to collections by lid only, not lidvid")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the contents of data files [%(default)s]")
+    parser.add_argument("directory", help="New directory to make the bundle in")
+    args = parser.parse_args()
+    bundlefn = makebundle(
+        args.directory, args.collections, args.products, args.file_size, args.versions, args.lid_only, args.seed
+    )
+    print(bundlefn)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -35,11 +35,13 @@ import shutil
 import sqlite3
 import sys
 import tempfile
-from datetime import datetime
 
 from lxml import etree
 
 from . import VERSION
+from .checkpoint import addcheckpointarguments
+from .checkpoint import maketimestamp
+from .checkpoint import opencheckpoint
 from .constants import AIP_SIP_DEFAULT_VERSION
 from .constants import INFORMATION_MODEL_VERSION
 from .constants import PDS_LABEL_FILENAME_EXTENSION
@@ -48,13 +50,28 @@ from .constants import PDS_SCHEMA_URL
 from .constants import PDS_TABLE_FILENAME_EXTENSION
 from .constants import XML_MODEL_PI
 from .constants import XML_SCHEMA_INSTANCE_NS_URI
+from .digestcache import opendigestcache
+from .hashing import getfiledigest
+from .hashing import setblocksize
+from .metrics import addmetricsarguments
+from .metrics import openmetrics
+from .metrics import timed
+from .progress import addprogressarguments
+from .progress import Progress
+from .progress import setprogressinterval
 from .utils import addbundlearguments
+from .utils import addcatalogarguments
+from .utils import addhashingarguments
 from .utils import addloggingarguments
 from .utils import comprehenddirectory
 from .utils import createschema
-from .utils import getlogicalversionidentifier
-from .utils import getmd5
-from .utils import parsexml
+from .utils import filesize
+from .utils import getlabelinfo
+from .utils import isunder
+from .utils import resolvelabels
+from .verify import addverifyarguments
+from .verify import readchecksummanifest
+from .verify import runverification
 
 
 # Constants
@@ -91,6 +108,7 @@ _logger = logging.getLogger(__name__)
 # ---------
 
 
+@timed("label")
 def writelabel(
     labeloutputfile,
     logicalidfragment,
@@ -239,73 +257,56 @@ def writelabel(
     tree.write(labeloutputfile, encoding="utf-8", xml_declaration=True, pretty_print=True)
 
 
-def _getfiles(con, lid, vid, allcollections):
+def _getfiles(con, lid, vid, allcollections, root=None):
     """Get the files.
 
     Get the files specified in the database at ``con`` referenced by the label ``lid``::``vid``.
-    Recursively find files specified by the labels references as bundle member entries in the label
-    for ``lid``::``vid``. Note that some references might be by ``lid`` only; when this is the case,
-    we choose only the latest version found in ``con`` except if ``allcollections`` is True, then
-    we put in *every* referenced version.
-
-    Returns a sequence of triples (lid, vid, filepath) where filepath is the full path of a
-    referenced file.
+    Also find files specified by the labels references as bundle member entries in the label
+    for ``lid``::``vid``, and so on. Note that some references might be by ``lid`` only; when this is
+    the case, we choose only the latest version found in ``con`` except if ``allcollections`` is True,
+    then we put in *every* referenced version. If ``root`` is given, only labels and files in and under
+    that directory count.
+
+    Returns a sorted list of triples (lid, vid, filepath) where filepath is the full path of a
+    referenced file; sorting makes the manifests the same from run to run.
     """
     _logger.debug("🕵️‍♀️ Finding files for %s::%s", lid, vid)
-    cursor = con.cursor()
-    cursor.execute("SELECT filepath FROM label_file_references WHERE lid = ? AND vid = ?", ((lid, vid)))
-    files = set([(lid, vid, i[0]) for i in cursor.fetchall()])
-
-    _logger.debug("🕵️‍♂️ Finding inter-label references from %s::%s with allcollections=%r", lid, vid, allcollections)
-    cursor.execute("SELECT to_lid, to_vid FROM inter_label_references WHERE lid = ? AND vid = ?", ((lid, vid)))
-    for to_lid, to_vid in cursor.fetchall():
-        # For a lid-only reference, we can include all of the potential vids or just the latest
-        if to_vid is None:
-            # lid-only, so what's it gonna be, all or latest 🤷‍♀️
-            if allcollections:
-                cursor.execute("SELECT vid FROM labels WHERE lid = ?", (to_lid,))
-                for to_vid in [i[0] for i in cursor.fetchall()]:
-                    files |= _getfiles(con, to_lid, to_vid, allcollections)
-            else:
-                # Note that ``max(vid)`` doesn't cut it since it would make 2.0 > 10.0; however  to fix this
-                # we'd either have to make (major, minor) columns out of version IDs or provide a sqlite3 C
-                # extension with a version collator. But this is close enough for now. 🧐
-                cursor.execute("SELECT max(vid) FROM labels WHERE lid = ?", (to_lid,))
-                to_vid = cursor.fetchone()[0]
-                files |= _getfiles(con, to_lid, to_vid, allcollections)
-        else:
-            # full lid-vid reference
-            files |= _getfiles(con, to_lid, to_vid, allcollections)
-    return files
-
-
-def _writechecksummanifest(chksumfn, lid, vid, con, prefixlen, allcollections):
+    cursor, files = con.cursor(), set()
+    for lidvid in resolvelabels(con, lid, vid, allcollections, root):
+        cursor.execute("SELECT filepath FROM label_file_references WHERE lid = ? AND vid = ?", lidvid)
+        files.update((*lidvid, i[0]) for i in cursor.fetchall() if root is None or isunder(i[0], root))
+    return sorted(files)
+
+
+@timed("write")
+def _writechecksummanifest(chksumfn, lid, vid, con, prefixlen, allcollections, root=None):
     """Write the checksum manifest.
 
     Write the checksum manifest for the label ``lid``::``vid`` found in database ``con`` to the
     file ``chksumfn``, stripping the prefixes of local filenames up to ``prefixlen`` characters,
     and optionally including ``allcollections`` for labels that reference bundle member entries
-    by lid-only if True, otherwise the latest version only if False.
+    by lid-only if True, otherwise the latest version only if False. Only files in and under the
+    directory ``root`` count, if it's given.
     """
     _logger.debug("🧾 Writing checksum manifest for %s::%s to %s", lid, vid, chksumfn)
     md5, size, count = hashlib.new("md5", usedforsecurity=False), 0, 0
-    files = _getfiles(con, lid, vid, allcollections)
-    with open(chksumfn, "wb") as o:
-        # The tuples are (lid, vid, filepath)—we care just about filepath
-        for f in [i[2] for i in files]:
-            with open(f, "rb") as i:
-                digest = getmd5(i)
-                strippedfn = f[prefixlen:]
-                entry = f"{digest}\t{strippedfn}\r\n".encode("utf-8")
-                o.write(entry)
-                md5.update(entry)
-                size += len(entry)
-                count += 1
-                if count % 100 == 0:
-                    _logger.info("⏲ Wrote %d entries into the checksum manifest", count)
+    files = _getfiles(con, lid, vid, allcollections, root)
+    # The tuples are (lid, vid, filepath)—we care just about filepath
+    sizes = [(i[2], filesize(i[2])) for i in files]
+    with open(chksumfn, "wb") as o, Progress("checksum manifest", len(sizes), sum(i[1] for i in sizes)) as progress:
+        for f, fsize in sizes:
+            digest = getfiledigest(f, "md5")
+            strippedfn = f[prefixlen:]
+            entry = f"{digest}\t{strippedfn}\r\n".encode("utf-8")
+            o.write(entry)
+            md5.update(entry)
+            size += len(entry)
+            count += 1
+            progress.advance(1, fsize)
     return md5.hexdigest(), size, count, files
 
 
+@timed("write")
 def _writetransfermanifest(xferfn, prefixlen, files):
     """Write the transfer manifest.
 
@@ -325,7 +326,7 @@ def _writetransfermanifest(xferfn, prefixlen, files):
         lidvidstofiles[lidvid] = perlidvid
 
     # Now write those organized into groups of lidvids
-    with open(xferfn, "wb") as o:
+    with open(xferfn, "wb") as o, Progress("transfer manifest", len(files)) as progress:
         for lidvid, filenames in lidvidstofiles.items():
             for fn in filenames:
                 entry = f"{lidvid:255}{fn:255}\r\n".encode("utf-8")
@@ -333,12 +334,11 @@ def _writetransfermanifest(xferfn, prefixlen, files):
                 md5.update(entry)
                 size += len(entry)
                 count += 1
-                if count % 100 == 0:
-                    _logger.info("⌚️ Wrote %d entries into the transfer manifest", count)
+                progress.advance()
     return md5.hexdigest(), size, count
 
 
-def process(bundle, allcollections, con, timestamp):
+def process(bundle, allcollections, con, timestamp, root=None):
     """Process towards an AIP.
 
     Generate a "checksum manifest", a "transfer manifest", and a PDS label from the given
@@ -346,12 +346,17 @@ def process(bundle, allcollections, con, timestamp):
     filesystem. Return the name of the generated checksum manifest file. ``con`` is a sqlite3
     database connection containing information about the bundle. The ``timestamp`` tells us
     what to put into the label for thie AIP files about creation date and also to create
-    filenames of our generated files.
+    filenames of our generated files. Only labels and files in and under the ``root`` directory
+    count; it defaults to the bundle's own directory, since ``con`` may catalog more than that (say,
+    other bundles beside it, or other directories cataloged earlier into the same ``--catalog``).
+    The catalog already knows the latest versions there, so that default costs nothing extra.
     """
     _logger.info("🏃‍♀️ Starting AIP generation for %s", bundle.name)
 
-    prefixlen = len(os.path.dirname(os.path.abspath(bundle.name))) + 1
-    lid, vid = getlogicalversionidentifier(parsexml(bundle))
+    bundledir = os.path.dirname(os.path.abspath(bundle.name))
+    prefixlen, root = len(bundledir) + 1, bundledir if root is None else root
+    info = getlabelinfo(bundle.name)
+    lid, vid = info.lid, info.vid
     strippedlogicalid, slate = lid.split(":")[-1] + "_v" + vid, timestamp.date().strftime("%Y%m%d")
 
     # Easy one: the checksum† manifest
@@ -364,7 +369,9 @@ def process(bundle, allcollections, con, timestamp):
         + AIP_SIP_DEFAULT_VERSION
         + PDS_TABLE_FILENAME_EXTENSION
     )
-    chksummd5, chksumsize, chksumnum, files = _writechecksummanifest(chksumfn, lid, vid, con, prefixlen, allcollections)
+    chksummd5, chksumsize, chksumnum, files = _writechecksummanifest(
+        chksumfn, lid, vid, con, prefixlen, allcollections, root
+    )
 
     # Next: the transfer manifest
     xferfn = (
@@ -406,31 +413,55 @@ def main():
     parser = argparse.ArgumentParser(description=_description, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
     addloggingarguments(parser)
+    addcatalogarguments(parser)
+    addhashingarguments(parser)
     addbundlearguments(parser)
+    addmetricsarguments(parser)
+    addprogressarguments(parser)
+    addcheckpointarguments(parser)
+    addverifyarguments(parser)
     parser.add_argument(
         "bundle", type=argparse.FileType("rb"), metavar="IN-BUNDLE.XML", help="Root bundle XML file to read"
     )
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel, format="%(levelname)s %(message)s")
     _logger.debug("⚙️ command line args = %r", args)
+    setblocksize(args.block_size)
+    setprogressinterval(args.progress_interval)
+    if args.verify:
+        # Check an existing checksum manifest against the bundle rather than making a new one
+        dn, metrics = os.path.dirname(os.path.abspath(args.bundle.name)), openmetrics(args)
+        try:
+            status = runverification(args, readchecksummanifest(args.verify, dn), dn, (args.verify,))
+        finally:
+            if metrics is not None:
+                metrics.write(args.metrics)
+        sys.exit(status)
+    checkpoint = opencheckpoint(parser, args)
+    cache, metrics = opendigestcache(args), openmetrics(args)
     tempdir = tempfile.mkdtemp(suffix=".dir", prefix="aip")
     try:
         # Scout the enemy line
-        dbfile = os.path.join(tempdir, "pds-deep-archive.sqlite3")
+        dbfile = args.catalog or os.path.join(tempdir, "pds-deep-archive.sqlite3")
         con = sqlite3.connect(dbfile)
-        _logger.debug("⚙️ Creating potentially future-mulitprocessing–capable DB in %s", dbfile)
+        _logger.debug("⚙️ Using potentially future-mulitprocessing–capable DB in %s", dbfile)
         with con:
             createschema(con)
-            comprehenddirectory(os.path.dirname(os.path.abspath(args.bundle.name)), con)
+            comprehenddirectory(os.path.dirname(os.path.abspath(args.bundle.name)), con, args.workers)
 
-        # Make a timestamp but drop the microsecond resolution
-        ts = datetime.utcnow()
-        ts = datetime(ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.second, microsecond=0, tzinfo=None)
+        # Use the checkpoint's timestamp so a resumed run makes the same files
+        if checkpoint is not None:
+            checkpoint.markcataloged()
+        ts = checkpoint.timestamp if checkpoint is not None else maketimestamp()
 
         # Here we go, daddy
         process(args.bundle, not args.include_latest_collection_only, con, ts)
     finally:
         shutil.rmtree(tempdir, ignore_errors=True)
+        if cache is not None:
+            cache.close()
+        if metrics is not None:
+            metrics.write(args.metrics)
 
     _logger.info("👋 Thanks for using this program! Bye!")
     sys.exit(0)
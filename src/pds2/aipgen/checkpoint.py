@@ -0,0 +1,179 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Checkpoints.
+
+A run over a big bundle can take a day or more, and if it dies partway—out of memory, a reboot, a
+hiccup of a network filesystem—starting over throws away all the hashing done so far. With
+``--checkpoint DIR``, the programs keep their catalog of labels and a journal of every message
+digest they compute in ``DIR`` along with the timestamp of the run. If the run dies, ``--resume DIR``
+picks it up again: the catalog is re-used, files already digested aren't read again, and because the
+timestamp is the same, the manifests and labels come out byte for byte as an uninterrupted run's.
+
+The manifests themselves are written again from the start on resumption; with every digest already
+in the journal that's quick, and it means a half-written manifest is never trusted.
+"""
+import json
+import logging
+import os
+from datetime import datetime
+
+
+# Constants
+# ---------
+
+_statefn = "checkpoint.json"  # Where in a checkpoint directory the state of the run goes
+_catalogfn = "catalog.sqlite3"  # Where the catalog of labels goes
+_digestsfn = "digests.sqlite3"  # Where the journal of digests goes
+
+# Logging:
+_logger = logging.getLogger(__name__)
+
+
+# Classes
+# -------
+
+
+class Checkpoint(object):
+    """A checkpoint of a run in a directory.
+
+    The state of the run—the bundles, its timestamp, and whether the catalog's complete—is kept in a
+    small JSON file that's replaced atomically whenever it changes. The catalog and digest journal are
+    SQLite databases that look after themselves.
+    """
+
+    def __init__(self, dn, bundles, resume=False):
+        """Keep a checkpoint in directory ``dn`` of a run over the ``bundles`` (paths to their labels).
+
+        If ``resume`` is True, pick up the run checkpointed there, raising ``ValueError`` if there isn't
+        one or it's of different bundles. Otherwise start a new run, re-using a complete catalog of the
+        same bundles (which gets updated incrementally) but nothing else.
+        """
+        self.dn, self.bundles = dn, sorted(os.path.abspath(i) for i in bundles)
+        os.makedirs(dn, exist_ok=True)
+        state = self._load()
+        if state is not None and state["bundles"] != self.bundles:
+            if resume:
+                raise ValueError(f"The checkpoint in {dn} is of other bundles: {', '.join(state['bundles'])}")
+            state = None
+        if resume:
+            if state is None:
+                raise ValueError(f"There's no checkpoint in {dn} to resume")
+            self.timestamp = datetime.fromisoformat(state["timestamp"])
+            _logger.info("⏯ Resuming the run of %s from %s", self.timestamp.isoformat(), dn)
+        else:
+            self.timestamp = maketimestamp()
+        self.cataloged = state is not None and state["cataloged"]
+        if not self.cataloged and os.path.exists(self.catalog):
+            _logger.debug("🗑 Discarding the incomplete catalog %s", self.catalog)
+            os.unlink(self.catalog)
+        self._save()
+
+    @property
+    def catalog(self):
+        """Path to the catalog of labels."""
+        return os.path.join(self.dn, _catalogfn)
+
+    @property
+    def digests(self):
+        """Path to the journal of message digests."""
+        return os.path.join(self.dn, _digestsfn)
+
+    def markcataloged(self):
+        """Note that the catalog is complete, so it needn't be rebuilt from scratch."""
+        if not self.cataloged:
+            self.cataloged = True
+            self._save()
+
+    def _load(self):
+        """Load the state of the run, or return ``None`` if there isn't any."""
+        try:
+            with open(os.path.join(self.dn, _statefn), "r", encoding="utf-8") as i:
+                return json.load(i)
+        except FileNotFoundError:
+            return None
+
+    def _save(self):
+        """Save the state of the run so it survives a crash at any moment."""
+        fn = os.path.join(self.dn, _statefn)
+        state = {"bundles": self.bundles, "timestamp": self.timestamp.isoformat(), "cataloged": self.cataloged}
+        with open(fn + ".new", "w", encoding="utf-8") as o:
+            json.dump(state, o, indent=2)
+            o.flush()
+            os.fsync(o.fileno())
+        os.replace(fn + ".new", fn)
+
+
+# Functions
+# ---------
+
+
+def maketimestamp():
+    """Make a timestamp of right now in UTC, but without microseconds or a time zone."""
+    ts = datetime.utcnow()
+    return datetime(ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.second, microsecond=0, tzinfo=None)
+
+
+def addcheckpointarguments(parser):
+    """Add command-line arguments to the given argument ``parser`` to checkpoint and resume runs."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--checkpoint",
+        metavar="DIR",
+        help="Keep the catalog of labels, a journal of message digests, and the run's timestamp in this directory"
+        " so the run can be resumed with --resume if it's interrupted",
+    )
+    group.add_argument(
+        "--resume",
+        metavar="DIR",
+        help="Resume the run checkpointed in this directory, making the same files it would have",
+    )
+
+
+def opencheckpoint(parser, args):
+    """Open a checkpoint.
+
+    If the parsed command-line ``args`` ask to checkpoint or resume a run, return the ``Checkpoint``,
+    making its catalog and digest journal the ones to use unless ``args`` name others; otherwise return
+    ``None``. Problems get reported through the argument ``parser``. The bundles are the ``bundle``
+    argument (which may be a list of them) plus the ``discover`` root, if there's one.
+    """
+    dn = args.checkpoint or args.resume
+    if dn is None:
+        return None
+    bundles = [i.name for i in (args.bundle if isinstance(args.bundle, list) else [args.bundle])]
+    if getattr(args, "discover", None):
+        bundles.append(args.discover)
+    try:
+        checkpoint = Checkpoint(dn, bundles, resume=args.resume is not None)
+    except (ValueError, OSError) as ex:
+        parser.error(str(ex))
+    args.catalog = args.catalog or checkpoint.catalog
+    args.digest_cache = args.digest_cache or checkpoint.digests
+    return checkpoint
@@ -40,6 +40,9 @@ PDS_NS_URI = "http://pds.nasa.gov/pds4/pds/v1"
 # XML tag for a PDS product collection
 PRODUCT_COLLECTION_TAG = f"{{{PDS_NS_URI}}}Product_Collection"
 
+# XML tag for a PDS bundle
+PRODUCT_BUNDLE_TAG = f"{{{PDS_NS_URI}}}Product_Bundle"
+
 # Where to find the PDS schema
 PDS_SCHEMA_URL = "http://pds.nasa.gov/pds4/pds/v1 https://pds.nasa.gov/pds4/pds/v1/PDS4_PDS_1M00.xsd"
 
@@ -69,6 +72,9 @@ HASH_ALGORITHMS = {
     "SHA-256": "sha256",
 }
 
+# Default number of bytes to read at a time when computing message digests of files
+DIGEST_BLOCK_SIZE = 2 ** 20
+
 # The "well-defined" location for SIP manifests
 SIP_MANIFEST_URL = "https://pds.nasa.gov/data/pds4/manifests/"
 
@@ -0,0 +1,262 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Persistent digest cache.
+
+Re-delivered bundles are mostly byte-for-byte the same as the last delivery, so re-computing the
+message digest of every file is mostly wasted effort. The digest cache is an SQLite database that
+remembers digests from run to run, keyed by each file's path, size, modification time (in
+nanoseconds), inode, and device. If any of those change, the file gets read again.
+
+This module also provides ``pds-digest-cache``, a program to report on and prune such caches.
+"""
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from zope.component import provideUtility  # type: ignore
+from zope.interface import implementer
+
+from . import VERSION
+from .interfaces import IDigestCache
+from .utils import addloggingarguments
+
+
+# Constants
+# ---------
+
+# Module metadata:
+__version__ = VERSION
+
+# For ``--help``; note this is hand-wrapped at 80 columns:
+_description = """Report on or prune a persistent digest cache made with the
+``--digest-cache`` option of ``aipgen``, ``sipgen``, or ``pds-deep-archive``."""
+
+_commitinterval = 1000  # How many new digests to remember before committing them
+_commitseconds = 30.0  # Most seconds to go with new digests uncommitted, since big files take a while
+_secondsperday = 24 * 60 * 60  # Seconds in a day, duh
+
+# Logging:
+_logger = logging.getLogger(__name__)
+
+
+# Classes
+# -------
+
+
+@implementer(IDigestCache)
+class DigestCache(object):
+    """A digest cache in an SQLite database.
+
+    It's usually installed as a singleton utility (using zope.component). It's safe to use from
+    multiple threads.
+    """
+
+    def __init__(self, dbfile, verify=0.0, maxage=None):
+        """Open (or create) the digest cache in ``dbfile``.
+
+        A random ``verify`` fraction (0–1) of cached digests will be treated as unknown so the files get
+        read again, with a warning if they no longer match. Digests last computed more than ``maxage``
+        days ago are also treated as unknown.
+        """
+        self.verify, self.maxage = verify, maxage
+        self.hits = self.misses = self.mismatches = 0
+        self._lock, self._pending, self._verifying = threading.Lock(), 0, {}
+        self._committed = time.monotonic()
+        self._con = sqlite3.connect(dbfile, check_same_thread=False)
+        with self._con:
+            self._con.execute(
+                """CREATE TABLE IF NOT EXISTS digests (
+                filepath text NOT NULL,
+                hashname text NOT NULL,
+                size integer NOT NULL,
+                mtime_ns integer NOT NULL,
+                inode integer NOT NULL,
+                device integer NOT NULL,
+                digest text NOT NULL,
+                computed real NOT NULL,
+                used real NOT NULL
+            )"""
+            )
+            self._con.execute("CREATE UNIQUE INDEX IF NOT EXISTS fileHashIndex ON digests (filepath, hashname)")
+
+    def lookup(self, filepath, stat, hashname):
+        """See the interface being implemented."""
+        with self._lock:
+            row = self._con.execute(
+                "SELECT size, mtime_ns, inode, device, digest, computed FROM digests WHERE filepath = ? AND hashname = ?",
+                (filepath, hashname),
+            ).fetchone()
+            if row is None or row[:4] != _identity(stat):
+                self.misses += 1
+                return None
+            digest, computed, now = row[4], row[5], time.time()
+            if self.maxage is not None and now - computed > self.maxage * _secondsperday:
+                _logger.debug("👴 Cached %s digest of %s is too old; re-computing it", hashname, filepath)
+                self.misses += 1
+                return None
+            if self.verify and random.random() < self.verify:
+                _logger.debug("🔍 Verifying the cached %s digest of %s", hashname, filepath)
+                self._verifying[filepath, hashname] = digest
+                self.misses += 1
+                return None
+            self._con.execute(
+                "UPDATE digests SET used = ? WHERE filepath = ? AND hashname = ?", (now, filepath, hashname)
+            )
+            self.hits += 1
+            return digest
+
+    def store(self, filepath, stat, digests):
+        """See the interface being implemented."""
+        with self._lock:
+            now = time.time()
+            for hashname, digest in digests.items():
+                if self._verifying.pop((filepath, hashname), digest) != digest:
+                    self.mismatches += 1
+                    _logger.warning(
+                        "💥 The %s digest of %s changed but its size, time, and inode didn't", hashname, filepath
+                    )
+                self._con.execute(
+                    "INSERT OR REPLACE INTO digests (filepath, hashname, size, mtime_ns, inode, device, digest,"
+                    " computed, used) VALUES (?,?,?,?,?,?,?,?,?)",
+                    (filepath, hashname, *_identity(stat), digest, now, now),
+                )
+                self._pending += 1
+            if self._pending >= _commitinterval or time.monotonic() - self._committed >= _commitseconds:
+                self._con.commit()
+                self._pending, self._committed = 0, time.monotonic()
+
+    def close(self):
+        """Commit whatever's been remembered and close the cache."""
+        with self._lock:
+            self._con.commit()
+            self._con.close()
+        _logger.info(
+            "🗄 Digest cache: %d hits, %d misses, %d verification failures", self.hits, self.misses, self.mismatches
+        )
+
+
+# Functions
+# ---------
+
+
+def _identity(stat):
+    """Return the parts of the ``os.stat_result`` ``stat`` that identify a file's content."""
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev
+
+
+def opendigestcache(args):
+    """Open a digest cache.
+
+    If the parsed command-line ``args`` name a digest cache, open it, install it as the digest
+    cache utility, and return it; otherwise return ``None``.
+    """
+    if not args.digest_cache:
+        return None
+    _logger.debug("🗄 Using digest cache %s", args.digest_cache)
+    cache = DigestCache(args.digest_cache, args.digest_cache_verify, args.digest_cache_max_age)
+    provideUtility(cache)
+    return cache
+
+
+def prune(con, missing=True, olderthan=None):
+    """Prune a digest cache.
+
+    Remove entries from the digest cache database ``con`` for files that no longer exist or no longer
+    match their cached identities if ``missing`` is True, and those unused for more than ``olderthan``
+    days if it's not ``None``. Return the number of entries removed.
+    """
+    removed = 0
+    if olderthan is not None:
+        cursor = con.execute("DELETE FROM digests WHERE used < ?", (time.time() - olderthan * _secondsperday,))
+        removed += cursor.rowcount
+    if missing:
+        stale = set()
+        for filepath, size, mtime_ns, inode, device in con.execute(
+            "SELECT DISTINCT filepath, size, mtime_ns, inode, device FROM digests"
+        ):
+            try:
+                if _identity(os.stat(filepath)) != (size, mtime_ns, inode, device):
+                    stale.add(filepath)
+            except FileNotFoundError:
+                stale.add(filepath)
+        # A file has a row per algorithm, so count the rows deleted rather than the files
+        for filepath in sorted(stale):
+            removed += con.execute("DELETE FROM digests WHERE filepath = ?", (filepath,)).rowcount
+    return removed
+
+
+def main():
+    """Check the command-line for options and report on or prune a digest cache."""
+    parser = argparse.ArgumentParser(description=_description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    addloggingarguments(parser)
+    parser.add_argument("cache", metavar="CACHE.SQLITE3", help="Digest cache to work on")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Report how many files and digests are in the cache")
+    pruner = subparsers.add_parser("prune", help="Remove stale entries from the cache")
+    pruner.add_argument(
+        "--keep-missing",
+        action="store_true",
+        help="Don't remove entries for files that no longer exist or that have changed",
+    )
+    pruner.add_argument("--older-than", type=float, metavar="DAYS", help="Remove entries unused for this many days")
+    subparsers.add_parser("clear", help="Remove every entry from the cache")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.loglevel, format="%(levelname)s %(message)s")
+    _logger.debug("⚙️ command line args = %r", args)
+
+    if not os.path.isfile(args.cache):
+        _logger.critical("🤷‍♀️ There's no digest cache at %s", args.cache)
+        sys.exit(1)
+    con = sqlite3.connect(args.cache)
+    try:
+        if args.command == "stats":
+            files, digests = con.execute("SELECT count(DISTINCT filepath), count(*) FROM digests").fetchone()
+            _logger.info("🗄 %s has %d digests of %d files", args.cache, digests, files)
+        else:
+            with con:
+                if args.command == "prune":
+                    removed = prune(con, not args.keep_missing, args.older_than)
+                else:
+                    removed = con.execute("DELETE FROM digests").rowcount
+            con.execute("VACUUM")
+            _logger.info("🧹 Removed %d entries from %s", removed, args.cache)
+    finally:
+        con.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
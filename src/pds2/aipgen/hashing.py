@@ -0,0 +1,297 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Message digests.
+
+This is the hashing engine for both AIPs and SIPs. It reads with large, reusable buffers (one per
+thread) using ``readinto`` so there's no allocation per block, and memory-maps big regular files so
+the hash functions can chew through them without copying.
+"""
+import concurrent.futures
+import hashlib
+import logging
+import mmap
+import os
+import threading
+from stat import S_ISREG
+
+from zope.component import queryUtility  # type: ignore
+from zope.interface import implementer
+
+from .constants import DIGEST_BLOCK_SIZE
+from .interfaces import IDigestCache
+from .interfaces import IDigestStore
+from .metrics import count
+from .metrics import phase
+
+
+# Logging
+# -------
+
+_logger = logging.getLogger(__name__)
+
+
+# Private Constants
+# -----------------
+
+_mmapthreshold = 2 ** 26  # Regular files at least this big get memory-mapped
+
+
+# Module State
+# ------------
+
+_blocksize = DIGEST_BLOCK_SIZE  # Current block size; see ``setblocksize``
+_buffers = threading.local()  # Per-thread reusable read buffer
+
+
+# Functions
+# ---------
+
+
+def _newhash(hashname):
+    """Make a new hash object for the algorithm named ``hashname``.
+
+    MD5 is made with ``usedforsecurity=False`` to support FIPS mode (these are checksums, not crypto).
+    """
+    return hashlib.new(hashname, usedforsecurity=False) if hashname.lower() == "md5" else hashlib.new(hashname)
+
+
+def setblocksize(blocksize):
+    """Set the number of bytes the hashing engine reads at a time to ``blocksize``."""
+    global _blocksize
+    if blocksize < 1:
+        raise ValueError(f"The block size must be positive, not {blocksize}")
+    _blocksize = blocksize
+
+
+def _getbuffer():
+    """Get this thread's reusable read buffer, sized to the current block size, as a memoryview."""
+    view = getattr(_buffers, "view", None)
+    if view is None or len(view) != _blocksize:
+        view = _buffers.view = memoryview(bytearray(_blocksize))
+    return view
+
+
+def _feedstream(i, hashishes):
+    """Read the input stream ``i`` to its end, updating each of the ``hashishes`` with what's read.
+
+    Return how many bytes were read.
+    """
+    total = 0
+    readinto = getattr(i, "readinto", None)
+    if readinto is None:
+        # No ``readinto``, so fall back to plain old ``read`` with the same block size
+        while True:
+            buf = i.read(_blocksize)
+            if len(buf) == 0:
+                break
+            for hashish in hashishes:
+                hashish.update(buf)
+            total += len(buf)
+        return total
+    view = _getbuffer()
+    while True:
+        size = readinto(view)
+        if not size:
+            break
+        chunk = view if size == len(view) else view[:size]
+        for hashish in hashishes:
+            hashish.update(chunk)
+        total += size
+    return total
+
+
+def _feedmap(fileno, size, hashishes):
+    """Memory-map the ``size`` bytes of the open file ``fileno`` and update each of the ``hashishes`` with it."""
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapping:
+        if hasattr(mapping, "madvise"):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mapping) as view:
+            # Go a block at a time so every hash sees the same pages while they're still hot
+            for offset in range(0, size, _blocksize):
+                chunk = view[offset:offset + _blocksize]
+                for hashish in hashishes:
+                    hashish.update(chunk)
+                chunk.release()
+
+
+def _feedfile(filepath, hashishes):
+    """Read the local file at ``filepath``, updating each of the ``hashishes`` with its content.
+
+    Return how many bytes were read.
+    """
+    with open(filepath, "rb", buffering=0) as i:
+        size = os.fstat(i.fileno()).st_size
+        if size >= _mmapthreshold:
+            try:
+                _feedmap(i.fileno(), size, hashishes)
+                return size
+            except (OSError, ValueError) as ex:
+                # Some files (like those on some network filesystems) can't be mapped; just read them
+                _logger.debug("🗺 Cannot memory-map %s (%r); reading it instead", filepath, ex)
+        return _feedstream(i, hashishes)
+
+
+def _identify(i):
+    """Identify a stream.
+
+    If the input stream ``i`` is a regular file that's at its beginning, return a double of its
+    absolute path and its ``os.stat_result``; otherwise return ``None``. Streams whose names aren't
+    the paths of the files they read (like those urllib opens for ``file:`` URLs, all named
+    ``<urllib response>``) aren't identifiable.
+    """
+    try:
+        name, stat = i.name, os.fstat(i.fileno())
+        if isinstance(name, str) and S_ISREG(stat.st_mode) and i.tell() == 0:
+            if os.path.samestat(stat, os.stat(name)):
+                return os.path.abspath(name), stat
+    except (AttributeError, OSError, ValueError):
+        pass
+    return None
+
+
+def digeststream(i, hashname):
+    """Compute a digest of the input stream ``i`` using ``hashname`` and return it as a hex string.
+
+    If ``i`` is a local file and there's a digest cache installed (as a zope.component utility),
+    the cache is consulted first.
+    """
+    cache = queryUtility(IDigestCache)
+    identity = _identify(i) if cache is not None else None
+    if identity is not None:
+        digest = cache.lookup(*identity, hashname)
+        if digest is not None:
+            return digest
+    hashish = _newhash(hashname)
+    with phase("hash"):
+        size = _feedstream(i, (hashish,))
+    count("hash.files")
+    count("hash.bytes", size)
+    digest = hashish.hexdigest()
+    if identity is not None:
+        cache.store(*identity, {hashname: digest})
+    return digest
+
+
+def digestfile(filepath, hashnames):
+    """Digest a file.
+
+    Read the local file at ``filepath`` just once, computing a digest with every algorithm named in
+    ``hashnames``. Return a dict mapping each of those names to its hex digest. If there's a digest
+    cache installed (as a zope.component utility), digests it knows aren't re-computed, and if it
+    knows all of them, the file isn't read at all.
+    """
+    digests, hashnames = {}, sorted(set(hashnames))
+    cache = queryUtility(IDigestCache)
+    if cache is not None:
+        # Note we stat *before* reading so that a file changed while we read it gets read again next time
+        filepath, stat = os.path.abspath(filepath), os.stat(filepath)
+        for hashname in hashnames:
+            digest = cache.lookup(filepath, stat, hashname)
+            if digest is not None:
+                digests[hashname] = digest
+        hashnames = [i for i in hashnames if i not in digests]
+        if not hashnames:
+            return digests
+    _logger.debug("🧮 Computing %s digests of %s", "+".join(hashnames), filepath)
+    hashishes = [_newhash(hashname) for hashname in hashnames]
+    with phase("hash"):
+        size = _feedfile(filepath, hashishes)
+    count("hash.files")
+    count("hash.bytes", size)
+    computed = {hashname: hashish.hexdigest() for hashname, hashish in zip(hashnames, hashishes)}
+    if cache is not None:
+        cache.store(filepath, stat, computed)
+    digests.update(computed)
+    return digests
+
+
+def getfiledigest(filepath, hashname):
+    """Get a file's digest.
+
+    Return the hex digest of the local file at ``filepath`` using the algorithm named ``hashname``.
+    If there's a digest store installed (as a zope.component utility), ask it so that files are read
+    only once per run; otherwise, just read the file.
+    """
+    store = queryUtility(IDigestStore)
+    if store is not None:
+        return store.digest(filepath, hashname)
+    return digestfile(filepath, (hashname,))[hashname]
+
+
+# Classes
+# -------
+
+
+@implementer(IDigestStore)
+class DigestStore(object):
+    """This remembers the digests of every local file read during a run.
+
+    It's usually installed as a singleton utility (using zope.component) by programs that make
+    more than one kind of information package from the same files. Whenever it has to read a file,
+    it computes digests for all of its ``hashnames`` at once, so asking later for a digest with any
+    of those algorithms costs no more reading.
+
+    It's safe to share among threads: a file that several threads want at once gets read by just one
+    of them while the others wait for its digests.
+    """
+
+    def __init__(self, hashnames=()):
+        """Initialize an empty store that'll always compute digests with the given ``hashnames``."""
+        self.hashnames = frozenset(hashnames)
+        self._digests, self._pending, self._lock = {}, {}, threading.Lock()
+        self.hits = self.misses = 0
+
+    def digest(self, filepath, hashname):
+        """See the interface being implemented."""
+        while True:
+            with self._lock:
+                digests = self._digests.get(filepath, {})
+                if hashname in digests:
+                    self.hits += 1
+                    return digests[hashname]
+                pending = self._pending.get(filepath)
+                if pending is None:
+                    self.misses += 1
+                    future = self._pending[filepath] = concurrent.futures.Future()
+                    break
+            # Another thread is reading this file; wait for it, then look again
+            pending.result()
+        try:
+            computed = digestfile(filepath, self.hashnames | {hashname})
+        except BaseException as ex:
+            with self._lock:
+                del self._pending[filepath]
+            future.set_exception(ex)
+            raise
+        with self._lock:
+            self._digests.setdefault(filepath, {}).update(computed)
+            del self._pending[filepath]
+        future.set_result(computed)
+        return computed[hashname]
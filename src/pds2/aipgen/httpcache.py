@@ -0,0 +1,214 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Persistent HTTP response cache.
+
+Making a deep archive of the next version of a bundle from the PDS Registry asks the PDS API for
+mostly the same things as last time. The response cache is an SQLite database that remembers
+responses from run to run, keyed by URL. When the PDS API gave a response an ``ETag`` or
+``Last-Modified`` header, the cache asks again with a conditional request, and a ``304 Not Modified``
+means the body needn't be downloaded again. Responses without either are re-used for a configurable
+number of days. The least recently used responses get evicted to keep the cache within a size limit.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from http import HTTPStatus
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+# Constants
+# ---------
+
+_defaultttl = 1.0  # Days to re-use responses that can't be validated
+_defaultmaxsize = 2 ** 30  # Bytes the cache may hold
+_evictionratio = 0.9  # When over its limit, evict down to this fraction of it
+_secondsperday = 24 * 60 * 60  # Seconds in a day, duh
+_keptheaders = ("Content-Type", "Date", "ETag", "Last-Modified")  # Response headers worth remembering
+
+# Logging:
+_logger = logging.getLogger(__name__)
+
+
+# Classes
+# -------
+
+
+class ResponseCache(object):
+    """A cache of HTTP responses in an SQLite database.
+
+    Only successful responses to GET requests are cached. It's safe to use from multiple threads.
+    """
+
+    def __init__(self, dbfile, ttl=_defaultttl, maxsize=_defaultmaxsize):
+        """Open (or create) the response cache in ``dbfile``.
+
+        Re-use responses without validators for ``ttl`` days, and keep the cache under ``maxsize``
+        bytes (of compressed bodies).
+        """
+        self.ttl, self.maxsize = ttl, maxsize
+        self.hits = self.revalidations = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(dbfile, check_same_thread=False)
+        with self._con:
+            self._con.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                url text PRIMARY KEY,
+                status integer NOT NULL,
+                headers text NOT NULL,
+                body blob NOT NULL,
+                etag text,
+                lastmodified text,
+                fetched real NOT NULL,
+                used real NOT NULL,
+                size integer NOT NULL
+            )"""
+            )
+            self._con.execute("CREATE INDEX IF NOT EXISTS responsesUsedIndex ON responses (used)")
+        self.size = self._con.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0]
+
+    def fetch(self, session, url, timeout=None):
+        """Fetch a URL.
+
+        Return the response to a GET of ``url`` (which should already include any query parameters)
+        using the ``requests.Session`` ``session`` with the given ``timeout``, from the cache if we can.
+        """
+        with self._lock:
+            row = self._con.execute(
+                "SELECT status, headers, body, etag, lastmodified, fetched FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        headers = {}
+        if row is not None:
+            status, stored, body, etag, lastmodified, fetched = row
+            if etag is None and lastmodified is None:
+                if time.time() - fetched < self.ttl * _secondsperday:
+                    self._touch(url, refetched=False)
+                    return _makeresponse(url, status, stored, body)
+            else:
+                if etag is not None:
+                    headers["If-None-Match"] = etag
+                if lastmodified is not None:
+                    headers["If-Modified-Since"] = lastmodified
+
+        r = session.get(url, headers=headers, timeout=timeout)
+        if r.status_code == HTTPStatus.NOT_MODIFIED and row is not None:
+            _logger.debug("🆗 %s not modified; using cached response", url)
+            self._touch(url, refetched=True)
+            return _makeresponse(url, status, stored, body)
+        with self._lock:
+            self.misses += 1
+        if r.status_code == HTTPStatus.OK and "no-store" not in r.headers.get("Cache-Control", ""):
+            self._store(url, r)
+        return r
+
+    def _touch(self, url, refetched):
+        """Note that the response for ``url`` was just used, and if ``refetched``, that it's still current."""
+        now = time.time()
+        with self._lock:
+            if refetched:
+                self._con.execute("UPDATE responses SET used = ?, fetched = ? WHERE url = ?", (now, now, url))
+                self.revalidations += 1
+            else:
+                self._con.execute("UPDATE responses SET used = ? WHERE url = ?", (now, url))
+                self.hits += 1
+            self._con.commit()
+
+    def _store(self, url, r):
+        """Remember the response ``r`` to the request for ``url``, evicting others if there's no room."""
+        headers = {key: r.headers[key] for key in _keptheaders if key in r.headers}
+        body, now = zlib.compress(r.content), time.time()
+        with self._lock:
+            old = self._con.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            if old is not None:
+                self.size -= old[0]
+            self._con.execute(
+                "INSERT OR REPLACE INTO responses (url, status, headers, body, etag, lastmodified, fetched, used, size)"
+                " VALUES (?,?,?,?,?,?,?,?,?)",
+                (
+                    url,
+                    r.status_code,
+                    json.dumps(headers),
+                    body,
+                    headers.get("ETag"),
+                    headers.get("Last-Modified"),
+                    now,
+                    now,
+                    len(body),
+                ),
+            )
+            self.size += len(body)
+            if self.size > self.maxsize:
+                self._evict()
+            self._con.commit()
+
+    def _evict(self):
+        """Evict the least recently used responses until the cache is comfortably within its size limit."""
+        target = self.maxsize * _evictionratio
+        victims = []
+        for url, size in self._con.execute("SELECT url, size FROM responses ORDER BY used"):
+            if self.size <= target:
+                break
+            victims.append((url,))
+            self.size -= size
+        self._con.executemany("DELETE FROM responses WHERE url = ?", victims)
+        self.evictions += len(victims)
+        _logger.debug("🧹 Evicted %d responses from the response cache", len(victims))
+
+    def close(self):
+        """Close the cache."""
+        with self._lock:
+            self._con.commit()
+            self._con.close()
+        _logger.info(
+            "🗄 Response cache: %d hits, %d revalidated, %d misses, %d evicted",
+            self.hits,
+            self.revalidations,
+            self.misses,
+            self.evictions,
+        )
+
+
+# Functions
+# ---------
+
+
+def _makeresponse(url, status, headers, body):
+    """Make a ``requests.Response`` for ``url`` out of a cached ``status``, JSON ``headers``, and compressed ``body``."""
+    r = requests.Response()
+    r.url, r.status_code, r.reason = url, status, HTTPStatus(status).phrase
+    r.headers = CaseInsensitiveDict(json.loads(headers))
+    r.encoding = get_encoding_from_headers(r.headers)
+    r._content = zlib.decompress(body)
+    return r
@@ -45,3 +45,84 @@ class IURLValidator(Interface):
         Validate the given ``url`` by first checking its form and then attempting to
         retrieve a byte of it 🤤. Return nothing on success and throw an error on failure.
         """
+
+
+class IDigestStore(Interface):
+    """🧮 A digest store interface.
+
+    Objects (really, a singleton) that implement this interface remember the message digests of
+    local files so that a single run never has to read the same file twice, such as when
+    ``pds-deep-archive`` makes both an AIP and a SIP of the same bundle.
+    """
+
+    def digest(filepath, hashname):  # noqa: N805, B902
+        """Digest contract method.
+
+        Return the hex digest of the local file at ``filepath`` using the algorithm named
+        ``hashname``, reading the file only if it hasn't been digested already.
+        """
+
+
+class IDigestCache(Interface):
+    """🗄 A digest cache interface.
+
+    Objects (really, a singleton) that implement this interface remember the message digests of
+    local files *between* runs, keyed by each file's identity—its path, size, modification time,
+    inode, and device—so that re-runs over mostly unchanged bundles read only what's changed.
+    """
+
+    def lookup(filepath, stat, hashname):  # noqa: N805, B902
+        """Lookup contract method.
+
+        Return the hex digest using ``hashname`` of the local file at ``filepath`` whose ``os.stat_result``
+        is ``stat``, or ``None`` if it's not known (or the file's changed since it was known).
+        """
+
+    def store(filepath, stat, digests):  # noqa: N805, B902
+        """Store contract method.
+
+        Remember the ``digests`` (a mapping of hash name to hex digest) of the local file at ``filepath``
+        whose ``os.stat_result`` (taken *before* it was read) is ``stat``.
+        """
+
+
+class IMetrics(Interface):
+    """📊 A metrics interface.
+
+    Objects (really, a singleton) that implement this interface gather performance metrics of a
+    run—time spent in each phase, counts of things, and histograms of durations—for a report.
+    """
+
+    def phase(name):  # noqa: N805, B902
+        """Phase contract method.
+
+        Return a context manager that adds the wall clock and CPU time spent within it to the
+        phase ``name``.
+        """
+
+    def count(name, amount):  # noqa: N805, B902
+        """Count contract method.
+
+        Add ``amount`` to the counter ``name``.
+        """
+
+    def observe(name, seconds):  # noqa: N805, B902
+        """Observe contract method.
+
+        Add a duration of ``seconds`` to the histogram ``name``.
+        """
+
+
+class IProgressListener(Interface):
+    """⏲ A progress listener interface.
+
+    Objects (really, a singleton, usually just a function) that implement this interface hear how
+    far along each long phase of the work is, for showing progress in applications that use this
+    package as a library.
+    """
+
+    def __call__(status):  # noqa: N805, B902
+        """Call contract method.
+
+        Take note of the ``status``, a ``ProgressStatus`` telling how far along a phase is.
+        """
@@ -29,25 +29,41 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """AIP and SIP generation."""
 import argparse
+import concurrent.futures
 import logging
 import os
 import shutil
 import sqlite3
 import sys
 import tempfile
-from datetime import datetime
 
 from zope.component import provideUtility  # type: ignore
 
 from . import VERSION
 from .aip import process as aipprocess
+from .checkpoint import addcheckpointarguments
+from .checkpoint import maketimestamp
+from .checkpoint import opencheckpoint
 from .constants import HASH_ALGORITHMS
+from .digestcache import opendigestcache
+from .hashing import DigestStore
+from .hashing import setblocksize
+from .metrics import addmetricsarguments
+from .metrics import openmetrics
+from .progress import addprogressarguments
+from .progress import setprogressinterval
 from .sip import addsiparguments
 from .sip import produce as sipprocess
 from .utils import addbundlearguments
+from .utils import addcatalogarguments
+from .utils import addhashingarguments
 from .utils import addloggingarguments
 from .utils import comprehenddirectory
 from .utils import createschema
+from .utils import findbundles
+from .utils import isunder
+from .utils import labelcache
+from .utils import positiveint
 from .utils import URLValidator
 
 
@@ -80,6 +96,8 @@ bundle file, and any existing files are overwritten. The names of the
 generated files are printed upon successful completion.
 """
 
+_defaultjobs = 4  # Bundles to make deep archives of at once in batch mode
+
 # Logging:
 _logger = logging.getLogger(__name__)
 
@@ -88,6 +106,90 @@ _logger = logging.getLogger(__name__)
 # ---------
 
 
+def _outermostdirectories(dirs):
+    """Return the distinct directories among ``dirs``, sorted, leaving out any in or under another."""
+    outermost = []
+    for dn in sorted(set(dirs)):
+        if not any(isunder(dn, i) for i in outermost):
+            outermost.append(dn)
+    return outermost
+
+
+def _archive(bundle, args, dbfile, ts):
+    """Make the AIP and SIP of the ``bundle`` (an open label file) according to the command-line ``args``.
+
+    This uses its own connection to the catalog in ``dbfile`` so that bundles can be archived in separate
+    threads. The ``ts`` is the timestamp for both. Each keeps to the bundle's own directory in the catalog.
+    The ``bundle`` gets closed when done.
+    """
+    con = sqlite3.connect(dbfile)
+    try:
+        allcollections = not args.include_latest_collection_only
+        dummy, dummy, labelfn = aipprocess(bundle, allcollections, con, ts)
+        with open(labelfn, "rb") as chksumstream:
+            sipprocess(
+                bundle,
+                HASH_ALGORITHMS[args.algorithm],
+                # TODO: Temporarily hardcoding these values until other modes are available
+                # args.url,
+                # args.insecure,
+                "",
+                "",
+                args.site,
+                args.bundle_base_url,
+                chksumstream,
+                allcollections,
+                con,
+                ts,
+            )
+    finally:
+        con.close()
+        bundle.close()
+
+
+def _tryarchive(bundle, args, dbfile, ts):
+    """Try to make the AIP and SIP of the ``bundle`` as ``_archive`` does, logging any failure.
+
+    Return True if it worked, False if not.
+    """
+    try:
+        _archive(bundle, args, dbfile, ts)
+        return True
+    except Exception as ex:
+        _logger.error("💥 Couldn't make a deep archive of %s: %s", bundle.name, ex)
+        _logger.debug("🖥 Here is the exception: %r", ex, exc_info=ex)
+        return False
+
+
+def _archiveall(bundles, args, dbfile, ts):
+    """Make the AIPs and SIPs of every one of the open bundle label files ``bundles``, several at a time.
+
+    Each bundle keeps to its own directory in the shared catalog in ``dbfile``. One that fails doesn't
+    stop the others; return how many failed.
+    """
+    _logger.info("📚 Making deep archives of %d bundles, up to %d at a time", len(bundles), args.jobs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(_tryarchive, bundle, args, dbfile, ts) for bundle in bundles]
+        return sum(1 for future in futures if not future.result())
+
+
+def _duplicatebundles(con, bundles):
+    """Find duplicate bundles.
+
+    Look up the lidvid of each of the open bundle label files ``bundles`` in the catalog in ``con`` and
+    return a dict of each lidvid shared by more than one of them mapped to their file names. Since output
+    file names come from lidvids, archiving such bundles together would have them overwrite each other.
+    """
+    names = {}
+    for bundle in bundles:
+        row = con.execute(
+            "SELECT lid, vid FROM catalog_labels WHERE labelpath = ?", (os.path.abspath(bundle.name),)
+        ).fetchone()
+        if row is not None and row[0] is not None:
+            names.setdefault(f"{row[0]}::{row[1]}", []).append(bundle.name)
+    return {lidvid: fns for lidvid, fns in names.items() if len(fns) > 1}
+
+
 def main():
     """Make an AIP and a SIP."""
     parser = argparse.ArgumentParser(description=_description, formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -95,55 +197,98 @@ def main():
     addbundlearguments(parser)
     addsiparguments(parser)
     addloggingarguments(parser)
-    parser.add_argument("bundle", type=argparse.FileType("rb"), metavar="IN-BUNDLE.XML", help="Bundle XML file to read")
+    addcatalogarguments(parser)
+    addhashingarguments(parser)
+    addmetricsarguments(parser)
+    addprogressarguments(parser)
+    addcheckpointarguments(parser)
+    parser.add_argument(
+        "--discover",
+        metavar="ROOT",
+        help="Make deep archives of every bundle found in and under this directory, as well as any named",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positiveint,
+        default=_defaultjobs,
+        metavar="N",
+        help="With more than one bundle, make deep archives of this many at once [%(default)s]",
+    )
+    parser.add_argument(
+        "bundle", type=argparse.FileType("rb"), nargs="*", metavar="IN-BUNDLE.XML", help="Bundle XML files to read"
+    )
     args = parser.parse_args()
+    if not args.bundle and not args.discover:
+        parser.error("Give at least one IN-BUNDLE.XML or a directory to --discover bundles in")
     logging.basicConfig(level=args.loglevel, format="%(levelname)s %(message)s")
     _logger.info("👟 PDS Deep Archive, version %s", __version__)
     _logger.debug("⚙️ command line args = %r", args)
+    setblocksize(args.block_size)
+    setprogressinterval(args.progress_interval)
+    checkpoint = opencheckpoint(parser, args)
+    cache, metrics = opendigestcache(args), openmetrics(args)
 
     # https://github.com/NASA-PDS/pds-deep-archive/issues/102
     if not args.disable_url_validation:
         provideUtility(URLValidator())
 
+    # Both the AIP (always MD5) and the SIP (whatever algorithm) need digests of the same files; read each one
+    # just once, computing both kinds of digests as we go
+    provideUtility(DigestStore(("md5", HASH_ALGORITHMS[args.algorithm])))
+    failures, bundles = 0, list(args.bundle)
+
     tempdir = tempfile.mkdtemp(suffix=".dir", prefix="deep")
     try:
-        # Make a site survey
-        dbfile = os.path.join(tempdir, "pds-deep-archive.sqlite3")
+        # Make a site survey of every bundle's directory into one catalog, each directory just once
+        dirs = [os.path.dirname(os.path.abspath(i.name)) for i in args.bundle]
+        if args.discover:
+            dirs.append(os.path.abspath(args.discover))
+        dbfile = args.catalog or os.path.join(tempdir, "pds-deep-archive.sqlite3")
         con = sqlite3.connect(dbfile)
-        _logger.debug("⚙️ Creating potentially future-mulitprocessing–capable DB in %s", dbfile)
+        _logger.debug("⚙️ Using potentially future-mulitprocessing–capable DB in %s", dbfile)
         with con:
             createschema(con)
-            comprehenddirectory(os.path.dirname(os.path.abspath(args.bundle.name)), con)
+            for dn in _outermostdirectories(dirs):
+                comprehenddirectory(dn, con, args.workers)
+        if args.discover:
+            found = findbundles(con, os.path.abspath(args.discover))
+            _logger.info("🔭 Found %d bundles in %s", len(found), args.discover)
+            named = {os.path.abspath(i.name) for i in bundles}
+            bundles.extend(open(i, "rb") for i in found if i not in named)
+        duplicates = _duplicatebundles(con, bundles)
+        con.close()
+        if duplicates:
+            for lidvid, fns in duplicates.items():
+                _logger.error("👯 Bundles %s all have the lidvid %s; archive them separately", ", ".join(fns), lidvid)
+            raise ValueError(f"{len(duplicates)} lidvids are shared by more than one bundle")
 
-        # Make a timestamp but without microseconds
-        ts = datetime.utcnow()
-        ts = datetime(ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.second, microsecond=0, tzinfo=None)
+        # Use the checkpoint's timestamp so a resumed run makes the same files
+        if checkpoint is not None:
+            checkpoint.markcataloged()
+        ts = checkpoint.timestamp if checkpoint is not None else maketimestamp()
 
-        dummy, dummy, labelfn = aipprocess(args.bundle, not args.include_latest_collection_only, con, ts)
-        with open(labelfn, "rb") as chksumstream:
-            sipprocess(
-                args.bundle,
-                # TODO: Temporarily hardcoding these values until other modes are available
-                # HASH_ALGORITHMS[args.algorithm],
-                # args.url,
-                # args.insecure,
-                HASH_ALGORITHMS["MD5"],
-                "",
-                "",
-                args.site,
-                args.bundle_base_url,
-                chksumstream,
-                args.include_latest_collection_only,
-                con,
-                ts,
-            )
+        if len(bundles) == 1 and not args.discover:
+            failures = 0 if _tryarchive(bundles[0], args, dbfile, ts) else 1
+        elif bundles:
+            failures = _archiveall(bundles, args, dbfile, ts)
+        else:
+            _logger.warning("🤷‍♀️ There are no bundles in %s", args.discover)
+        _logger.debug("🏷 Label cache statistics: %r", labelcache.stats())
     except Exception as ex:
+        failures = 1
         _logger.critical("🛑 Cannot proceed as a critical problem has occurred; re-run with --debug for more info.")
         _logger.debug("🖥 Here is the exception: %r", ex, exc_info=ex)
     finally:
+        for bundle in bundles:
+            bundle.close()  # Those not archived, say after a critical problem, and harmless for the rest
         shutil.rmtree(tempdir, ignore_errors=True)
+        if cache is not None:
+            cache.close()
+        if metrics is not None:
+            metrics.write(args.metrics)
     _logger.info("👋 That's it for now. Bye.")
-    sys.exit(0)
+    sys.exit(1 if failures else 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,261 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Performance metrics.
+
+To plan how long archiving runs take and how much they need, every program can write a JSON report
+of where its time went with ``--metrics``. The report covers the wall clock and CPU time of each
+phase of the work—scanning and parsing labels, resolving references, hashing, writing tables and
+labels, crawling the PDS API, and SQLite—how many files and bytes got hashed and how fast, how
+many HTTP requests got made with a histogram of their latencies, and peak memory.
+
+Code marks its phases and counts things with the functions here, which do nothing at all unless a
+``Metrics`` object has been installed as a zope.component utility.
+"""
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+
+from zope.component import provideUtility  # type: ignore
+from zope.component import queryUtility  # type: ignore
+from zope.interface import implementer
+
+from . import VERSION
+from .interfaces import IMetrics
+
+try:
+    import resource
+except ImportError:  # There's no ``resource`` on Windows, so no peak memory or child CPU time there
+    resource = None  # type: ignore
+
+
+# Constants
+# ---------
+
+# Upper bounds, in seconds, of the buckets of latency histograms
+_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_rssunits = 1 if sys.platform == "darwin" else 1024  # ``ru_maxrss`` is in bytes on macOS, KiB elsewhere
+
+# Logging:
+_logger = logging.getLogger(__name__)
+
+
+# Classes
+# -------
+
+
+class _Histogram(object):
+    """A histogram of durations."""
+
+    def __init__(self):
+        """Start with nothing observed."""
+        self.counts, self.total = [0] * (len(_buckets) + 1), 0.0
+        self.minimum = self.maximum = None
+
+    def add(self, seconds):
+        """Note a duration of ``seconds``."""
+        index = next((i for i, bound in enumerate(_buckets) if seconds <= bound), len(_buckets))
+        self.counts[index] += 1
+        self.total += seconds
+        self.minimum = seconds if self.minimum is None else min(self.minimum, seconds)
+        self.maximum = seconds if self.maximum is None else max(self.maximum, seconds)
+
+    def report(self):
+        """Return a dict describing the histogram."""
+        count = sum(self.counts)
+        labels = [f"≤{bound}" for bound in _buckets] + [f">{_buckets[-1]}"]
+        return {
+            "count": count,
+            "total": self.total,
+            "mean": self.total / count if count else None,
+            "min": self.minimum,
+            "max": self.maximum,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+@implementer(IMetrics)
+class Metrics(object):
+    """Metrics of a run of a program.
+
+    Phases may nest (writing the checksum manifest of an AIP includes hashing, for example), so each
+    phase's time is reported both in total and exclusive of the phases within it. CPU time of a phase
+    is that of the thread it ran in. It's safe to use from multiple threads.
+    """
+
+    def __init__(self, program=None):
+        """Start measuring the run of ``program`` now."""
+        self.program = program or sys.argv[0]
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+        self._lock, self._local = threading.Lock(), threading.local()
+        self._phases, self._counters, self._histograms = {}, {}, {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """See the interface being implemented."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        inner = [0.0, 0.0]  # Wall and CPU time of phases within this one
+        stack.append(inner)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            with self._lock:
+                totals = self._phases.setdefault(name, [0, 0.0, 0.0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += wall
+                totals[2] += cpu
+                totals[3] += wall - inner[0]
+                totals[4] += cpu - inner[1]
+
+    def count(self, name, amount=1):
+        """See the interface being implemented."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        """See the interface being implemented."""
+        with self._lock:
+            self._histograms.setdefault(name, _Histogram()).add(seconds)
+
+    def report(self):
+        """Return a dict of all the metrics so far."""
+        cpuchildren = peakrss = peakrsschildren = None
+        if resource is not None:
+            usage, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpuchildren = children.ru_utime + children.ru_stime
+            peakrss, peakrsschildren = usage.ru_maxrss * _rssunits, children.ru_maxrss * _rssunits
+        with self._lock:
+            phases = {
+                name: {"calls": calls, "wall": wall, "cpu": cpu, "exclusive_wall": xwall, "exclusive_cpu": xcpu}
+                for name, (calls, wall, cpu, xwall, xcpu) in self._phases.items()
+            }
+            counters = dict(self._counters)
+            histograms = {name: histogram.report() for name, histogram in self._histograms.items()}
+        hashseconds = phases.get("hash", {}).get("exclusive_wall", 0.0)
+        hashedbytes = counters.get("hash.bytes", 0)
+        return {
+            "program": self.program,
+            "version": VERSION,
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall": time.perf_counter() - self._wall,
+            "cpu": time.process_time() - self._cpu,
+            "cpu_children": cpuchildren,
+            "peak_rss": peakrss,
+            "peak_rss_children": peakrsschildren,
+            "phases": phases,
+            "hashing": {
+                "files": counters.get("hash.files", 0),
+                "bytes": hashedbytes,
+                "seconds": hashseconds,
+                "mb_per_s": hashedbytes / hashseconds / 1e6 if hashseconds else None,
+            },
+            "sqlite_seconds": phases.get("sqlite", {}).get("exclusive_wall", 0.0),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def write(self, fn):
+        """Write the report of the metrics as JSON to the file named ``fn``."""
+        with open(fn, "w", encoding="utf-8") as o:
+            json.dump(self.report(), o, indent=2, ensure_ascii=False)
+        _logger.info("📊 Wrote metrics to %s", fn)
+
+
+# Functions
+# ---------
+
+
+def phase(name):
+    """Return a context manager that times what happens within it as the phase ``name``."""
+    metrics = queryUtility(IMetrics)
+    return metrics.phase(name) if metrics is not None else contextlib.nullcontext()
+
+
+def timed(name):
+    """Decorate a function so every call of it is timed as the phase ``name``."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, amount=1):
+    """Add ``amount`` to the counter ``name``."""
+    metrics = queryUtility(IMetrics)
+    if metrics is not None:
+        metrics.count(name, amount)
+
+
+def observe(name, seconds):
+    """Add a duration of ``seconds`` to the histogram ``name``."""
+    metrics = queryUtility(IMetrics)
+    if metrics is not None:
+        metrics.observe(name, seconds)
+
+
+def addmetricsarguments(parser):
+    """Add command-line arguments to the given argument ``parser`` to support metrics reports."""
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE.JSON",
+        help="Write a JSON report of the time spent in each phase, hashing throughput, HTTP latencies, and memory",
+    )
+
+
+def openmetrics(args):
+    """Open metrics.
+
+    If the parsed command-line ``args`` ask for a metrics report, start measuring, install the
+    ``Metrics`` as a utility, and return it; otherwise return ``None``.
+    """
+    if not args.metrics:
+        return None
+    metrics = Metrics()
+    provideUtility(metrics)
+    return metrics
@@ -0,0 +1,214 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Progress reporting.
+
+Runs over big bundles can take a day or more, so each long phase of the work—scanning for labels,
+parsing them, crawling the PDS API, hashing, and writing tables—reports how far along it is every
+so often: how many files and bytes of how many it's done, how fast, and when it expects to finish.
+
+Those reports get logged. Library callers can get them too by registering a callable as a
+zope.component utility providing ``IProgressListener``; it gets called with a ``ProgressStatus``
+at each report and once more when the phase finishes.
+"""
+import argparse
+import dataclasses
+import datetime
+import logging
+import threading
+import time
+from typing import Union
+
+from zope.component import queryUtility  # type: ignore
+
+from .interfaces import IProgressListener
+
+
+# Constants
+# ---------
+
+PROGRESS_INTERVAL = 10.0  # Default seconds between progress reports
+
+
+# Module State
+# ------------
+
+_interval = PROGRESS_INTERVAL  # Current seconds between reports; see ``setprogressinterval``
+
+# Logging:
+_logger = logging.getLogger(__name__)
+
+
+# Classes
+# -------
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ProgressStatus:
+    """How far along a phase of the work is.
+
+    ``files`` and ``bytes`` are how many have been done so far of ``totalfiles`` and ``totalbytes``
+    (either of which is ``None`` if not known up front) after ``elapsed`` seconds. ``rate`` is in
+    bytes per second and ``eta`` in seconds, each ``None`` if there's nothing to go on.
+    """
+
+    phase: str
+    files: int
+    totalfiles: Union[int, None]
+    bytes: int
+    totalbytes: Union[int, None]
+    elapsed: float
+    rate: Union[float, None]
+    eta: Union[float, None]
+    finished: bool
+
+    def describe(self) -> str:
+        """Describe this status in a few words fit for a log message."""
+        text = f"{self.phase}: {self.files:,}"
+        if self.totalfiles is not None:
+            text += f" of {self.totalfiles:,}"
+        text += " files"
+        if self.bytes or self.totalbytes:
+            text += f", {self.bytes / 1e6:,.1f}"
+            if self.totalbytes is not None:
+                text += f" of {self.totalbytes / 1e6:,.1f}"
+            text += " MB"
+            if self.rate is not None:
+                text += f" at {self.rate / 1e6:,.1f} MB/s"
+        if self.finished:
+            text += f" in {_hms(self.elapsed)}"
+        elif self.eta is not None:
+            text += f", about {_hms(self.eta)} to go"
+        return text
+
+
+class Progress(object):
+    """Progress of a phase of the work.
+
+    Call ``advance`` as files get done; at most every ``setprogressinterval`` seconds this logs a
+    report and tells the ``IProgressListener`` utility, if any. Use it as a context manager to report
+    once more when the phase is over. It's safe to advance from multiple threads.
+    """
+
+    def __init__(self, phase, totalfiles=None, totalbytes=None):
+        """Start the ``phase`` (a short name) of ``totalfiles`` files and ``totalbytes`` bytes, if known."""
+        self.phase, self.totalfiles, self.totalbytes = phase, totalfiles, totalbytes
+        self.files = self.bytes = 0
+        self._start = self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self, files=1, nbytes=0):
+        """Note that ``files`` more files of ``nbytes`` bytes in total are done, reporting if it's time."""
+        with self._lock:
+            self.files += files
+            self.bytes += nbytes
+            now = time.monotonic()
+            if now - self._last < _interval:
+                return
+            self._last = now
+            status = self._status(now, False)
+        self._report(status, logging.INFO)
+
+    def status(self) -> ProgressStatus:
+        """Tell how far along we are right now."""
+        with self._lock:
+            return self._status(time.monotonic(), False)
+
+    def finish(self):
+        """Report that the phase is over."""
+        with self._lock:
+            status = self._status(time.monotonic(), True)
+        self._report(status, logging.DEBUG)
+
+    def _status(self, now, finished):
+        """Work out the status as of ``now``, which is ``finished`` or not."""
+        elapsed = now - self._start
+        rate = self.bytes / elapsed if self.bytes and elapsed > 0 else None
+
+        # Go by bytes if we know how many there are, since files vary so in size; otherwise by files
+        eta = None
+        if self.totalbytes and self.bytes:
+            eta = max(self.totalbytes - self.bytes, 0) * elapsed / self.bytes
+        elif self.totalfiles and self.files:
+            eta = max(self.totalfiles - self.files, 0) * elapsed / self.files
+        return ProgressStatus(
+            self.phase, self.files, self.totalfiles, self.bytes, self.totalbytes, elapsed, rate, eta, finished
+        )
+
+    def _report(self, status, level):
+        """Log the ``status`` at the given ``level`` and pass it on to any listener."""
+        _logger.log(level, "⏲ %s", status.describe())
+        listener = queryUtility(IProgressListener)
+        if listener is not None:
+            listener(status)
+
+    def __enter__(self):
+        """Enter a context."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Exit a context, finishing the phase only if it went well."""
+        if exc_info[0] is None:
+            self.finish()
+
+
+# Functions
+# ---------
+
+
+def _hms(seconds):
+    """Format a number of ``seconds`` as hours, minutes, and seconds."""
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+def setprogressinterval(interval):
+    """Report progress at most every ``interval`` seconds."""
+    global _interval
+    if interval <= 0:
+        raise ValueError(f"The progress interval must be positive, not {interval}")
+    _interval = interval
+
+
+def _positivefloat(value):
+    """Convert the command-line ``value`` into a number, insisting that it be more than zero."""
+    number = float(value)
+    if not number > 0.0:  # Written this way so NaN gets rejected too
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return number
+
+
+def addprogressarguments(parser):
+    """Add command-line arguments to the given argument ``parser`` to control progress reports."""
+    parser.add_argument(
+        "--progress-interval",
+        type=_positivefloat,
+        default=PROGRESS_INTERVAL,
+        metavar="SECONDS",
+        help="Report progress with rates and estimated time to go this often [%(default)s]",
+    )
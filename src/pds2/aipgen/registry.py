@@ -31,15 +31,26 @@
 # Imports
 # =======
 import argparse
+import concurrent.futures
 import dataclasses
+import functools
 import hashlib
 import logging
+import os.path
 import posixpath
+import queue
+import re
+import shutil
+import sqlite3
 import sys
+import tempfile
+import threading
+import time
 from datetime import datetime
 from http import HTTPStatus
 from typing import Any
 from typing import Iterator
+from typing import Optional
 from typing import Union
 from urllib.parse import urlparse
 
@@ -53,10 +64,21 @@ from .constants import AIP_SIP_DEFAULT_VERSION
 from .constants import PDS_LABEL_FILENAME_EXTENSION
 from .constants import PDS_TABLE_FILENAME_EXTENSION
 from .constants import PROVIDER_SITE_IDS
+from .httpcache import ResponseCache
+from .metrics import addmetricsarguments
+from .metrics import count
+from .metrics import observe
+from .metrics import openmetrics
+from .metrics import phase
+from .metrics import timed
+from .progress import addprogressarguments
+from .progress import Progress
+from .progress import setprogressinterval
 from .sip import writelabel as writesiplabel
 from .utils import addbundlearguments
 from .utils import addloggingarguments
 from .utils import fixmultislashes
+from .utils import positiveint
 
 
 # Constants
@@ -66,15 +88,26 @@ from .utils import fixmultislashes
 # -------
 
 _logger = logging.getLogger(__name__)  # The one true logger for PDS
-_progresslogging = 100  # How frequently to report PDS progress; every N items
 
 
 # PDS API Access
 # --------------
 
-_apiquerylimit = 50  # Pagination in the PDS API
+_apiquerylimit = 50  # Most lidvids to OR together in one query of the PDS API
+_pagesize = 50  # Products per page to start with when paging through the PDS API
+_maxpagesize = 1000  # Most products per page we'll grow to
+_minpagesize = 10  # Fewest products per page we'll shrink to
+_fastpage = 1.0  # Seconds a page can take for us to ask for bigger ones
+_slowpage = 10.0  # Seconds a page can take before we ask for smaller ones
 _defaultserver = "https://pds.nasa.gov/api/search/1/"  # Where to find the PDS API
 _searchkey = "ops:Harvest_Info.ops:harvest_date_time"  # How to sort products
+_defaultconcurrency = 8  # How many requests to have in flight to the PDS API at once
+_connecttimeout = 10.0  # Seconds to wait to connect to the PDS API
+_readtimeout = 60.0  # Seconds to wait between bytes from the PDS API
+_httpcachettl = 1.0  # Days to re-use cached PDS API responses that can't be validated
+_httpcachemaxsize = 1024  # Mebibytes of PDS API responses to cache
+_streamingbacklog = 1024  # Products to let pile up when streaming before the crawlers wait
+_streamingpoll = 0.1  # Seconds between checks by a waiting crawler that it should give up
 
 # Retry Configuration
 # -------------------
@@ -99,6 +132,7 @@ _proplabelmd5 = "ops:Label_File_Info.ops:md5_checksum"
 # Fields to request from API to minimize payload size
 # _searchkey must be included because it's accessed in _getproducts() line 244 for pagination
 _fields = [_propdataurl, _propdatamd5, _proplabelurl, _proplabelmd5, _searchkey]
+_md5matcher = re.compile(r"[0-9a-f]{32}")  # MD5 digests we can keep as raw bytes
 
 
 # Program/Module Metadata
@@ -115,12 +149,20 @@ __version__ = VERSION
 # =======
 
 
-@dataclasses.dataclass(order=True, frozen=True)
+@functools.total_ordering
+@dataclasses.dataclass(frozen=True, slots=True)
 class _File:
-    """A "PDS file" of some kind in the PDS Registry Service whose details we get via the PDS API."""
+    """A "PDS file" of some kind in the PDS Registry Service whose details we get via the PDS API.
 
-    url: str
-    md5: str
+    There can be millions of these, and their URLs mostly repeat the same scheme, host, and directories,
+    so rather than keep each URL whole we keep its directory (interned, so each one is stored just once)
+    and its file name separately, and the MD5 as 16 raw bytes rather than 32 hex digits (unless it's not
+    lowercase hex, in which case we keep it as is). Files still compare, hash, and sort by URL and MD5.
+    """
+
+    directory: str
+    name: str
+    digest: Union[bytes, str]
 
     @classmethod
     def make(cls, url, md5):
@@ -130,27 +172,187 @@ class _File:
         having to do weird things with ``__setattr__``. See https://dsh.re/f9fd7b for
         more information.
         """
-        return cls(fixmultislashes(url), md5)
-
+        directory, _, name = fixmultislashes(url).rpartition("/")
+        digest = bytes.fromhex(md5) if _md5matcher.fullmatch(md5) else md5
+        return cls(sys.intern(directory + "/") if directory else "", name, digest)
+
+    @property
+    def url(self) -> str:
+        """The URL of the file."""
+        return self.directory + self.name
+
+    @property
+    def md5(self) -> str:
+        """The MD5 digest of the file, in hex."""
+        return self.digest.hex() if isinstance(self.digest, bytes) else self.digest
+
+    def __lt__(self, other):
+        """Order files by URL and then MD5."""
+        if not isinstance(other, _File):
+            return NotImplemented
+        return (self.url, self.md5) < (other.url, other.md5)
+
+
+class _PageSizer:
+    """How many products to ask the PDS API for per page while paging through something.
+
+    This starts with some ``initial`` number and adapts: while pages come back quickly it doubles (up
+    to ``maximum``), and when they're slow, time out, or fail it halves (down to ``minimum``). Unless
+    it's ``adaptive``, though, how long pages take makes no difference; only failures shrink them.
+    That keeps the pages asked for the same from run to run, which is what a response cache needs to
+    find them again.
+    """
 
-def _get_session_with_retry() -> requests.Session:
-    """Create a requests session configured with retry logic and exponential backoff.
+    def __init__(
+        self, initial: int = _pagesize, maximum: int = _maxpagesize, minimum: int = _minpagesize, adaptive: bool = True
+    ):
+        """Start at ``initial`` products per page, never going above ``maximum`` or below ``minimum``."""
+        self.maximum, self.minimum, self.size = max(initial, maximum), min(initial, minimum), initial
+        self.adaptive = adaptive
+
+    def succeeded(self, elapsed: float):
+        """Note that a page took ``elapsed`` seconds to get."""
+        if not self.adaptive:
+            return
+        if elapsed < _fastpage:
+            self._resize(self.size * 2)
+        elif elapsed > _slowpage:
+            self._resize(self.size // 2)
+
+    def failed(self) -> bool:
+        """Note that a page couldn't be gotten; return True if it's worth trying again with smaller pages."""
+        if self.size <= self.minimum:
+            return False
+        self._resize(self.size // 2)
+        return True
+
+    def _resize(self, size: int):
+        """Change the page size to ``size``, staying within bounds."""
+        size = min(max(size, self.minimum), self.maximum)
+        if size != self.size:
+            _logger.debug("📏 Page size %d → %d", self.size, size)
+            self.size = size
+
+
+class RegistryClient:
+    """A client of the PDS API of a PDS Registry.
+
+    This owns one ``requests.Session`` whose connections get pooled and re-used across requests—and
+    across bundles, too, if you hang on to the client. It's safe to share among threads; make the
+    ``poolsize`` at least as big as the number of threads so connections needn't be thrown away.
+    The session retries on transient failures (500, 502, 503, 504) with exponential backoff to handle
+    API performance issues, and asks for compressed responses. How many products to get per page
+    adapts to how the PDS API copes; see ``_PageSizer``.
+    """
 
-    Returns a session that will automatically retry on transient failures (500, 502, 503, 504)
-    with exponential backoff to handle API performance issues.
+    def __init__(
+        self,
+        url: str = _defaultserver,
+        poolsize: int = _defaultconcurrency,
+        connecttimeout: float = _connecttimeout,
+        readtimeout: float = _readtimeout,
+        keepalive: bool = True,
+        cache: Union[ResponseCache, None] = None,
+        pagesize: int = _pagesize,
+        maxpagesize: int = _maxpagesize,
+    ):
+        """Make a client of the PDS API at ``url``.
+
+        Keep up to ``poolsize`` connections to it, waiting ``connecttimeout`` seconds to connect and
+        ``readtimeout`` seconds for each response. Unless ``keepalive`` is True, each connection gets
+        closed after a single request. If ``cache`` is given, it's a ``ResponseCache`` to consult and
+        fill in; the responses you get from it may come from the cache. Pages of products start at
+        ``pagesize`` products and may grow to ``maxpagesize``—but with a ``cache`` they stay at
+        ``pagesize`` so the same pages get asked for every run.
+        """
+        self.url, self.timeout, self.cache = url, (connecttimeout, readtimeout), cache
+        self.pagesize, self.maxpagesize = pagesize, maxpagesize
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        retry_strategy = Retry(
+            total=_retryattempts,
+            backoff_factor=_retrybackoff,
+            status_forcelist=_retrystatus,
+            allowed_methods=["GET"],  # Only retry GET requests
+            raise_on_status=False,  # Don't raise on bad status, let us handle it
+        )
+        adapter = HTTPAdapter(pool_connections=poolsize, pool_maxsize=poolsize, max_retries=retry_strategy)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not keepalive:
+            self.session.headers["Connection"] = "close"
+
+    def get(self, path: str, params: Union[dict[str, Any], None] = None) -> requests.Response:
+        """Make a GET request for the ``path`` (which should start with ``/``) with the given ``params``."""
+        start = time.perf_counter()
+        if self.cache is None:
+            r = self.session.get(f"{self.url}{path}", params=params, timeout=self.timeout)
+        else:
+            url = requests.Request("GET", f"{self.url}{path}", params=params).prepare().url
+            r = self.cache.fetch(self.session, url, self.timeout)
+        observe("http", time.perf_counter() - start)
+        count("http.requests")
+        count(f"http.status.{r.status_code}")
+        return r
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        """Use the client as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the client."""
+        self.close()
+
+
+class _Table:
+    """A table file of a PDS deep archive written an entry at a time.
+
+    It keeps a running MD5, size, and count of the entries as it goes. Entries go to a temporary file
+    beside ``fn`` that takes its place only when the table's closed without a problem, so a crawl that
+    fails partway through doesn't leave a half-written table behind.
     """
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=_retryattempts,
-        backoff_factor=_retrybackoff,
-        status_forcelist=_retrystatus,
-        allowed_methods=["GET"],  # Only retry GET requests
-        raise_on_status=False,  # Don't raise on bad status, let us handle it
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
+
+    def __init__(self, fn: str):
+        """Open the table file named ``fn`` for writing."""
+        self.fn, self.size, self.count = fn, 0, 0
+        self._hashish = hashlib.new("md5", usedforsecurity=False)
+        self._out = open(fn + ".new", "wb")
+
+    def write(self, entry: bytes):
+        """Write the ``entry`` to the table."""
+        self._out.write(entry)
+        self._hashish.update(entry)
+        self.size += len(entry)
+        self.count += 1
+
+    def stats(self) -> tuple[str, int, int]:
+        """Return a triple of the MD5 of the table, its size in bytes, and its number of entries."""
+        return self._hashish.hexdigest(), self.size, self.count
+
+    def close(self):
+        """Close the table file, putting it in place as ``fn``."""
+        self._out.close()
+        os.replace(self._out.name, self.fn)
+
+    def discard(self):
+        """Close the table file and throw it away."""
+        self._out.close()
+        os.remove(self._out.name)
+
+    def __enter__(self):
+        """Use the table as a context manager that closes it on exit, or discards it on an exception."""
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        """Close the table, or discard it if there was an exception."""
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
 
 
 def _deurnlidvid(lidvid: str) -> tuple[str, str]:
@@ -185,17 +387,17 @@ def _makefilename(lidvid: str, ts: datetime, kind: str, ext: str) -> str:
     return f"{lid}_v{vid}_{slate}_{kind}_v{AIP_SIP_DEFAULT_VERSION}{ext}"
 
 
-def _getbundle(server_url: str, lidvid: str) -> Union[dict[str, Any], None]:
+def _getbundle(client: RegistryClient, lidvid: str) -> Union[dict[str, Any], None]:
     """Get a bundle.
 
-    Using the PDS API server at ``server_url`` ask for the bundle with the
+    Using the PDS API ``client`` ask for the bundle with the
     identifier ``lidvid`` and return a ``dict`` with its attributes.
     If it can't be found, return ``None``.
     """
-    session = _get_session_with_retry()
-    url = f"{server_url}/products/{lidvid}"
+    path = f"/products/{lidvid}"
+    url = client.url + path
     _logger.debug('Fetching bundle/product from %s', url)
-    r = session.get(url)
+    r = client.get(path)
     if r.status_code == HTTPStatus.NOT_FOUND:
         return None
     if not r.ok:
@@ -209,26 +411,39 @@ def _getbundle(server_url: str, lidvid: str) -> Union[dict[str, Any], None]:
         raise ValueError(f"Invalid JSON response from {url}: {e}") from e
 
 
-def _getproducts(server_url: str, lidvid: str, allcollections=True) -> Iterator[dict[str, Any]]:
+def _getproducts(client: RegistryClient, lidvid: str, allcollections=True) -> Iterator[dict[str, Any]]:
     """Get products (which could be collections of a dataset or products of a collection).
 
-    Using the PDS API server at ``server_url`` generate products that belong to ``lidvid``.
+    Using the PDS API ``client`` generate products that belong to ``lidvid``.
 
     If ``allcollections`` is True, then return all collections for LID-only references; otherwise
     return just the latest collection for LID-only references (has no effect on full LIDVID-references).
     """
-    session = _get_session_with_retry()
     # Commenting out `all` vs. `latest` functionality for now since the API does not support it at this time
-    # url = f"{server_url}/products/{lidvid}/members/{'all' if allcollections else 'latest'}"
-    url = f"{server_url}/products/{lidvid}/members"
+    # path = f"/products/{lidvid}/members/{'all' if allcollections else 'latest'}"
+    path = f"/products/{lidvid}/members"
+    url = client.url + path
     # Request only the fields we need to minimize payload size
-    params = {"sort": _searchkey, "limit": _apiquerylimit, "fields": ",".join(_fields)}
+    params: dict[str, Any] = {"sort": _searchkey, "fields": ",".join(_fields)}
+    pages = _PageSizer(client.pagesize, client.maxpagesize, adaptive=client.cache is None)
     while True:
+        params["limit"] = limit = pages.size
         _logger.debug('Making request to %s with params %r', url, params)
-        r = session.get(url, params=params)  # type: ignore
+        start = time.perf_counter()
+        try:
+            r = client.get(path, params=params)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            if pages.failed():
+                _logger.warning("⚠️ Request to %s failed; trying again with smaller pages", url)
+                continue
+            raise
         if not r.ok:
+            if r.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR and pages.failed():
+                _logger.warning("⚠️ HTTP %d from %s; trying again with smaller pages", r.status_code, url)
+                continue
             _logger.error("⚠️ Failed to fetch products from %s: HTTP %d", url, r.status_code)
             r.raise_for_status()
+        pages.succeeded(time.perf_counter() - start)
         try:
             data = r.json()
         except requests.exceptions.JSONDecodeError as e:
@@ -241,15 +456,16 @@ def _getproducts(server_url: str, lidvid: str, allcollections=True) -> Iterator[
         num_matches = len(matches)
         for i in matches:
             yield i
-        if num_matches < _apiquerylimit:
+        # The PDS API may give fewer than we asked for per page; it says how many in the summary
+        if num_matches < data.get("summary", {}).get("limit", limit):
             break
         params["search-after"] = matches[-1]["properties"][_searchkey]
 
 
-def _getcollections_batch(server_url: str, collection_lidvids: list[str]) -> Iterator[dict[str, Any]]:
+def _getcollections_batch(client: RegistryClient, collection_lidvids: list[str]) -> Iterator[dict[str, Any]]:
     """Get multiple collections efficiently by batching requests.
 
-    Using the PDS API server at ``server_url``, fetch all collections matching the given
+    Using the PDS API ``client``, fetch all collections matching the given
     ``collection_lidvids`` by batching them into groups of _apiquerylimit (50) and making
     one API call per batch using OR queries.
 
@@ -258,8 +474,6 @@ def _getcollections_batch(server_url: str, collection_lidvids: list[str]) -> Ite
     if not collection_lidvids:
         return
 
-    session = _get_session_with_retry()
-
     # Process collections in batches of _apiquerylimit to avoid query string limits
     for i in range(0, len(collection_lidvids), _apiquerylimit):
         batch = collection_lidvids[i:i + _apiquerylimit]
@@ -267,12 +481,11 @@ def _getcollections_batch(server_url: str, collection_lidvids: list[str]) -> Ite
         or_conditions = " or ".join([f'lidvid eq "{lidvid}"' for lidvid in batch])
         query = f"({or_conditions})"
 
-        url = f"{server_url}/products"
-        params = {"q": query, "limit": _apiquerylimit}
+        params = {"q": query, "limit": _apiquerylimit, "fields": ",".join(_fields)}
 
         _logger.debug('Batch fetching %d collections (batch %d-%d of %d)',
                       len(batch), i + 1, i + len(batch), len(collection_lidvids))
-        r = session.get(url, params=params)  # type: ignore
+        r = client.get("/products", params=params)
         if not r.ok:
             _logger.error("⚠️ Failed to batch fetch collections: HTTP %d", r.status_code)
             r.raise_for_status()
@@ -288,24 +501,124 @@ def _getcollections_batch(server_url: str, collection_lidvids: list[str]) -> Ite
             yield collection
 
 
-def _addfiles(product: dict, bac: dict):
-    """Add the PDS files described in the PDS ``product`` to the ``bac``."""
-    lidvid, props = product["id"], product["properties"]
-    files = bac.get(lidvid, set())  # Get the current set (or a new empty set)
-
+def _productfiles(product: dict) -> tuple[str, list[_File]]:
+    """Return the lidvid of the PDS ``product`` and a list of the PDS files it describes."""
+    lidvid, props, files = product["id"], product["properties"], []
     if _propdataurl in props:  # Are there data files in the product?
         urls, md5s = props[_propdataurl], props[_propdatamd5]  # Get the URLs and MD5s of them
         for url, md5 in zip(urls, md5s):  # For each URL and matching MD5
-            files.add(_File.make(url, md5))  # Add it to the set
+            files.append(_File.make(url, md5))  # Add it to the list
     if _proplabelurl in props:  # How about the label itself?
-        files.add(_File.make(props[_proplabelurl][0], props[_proplabelmd5][0]))  # Add it too
-    bac[lidvid] = files  # Stash for future use
+        files.append(_File.make(props[_proplabelurl][0], props[_proplabelmd5][0]))  # Add it too
+    return lidvid, files
+
+
+def _crawlcollection(client: RegistryClient, collection: dict) -> Iterator[tuple[str, list[_File]]]:
+    """Crawl a collection.
+
+    Generate the lidvid and files of the given PDS ``collection`` and then of each of its products,
+    which we get from the PDS API ``client``, in the order the API gives them.
+    """
+    yield _productfiles(collection)
+    # Still use /members endpoint for getting products from each collection
+    for product in _getproducts(client, collection["id"]):
+        yield _productfiles(product)
+    _logger.debug("🗂 Crawled collection %s", collection["id"])
+
+
+def _arrivals(executor: concurrent.futures.Executor, crawls: list) -> Iterator[tuple[str, list[_File]]]:
+    """Run each of the ``crawls`` (generators) with the ``executor`` and generate what they do as it arrives.
+
+    Only so much gets to pile up before the crawls wait for it to be consumed. If whoever's consuming
+    this gives up, so do the crawls.
+    """
+    arrived: queue.Queue[Optional[tuple[str, list[_File]]]] = queue.Queue(maxsize=_streamingbacklog)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        """Put ``item`` on the queue unless we're stopping, returning True if it got there."""
+        while not stop.is_set():
+            try:
+                arrived.put(item, timeout=_streamingpoll)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(crawl):
+        """Run the ``crawl``, marking the end of it with ``None`` even if it fails."""
+        try:
+            for item in crawl:
+                if not put(item):
+                    return
+        finally:
+            put(None)
+
+    futures = [executor.submit(run, crawl) for crawl in crawls]
+    try:
+        remaining = len(futures)
+        while remaining:
+            item = arrived.get()
+            if item is None:
+                remaining -= 1
+            else:
+                yield item
+        for future in futures:
+            future.result()  # Raise whatever went wrong, if anything did
+    finally:
+        stop.set()
+
 
+def _crawl(
+    client: RegistryClient, bundle: dict, concurrency=_defaultconcurrency, ordered=True
+) -> Iterator[tuple[str, list[_File]]]:
+    """Crawl a bundle.
 
-def _comprehendregistry(url: str, bundlelidvid: str, allcollections=True) -> tuple[dict, str]:
+    Generate the lidvid and files of the given PDS ``bundle`` (as returned by ``_getbundle``) and of
+    every collection and product in it, which we get from the PDS API ``client`` with up to
+    ``concurrency`` requests at a time. If ``ordered`` is True, generate them in the same order as if
+    we'd fetched everything one after another, which means holding on to each collection's products
+    until those of the collections before it are done. Otherwise, generate them in whatever order they
+    arrive, holding on to just a bounded number of them.
+    """
+    yield _productfiles(bundle)
+
+    # Get collection LIDVIDs from the bundle's properties instead of using the /members endpoint
+    # This avoids issues with the /members endpoint and uses the ref_lidvid_collection field
+    collection_lidvids = bundle.get("properties", {}).get("ref_lidvid_collection", [])
+    _logger.debug("📦 Found %d collections in bundle properties", len(collection_lidvids))
+
+    # Batch fetch all collections in groups of _apiquerylimit to minimize API calls, and crawl each
+    # collection's members, with up to ``concurrency`` requests at a time
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        batches = [
+            executor.submit(list, _getcollections_batch(client, collection_lidvids[i:i + _apiquerylimit]))
+            for i in range(0, len(collection_lidvids), _apiquerylimit)
+        ]
+        if ordered:
+            crawls = [
+                executor.submit(list, _crawlcollection(client, c)) for batch in batches for c in batch.result()
+            ]
+            for crawl in crawls:
+                yield from crawl.result()
+        else:
+            yield from _arrivals(executor, [_crawlcollection(client, c) for batch in batches for c in batch.result()])
+
+
+def _getbundleorfail(client: RegistryClient, bundlelidvid: str) -> dict:
+    """Get the PDS bundle ``bundlelidvid`` from the PDS API ``client``, raising ``ValueError`` if it's not there."""
+    bundle = _getbundle(client, bundlelidvid)
+    if bundle is None:
+        raise ValueError(f"🤷‍♀️ The bundle {bundlelidvid} cannot be found in the registry at {client.url}")
+    return bundle
+
+
+def _comprehendregistry(
+    client: RegistryClient, bundlelidvid: str, allcollections=True, concurrency=_defaultconcurrency
+) -> tuple[dict, str]:
     """Fathom the registry.
 
-    Query the PDS API at ``url`` for all information about the PDS ``bundlelidvid`` and return a
+    Query the PDS API ``client`` for all information about the PDS ``bundlelidvid`` and return a
     comprehension of it. If ``allcollections`` is True, we include every reference from a collection
     that's LID-only; if it's False, then we only include the latest reference form a LID-only reference.
     A "comprehension of it" means a double of the "B.A.C." (a dict mapping PDS lidvids to sets of ``_File``s),
@@ -315,32 +628,22 @@ def _comprehendregistry(url: str, bundlelidvid: str, allcollections=True) -> tup
     a collection with LID only (no VID), we include all version IDs of that collection. When this
     flag ``allcollections`` is False, then we include only the *latest* collection for a LID-only
     reference.
-    """
-    _logger.debug("🤔 Comprehending the registry at %s for %s", url, bundlelidvid)
 
-    # Set up our client connection
+    Collections and their members are fetched in parallel, with at most ``concurrency`` requests to the
+    PDS API at once; the B.A.C. comes out the same regardless.
+    """
+    _logger.debug("🤔 Comprehending the registry at %s for %s", client.url, bundlelidvid)
 
     # This is the "B.A.C." 😏
     bac: dict[str, set[_File]]
     bac = {}
 
-    bundle = _getbundle(url, bundlelidvid)
-    if bundle is None:
-        raise ValueError(f"🤷‍♀️ The bundle {bundlelidvid} cannot be found in the registry at {url}")
+    bundle = _getbundleorfail(client, bundlelidvid)
     title = bundle.get("title", "«unknown»")
-    _addfiles(bundle, bac)
-
-    # Get collection LIDVIDs from the bundle's properties instead of using the /members endpoint
-    # This avoids issues with the /members endpoint and uses the ref_lidvid_collection field
-    collection_lidvids = bundle.get("properties", {}).get("ref_lidvid_collection", [])
-    _logger.debug("📦 Found %d collections in bundle properties", len(collection_lidvids))
-
-    # Batch fetch all collections in groups of _apiquerylimit to minimize API calls
-    for collection in _getcollections_batch(url, collection_lidvids):
-        _addfiles(collection, bac)
-        # Still use /members endpoint for getting products from each collection
-        for product in _getproducts(url, collection["id"]):
-            _addfiles(product, bac)
+    with phase("crawl"), Progress("crawl") as progress:
+        for lidvid, files in _crawl(client, bundle, concurrency):
+            bac.setdefault(lidvid, set()).update(files)
+            progress.advance(len(files))
 
     # C'est tout 🌊
     return bac, title
@@ -351,6 +654,23 @@ def _urltocommonpath(url: str, pathprefix: str) -> str:
     return posixpath.relpath(urlparse(url).path, pathprefix)
 
 
+def _checksumentry(f: _File, pathprefix: str) -> bytes:
+    """Make the checksum manifest entry for the PDS file ``f``, stripping ``pathprefix`` off its path."""
+    return f"{f.md5}\t{_urltocommonpath(f.url, pathprefix)}\r\n".encode("utf-8")
+
+
+def _transferentry(lidvid: str, f: _File, pathprefix: str) -> bytes:
+    """Make the transfer manifest entry for the PDS file ``f`` of ``lidvid``, stripping ``pathprefix``."""
+    # We use [:254] because we hard code the ``/``:
+    return f"{lidvid:255}/{_urltocommonpath(f.url, pathprefix):254}\r\n".encode("utf-8")
+
+
+def _sipentry(lidvid: str, f: _File) -> bytes:
+    """Make the Submission Information Package entry for the PDS file ``f`` of ``lidvid``."""
+    return f"{f.md5}\tMD5\t{f.url}\t{lidvid}\r\n".encode("utf-8")
+
+
+@timed("write")
 def _writechecksummanifest(fn: str, pathprefix: str, bac: dict) -> tuple[str, int, int]:
     """Write an AIP "checksum manifest".
 
@@ -359,20 +679,20 @@ def _writechecksummanifest(fn: str, pathprefix: str, bac: dict) -> tuple[str, in
     of the manifest, its size in bytes, and a count of the number of entries in it.
     """
     hashish, size, count = hashlib.new("md5", usedforsecurity=False), 0, 0
-    with open(fn, "wb") as o:
+    with open(fn, "wb") as o, Progress("checksum manifest", _countfiles(bac)) as progress:
         for files in bac.values():
             for f in files:
-                entry = f"{f.md5}\t{_urltocommonpath(f.url, pathprefix)}\r\n".encode("utf-8")
+                entry = _checksumentry(f, pathprefix)
                 o.write(entry)
                 hashish.update(entry)
                 size += len(entry)
                 count += 1
-                if count % _progresslogging == 0:
-                    _logger.debug("⏲ Wrote %d entries into the checksum manifest %s", count, fn)
+                progress.advance()
     _logger.info("📄 Wrote AIP checksum manifest %s with %d entries", fn, count)
     return hashish.hexdigest(), size, count
 
 
+@timed("write")
 def _writetransfermanifest(fn: str, pathprefix: str, bac: dict) -> tuple[str, int, int]:
     """Write an AIP "transfer manifest".
 
@@ -382,21 +702,24 @@ def _writetransfermanifest(fn: str, pathprefix: str, bac: dict) -> tuple[str, in
     """
     _logger.debug("⚙️ Writing AIP transfer manifest to %s", fn)
     hashish, size, count = hashlib.new("md5", usedforsecurity=False), 0, 0
-    with open(fn, "wb") as o:
+    with open(fn, "wb") as o, Progress("transfer manifest", _countfiles(bac)) as progress:
         for lidvid, files in bac.items():
             for f in files:
-                # We use [:254] because we hard code the ``/``:
-                entry = f"{lidvid:255}/{_urltocommonpath(f.url, pathprefix):254}\r\n".encode("utf-8")
+                entry = _transferentry(lidvid, f, pathprefix)
                 o.write(entry)
                 hashish.update(entry)
                 size += len(entry)
                 count += 1
-                if count % _progresslogging == 0:
-                    _logger.debug("⏲ Wrote %d entries into the transfer manifest %s", count, fn)
+                progress.advance()
     _logger.info("📄 Wrote AIP transfer manifest %s with %d entries", fn, count)
     return hashish.hexdigest(), size, count
 
 
+def _countfiles(bac: dict) -> int:
+    """Count the files in the ``bac``, the same file under different lidvids counting more than once."""
+    return sum(len(files) for files in bac.values())
+
+
 def _writeaip(bundlelidvid: str, pathprefix: str, bac: dict, ts: datetime) -> str:
     """Create the PDS Archive Information Package.
 
@@ -408,15 +731,25 @@ def _writeaip(bundlelidvid: str, pathprefix: str, bac: dict, ts: datetime) -> st
     _logger.debug("⚙️ Creating AIP for %s", bundlelidvid)
     cmfn = _makefilename(bundlelidvid, ts, "checksum_manifest", PDS_TABLE_FILENAME_EXTENSION)
     tmfn = _makefilename(bundlelidvid, ts, "transfer_manifest", PDS_TABLE_FILENAME_EXTENSION)
-    cmmd5, cmsize, cmnum = _writechecksummanifest(cmfn, pathprefix, bac)
-    tmmd5, tmsize, tmnum = _writetransfermanifest(tmfn, pathprefix, bac)
+    cm = _writechecksummanifest(cmfn, pathprefix, bac)
+    tm = _writetransfermanifest(tmfn, pathprefix, bac)
+    _writeaiplabel(bundlelidvid, ts, cmfn, cm, tmfn, tm)
+    return cm[0]
+
+
+def _writeaiplabel(bundlelidvid: str, ts: datetime, cmfn: str, cm: tuple, tmfn: str, tm: tuple):
+    """Write the PDS label of an AIP.
+
+    The label for ``bundlelidvid`` at time ``ts`` describes the checksum manifest ``cmfn`` and the
+    transfer manifest ``tmfn``, whose MD5s, sizes, and entry counts are in the triples ``cm`` and ``tm``.
+    """
     labelfn = _makefilename(bundlelidvid, ts, "aip", PDS_LABEL_FILENAME_EXTENSION)
     lid, vid = _splitlidvid(bundlelidvid)
-    writeaiplabel(labelfn, f"{lid}_v{vid}", lid, vid, cmfn, cmmd5, cmsize, cmnum, tmfn, tmmd5, tmsize, tmnum, ts)
+    writeaiplabel(labelfn, f"{lid}_v{vid}", lid, vid, cmfn, *cm, tmfn, *tm, ts)
     _logger.info("📄 Wrote label for them both: %s", labelfn)
-    return cmmd5
 
 
+@timed("write")
 def _writesip(bundlelidvid: str, bac: dict, title: str, site: str, ts: datetime, cmmd5: str):
     """Write a Submission Information Package.
 
@@ -429,22 +762,32 @@ def _writesip(bundlelidvid: str, bac: dict, title: str, site: str, ts: datetime,
     _logger.debug("⚙️ Creating SIP for %s (title %s) for site %s", bundlelidvid, title, site)
     sipfn = _makefilename(bundlelidvid, ts, "sip", PDS_TABLE_FILENAME_EXTENSION)
     hashish, size, count = hashlib.new("md5", usedforsecurity=False), 0, 0
-    with open(sipfn, "wb") as o:
+    with open(sipfn, "wb") as o, Progress("SIP", _countfiles(bac)) as progress:
         for lidvid, files in bac.items():
             for f in files:
-                entry = f"{f.md5}\tMD5\t{f.url}\t{lidvid}\r\n".encode("utf-8")
+                entry = _sipentry(lidvid, f)
                 o.write(entry)
                 hashish.update(entry)
                 size += len(entry)
                 count += 1
-                if count % _progresslogging == 0:
-                    _logger.debug("⏲ Wrote %d entries into the submission info file %s", count, sipfn)
+                progress.advance()
     _logger.info("📄 Wrote SIP %s with %d entries", sipfn, count)
+    _writesiplabel(bundlelidvid, title, site, ts, cmmd5, sipfn, (hashish.hexdigest(), size, count))
+
+
+def _writesiplabel(bundlelidvid: str, title: str, site: str, ts: datetime, cmmd5: str, sipfn: str, sip: tuple):
+    """Write the PDS label of a SIP.
+
+    The label for ``bundlelidvid`` (titled ``title``) at time ``ts`` for the PDS ``site`` describes the
+    SIP table ``sipfn``, whose MD5, size, and entry count are in the triple ``sip``. The ``cmmd5`` is
+    the MD5 of the AIP's checksum manifest.
+    """
     labelfn = _makefilename(bundlelidvid, ts, "sip", PDS_LABEL_FILENAME_EXTENSION)
     _logger.info("📄 Wrote label for SIP: %s", labelfn)
+    md5, size, count = sip
     with open(labelfn, "wb") as o:
         lid, vid = _splitlidvid(bundlelidvid)
-        writesiplabel(lid, vid, title, hashish.hexdigest(), size, count, "MD5", sipfn, site, o, cmmd5, ts)
+        writesiplabel(lid, vid, title, md5, size, count, "MD5", sipfn, site, o, cmmd5, ts)
 
 
 def _findcommonpathprefix(bac: dict) -> str:
@@ -471,21 +814,111 @@ def _findcommonpathprefix(bac: dict) -> str:
     return posixpath.commonpath(paths(urls(bac)))
 
 
-def generatedeeparchive(url: str, bundlelidvid: str, site: str, allcollections=True):
+def _findbundlepathprefix(bundle: dict) -> str:
+    """Find the path prefix of the files of a PDS ``bundle`` up front, from the URL of its label.
+
+    Everything in a bundle normally lives at or below the directory of its label, so for a label URL
+    like https://atmos.nmsu.edu/pds4/data/airhead/bundle.xml the path prefix is ``/pds4/data/airhead``,
+    the same as ``_findcommonpathprefix`` would find but without having to see every file first.
+    """
+    urls = bundle.get("properties", {}).get(_proplabelurl)
+    if not urls:
+        raise ValueError(f"🤷‍♀️ The bundle {bundle.get('id')} has no label URL to find the path prefix from")
+    return posixpath.dirname(urlparse(fixmultislashes(urls[0])).path)
+
+
+def _streamdeeparchive(
+    client: RegistryClient,
+    bundlelidvid: str,
+    site: str,
+    ts: datetime,
+    allcollections=True,
+    concurrency=_defaultconcurrency,
+):
+    """Make a PDS "deep archive" in the current directory a PDS product at a time.
+
+    This is like ``generatedeeparchive`` but writes the AIP's checksum and transfer manifests and the
+    SIP's table as products arrive from the PDS API ``client``, so memory stays bounded no matter how
+    big the bundle. The (lidvid, file) pairs already written are remembered in a scratch SQLite
+    database on disk, and the path prefix comes from the bundle's label URL. Entries appear in the
+    order they arrive rather than grouped in collection order.
+    """
+    _logger.debug("🌊 Streaming the registry at %s for %s", client.url, bundlelidvid)
+    bundle = _getbundleorfail(client, bundlelidvid)
+    title, pathprefix = bundle.get("title", "«unknown»"), _findbundlepathprefix(bundle)
+    cmfn = _makefilename(bundlelidvid, ts, "checksum_manifest", PDS_TABLE_FILENAME_EXTENSION)
+    tmfn = _makefilename(bundlelidvid, ts, "transfer_manifest", PDS_TABLE_FILENAME_EXTENSION)
+    sipfn = _makefilename(bundlelidvid, ts, "sip", PDS_TABLE_FILENAME_EXTENSION)
+    tempdir, outside = tempfile.mkdtemp(suffix=".dir", prefix="stream"), False
+    try:
+        con = sqlite3.connect(os.path.join(tempdir, "seen.sqlite3"))
+        try:
+            con.execute("PRAGMA journal_mode = OFF")
+            con.execute("PRAGMA synchronous = OFF")
+            con.execute(
+                "CREATE TABLE seen (lidvid text NOT NULL, url text NOT NULL, md5 text NOT NULL,"
+                " PRIMARY KEY (lidvid, url, md5)) WITHOUT ROWID"
+            )
+            with _Table(cmfn) as cm, _Table(tmfn) as tm, _Table(sipfn) as sip, phase("crawl"), Progress("stream") as progress:
+                for lidvid, files in _crawl(client, bundle, concurrency, ordered=False):
+                    for f in files:
+                        cursor = con.execute("INSERT OR IGNORE INTO seen VALUES (?,?,?)", (lidvid, f.url, f.md5))
+                        if cursor.rowcount == 0:
+                            continue  # Already wrote this one
+                        if not outside and not urlparse(f.url).path.startswith(pathprefix + "/"):
+                            _logger.warning("⚠️ %s is outside the bundle's directory %s", f.url, pathprefix)
+                            outside = True
+                        cm.write(_checksumentry(f, pathprefix))
+                        tm.write(_transferentry(lidvid, f, pathprefix))
+                        sip.write(_sipentry(lidvid, f))
+                        progress.advance()
+        finally:
+            con.close()
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+    _logger.info("📄 Wrote AIP checksum manifest %s with %d entries", cmfn, cm.count)
+    _logger.info("📄 Wrote AIP transfer manifest %s with %d entries", tmfn, tm.count)
+    _writeaiplabel(bundlelidvid, ts, cmfn, cm.stats(), tmfn, tm.stats())
+    _logger.info("📄 Wrote SIP %s with %d entries", sipfn, sip.count)
+    _writesiplabel(bundlelidvid, title, site, ts, cm.stats()[0], sipfn, sip.stats())
+
+
+def generatedeeparchive(
+    url: Union[str, RegistryClient],
+    bundlelidvid: str,
+    site: str,
+    allcollections=True,
+    concurrency=_defaultconcurrency,
+    streaming=False,
+):
     """Make a PDS "deep archive" 🧘 in the current directory.
 
     A PDS "deep archive" 🧘‍♀️ (consisting of the Archive Information Package's transfer manifest and
     checksum manifest, and the Submission Information Package's table file—plus their corresponding
     labels) for the named PDS bundle identified by ``bundlelidvid``, for the PDS ``site``, using knowledge
     in the PDS Registry at ``url``, including ``allcollections`` if True else just the latest collection
-    for PDS bundles that reference collections by logical identifier only.
+    for PDS bundles that reference collections by logical identifier only. Make up to ``concurrency``
+    requests of the PDS API at a time. If ``streaming`` is True, write the tables as products arrive
+    rather than gathering them all up first; see ``_streamdeeparchive``.
+
+    The ``url`` may instead be a ``RegistryClient``, which is handy for making deep archives of many
+    bundles over the same pooled connections.
     """
+    if not isinstance(url, RegistryClient):
+        with RegistryClient(url, poolsize=concurrency) as client:
+            return generatedeeparchive(client, bundlelidvid, site, allcollections, concurrency, streaming)
+
     # When is happening? Make a timestamp and remove the timezone info
     ts = datetime.utcnow()
     ts = datetime(ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.second, microsecond=0, tzinfo=None)
 
+    # By now, ``url`` is a ``RegistryClient``
+    if streaming:
+        _streamdeeparchive(url, bundlelidvid, site, ts, allcollections, concurrency)
+        return
+
     # Figure out what we're dealing with
-    bac, title = _comprehendregistry(url, bundlelidvid, allcollections)
+    bac, title = _comprehendregistry(url, bundlelidvid, allcollections, concurrency)
     pathprefix = _findcommonpathprefix(bac)
 
     # Make it rain ☔️
@@ -505,17 +938,117 @@ def main():
     parser.add_argument(
         "-s", "--site", required=True, choices=PROVIDER_SITE_IDS, help="Provider site ID for the manifest's label"
     )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=positiveint,
+        default=_defaultconcurrency,
+        metavar="N",
+        help="Maximum number of requests to make of the PDS API at once [%(default)s]",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=positiveint,
+        metavar="N",
+        help="Number of connections to the PDS API to keep open; defaults to the concurrency",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=_connecttimeout,
+        metavar="SECONDS",
+        help="How long to wait to connect to the PDS API [%(default)s]",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=_readtimeout,
+        metavar="SECONDS",
+        help="How long to wait for the PDS API to respond [%(default)s]",
+    )
+    parser.add_argument(
+        "--no-keep-alive",
+        action="store_false",
+        dest="keepalive",
+        help="Close each connection to the PDS API after a single request",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=positiveint,
+        default=_pagesize,
+        metavar="N",
+        help="Number of products to ask the PDS API for per page to begin with [%(default)s]",
+    )
+    parser.add_argument(
+        "--max-page-size",
+        type=positiveint,
+        default=_maxpagesize,
+        metavar="N",
+        help="Most products per page to ask for while the PDS API responds quickly [%(default)s]",
+    )
+    parser.add_argument(
+        "--http-cache",
+        metavar="CACHE.SQLITE3",
+        help="Remember responses from the PDS API in this SQLite database and re-use them on later runs",
+    )
+    parser.add_argument(
+        "--http-cache-ttl",
+        type=float,
+        default=_httpcachettl,
+        metavar="DAYS",
+        help="How long to re-use cached responses the PDS API gave no ETag or Last-Modified for [%(default)s]",
+    )
+    parser.add_argument(
+        "--http-cache-max-size",
+        type=positiveint,
+        default=_httpcachemaxsize,
+        metavar="MIB",
+        help="How big the response cache may get, in mebibytes [%(default)s]",
+    )
+    addmetricsarguments(parser)
+    addprogressarguments(parser)
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Write the manifests as products arrive instead of gathering them all in memory first",
+    )
     parser.add_argument("bundle", help="LIDVID of the PDS bundle for which to create a PDS Deep Archive")
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel, format="%(levelname)s %(message)s")
     _logger.info("👟 PDS Deep Registry-based Archive, version %s", __version__)
     _logger.debug("💢 command line args = %r", args)
+    setprogressinterval(args.progress_interval)
+    cache, metrics = None, openmetrics(args)
+    if args.http_cache:
+        _logger.debug("🗄 Using response cache %s", args.http_cache)
+        cache = ResponseCache(args.http_cache, args.http_cache_ttl, args.http_cache_max_size * 2**20)
     try:
-        generatedeeparchive(args.url, args.bundle, args.site, not args.include_latest_collection_only)
+        with RegistryClient(
+            args.url,
+            args.pool_size or args.concurrency,
+            args.connect_timeout,
+            args.read_timeout,
+            args.keepalive,
+            cache,
+            args.page_size,
+            args.max_page_size,
+        ) as client:
+            generatedeeparchive(
+                client,
+                args.bundle,
+                args.site,
+                not args.include_latest_collection_only,
+                args.concurrency,
+                args.streaming,
+            )
     except Exception:
         _logger.exception("💥 We got an unexpected error; sorry it didn't work out")
         sys.exit(-1)
     finally:
+        if cache is not None:
+            cache.close()
+        if metrics is not None:
+            metrics.write(args.metrics)
         _logger.info("👋 Thanks for using this program! Bye!")
     sys.exit(0)
 
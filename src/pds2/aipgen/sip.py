@@ -29,6 +29,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """Submission Information Package."""
 import argparse
+import concurrent.futures
 import hashlib
 import logging
 import os.path
@@ -36,15 +37,20 @@ import shutil
 import sqlite3
 import sys
 import tempfile
+import urllib.error
 import urllib.request
-from datetime import datetime
 from urllib.parse import urlparse
 
+import requests
 from lxml import etree
+from requests.adapters import HTTPAdapter
 from zope.component import provideUtility  # type: ignore
 from zope.component import queryUtility  # type: ignore
 
 from . import VERSION
+from .checkpoint import addcheckpointarguments
+from .checkpoint import maketimestamp
+from .checkpoint import opencheckpoint
 from .constants import AIP_PRODUCT_URI_PREFIX
 from .constants import AIP_SIP_DEFAULT_VERSION
 from .constants import HASH_ALGORITHMS
@@ -57,16 +63,33 @@ from .constants import PROVIDER_SITE_IDS
 from .constants import SIP_MANIFEST_URL
 from .constants import XML_MODEL_PI
 from .constants import XML_SCHEMA_INSTANCE_NS_URI
+from .digestcache import opendigestcache
+from .hashing import digeststream
+from .hashing import getfiledigest
+from .hashing import setblocksize
 from .interfaces import IURLValidator
+from .metrics import addmetricsarguments
+from .metrics import openmetrics
+from .metrics import timed
+from .progress import addprogressarguments
+from .progress import Progress
+from .progress import setprogressinterval
 from .utils import addbundlearguments
+from .utils import addcatalogarguments
+from .utils import addhashingarguments
 from .utils import addloggingarguments
 from .utils import comprehenddirectory
 from .utils import createschema
+from .utils import filesize
 from .utils import getdigest
-from .utils import getlogicalversionidentifier
+from .utils import getlabelinfo
 from .utils import getmd5
-from .utils import parsexml
+from .utils import isunder
+from .utils import resolvelabels
 from .utils import URLValidator
+from .verify import addverifyarguments
+from .verify import readsiptable
+from .verify import runverification
 
 
 # Defaults & Constants
@@ -105,6 +128,17 @@ _recordboilerplate = (
     ("LIDVID", "Unique product lidvid that contains this file"),
 )
 
+# PDS names of hash algorithms (as they appear in SIP tables) by their ``hashlib`` names
+_pdshashnames = {hashname: pdsname for pdsname, hashname in HASH_ALGORITHMS.items()}
+
+# Prefix of URLs to local files, as made by ``_populate``
+_fileurlprefix = "file:"
+
+# Fetching files to digest
+_fetchthreads = 8  # Files to fetch and digest at once
+_fetchwindow = 1024  # Most files to have in flight at once, so millions of them don't all become futures
+_fetchtimeout = (30.0, 300.0)  # Seconds to wait to connect to and then hear back from web servers
+
 # Internal reference boilerplate
 _intrefboilerplate = "Links this SIP to the specific version of the bundle product in the PDS registry system"
 
@@ -115,33 +149,111 @@ _intrefboilerplate = "Links this SIP to the specific version of the bundle produ
 _logger = logging.getLogger(__name__)
 
 
+# Classes
+# -------
+
+
+class _DigestFetcher(object):
+    """Fetches files by URL and computes their digests.
+
+    Local ``file:`` URLs are read directly (through the digest store if there's one installed, so files
+    already digested, say for an AIP, aren't read again). ``http:`` and ``https:`` URLs are fetched with
+    a session that keeps a pool of connections alive. Anything else goes through ``urllib``. Either way,
+    failures are raised as ``urllib.error.URLError``. It's safe to use from multiple threads.
+    """
+
+    def __init__(self, hashname, poolsize=_fetchthreads):
+        """Compute digests with the algorithm named ``hashname``, keeping up to ``poolsize`` connections."""
+        self.hashname = hashname
+        self.session = requests.Session()
+        # Digest the bytes of the file itself, not some compressed (or, worse, decompressed) rendition of them
+        self.session.headers["Accept-Encoding"] = "identity"
+        adapter = HTTPAdapter(pool_connections=poolsize, pool_maxsize=poolsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def digest(self, url):
+        """Return the hex digest of the file at ``url``."""
+        if url.startswith(_fileurlprefix):
+            try:
+                return getfiledigest(url[len(_fileurlprefix):], self.hashname)
+            except OSError as error:
+                raise urllib.error.URLError(error) from error
+        if url.startswith(("http://", "https://")):
+            try:
+                with self.session.get(url, stream=True, timeout=_fetchtimeout) as r:
+                    if not r.ok:
+                        raise urllib.error.URLError(f"HTTP {r.status_code} {r.reason}")
+                    return digeststream(r.raw, self.hashname)
+            except requests.exceptions.RequestException as error:
+                raise urllib.error.URLError(error) from error
+        return getdigest(url, self.hashname)
+
+    def close(self):
+        """Let go of any connections."""
+        self.session.close()
+
+    def __enter__(self):
+        """Enter a context."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Exit a context."""
+        self.close()
+
+
 # Functions
 # ---------
 
 
+def _fetchdigests(fetcher, urls, progress, sizes, threads=_fetchthreads):
+    """Fetch digests.
+
+    Compute the digests of the files at ``urls`` with the ``_DigestFetcher`` using up to ``threads``
+    threads, advancing the ``progress`` as each is done by its size in ``sizes``, if known. Return a
+    dict mapping each URL to its digest, leaving out those that couldn't be retrieved.
+    """
+
+    def fetch(url):
+        try:
+            return fetcher.digest(url)
+        except urllib.error.URLError as error:
+            _logger.info("Problem retrieving «%s» for digest: %r; ignoring", url, error)
+            return None
+        finally:
+            progress.advance(1, sizes.get(url, 0))
+
+    digests = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        # Go a window at a time so the number of futures stays bounded
+        for start in range(0, len(urls), _fetchwindow):
+            window = urls[start:start + _fetchwindow]
+            digests.update((url, d) for url, d in zip(window, executor.map(fetch, window)) if d is not None)
+    return digests
+
+
 def _getdigests(lidvidstofiles, hashname):
     """Get digests.
 
     ``lidvidstofiles`` is a mapping of lidvid (string) to a set of matching file URLs.
     Using a digest algorithm identified by ``hashname``, retrieve each URL's content and cmpute
-    its digest. Return a sequence of triples of (url, digest (hex string), and lidvid)
+    its digest, several at a time. A file that appears under more than one lidvid is retrieved just
+    once, and one that can't be retrieved is left out. Return a sequence of triples of (url, digest
+    (hex string), and lidvid), sorted.
     """
-    _logger.debug("∛ Computing digests for %d files using %s", sum([len(i) for i in lidvidstofiles.values()]), hashname)
-
-    withdigests = []
-    # TODO: potential optimization is that if the same file appears for multiple lidvids we retrieve it
-    # multiple times; we could cache previous hash computations.
-    # 🩹 BANDAID: ``getdigests`` has an LRU cache.
-    for lidvid, files in lidvidstofiles.items():
-        for url in files:
-            try:
-                d = getdigest(url, hashname)
-                withdigests.append((url, d, lidvid))
-            except urllib.error.URLError as error:
-                _logger.info("Problem retrieving «%s» for digest: %r; ignoring", url, error)
-    return withdigests
+    urls = sorted({url for files in lidvidstofiles.values() for url in files})
+    _logger.debug("∛ Computing digests for %d files using %s", len(urls), hashname)
+
+    # Only local files have sizes we can know up front; that's most of them
+    sizes = {url: filesize(url[len(_fileurlprefix):]) for url in urls if url.startswith(_fileurlprefix)}
+    with _DigestFetcher(hashname) as fetcher, Progress("digests", len(urls), sum(sizes.values())) as progress:
+        digests = _fetchdigests(fetcher, urls, progress, sizes)
+    return sorted(
+        (url, digests[url], lidvid) for lidvid, files in lidvidstofiles.items() for url in files if url in digests
+    )
 
 
+@timed("write")
 def _writetable(hashedfiles, hashname, manifest, baseurl, bp):
     """Write a table.
 
@@ -152,7 +264,9 @@ def _writetable(hashedfiles, hashname, manifest, baseurl, bp):
     written.  ``bp`` is the base path that'll get stripped from URLs before writing.
     """
     _logger.debug("⎍ Writing SIP table with hash %s", hashname)
-    hashish, size, hashname, count, bp = hashlib.new("md5", usedforsecurity=False), 0, hashname.upper(), 0, bp.replace("\\", "/")
+    hashish, size, count, bp = hashlib.new("md5", usedforsecurity=False), 0, 0, bp.replace("\\", "/")
+    hashname = _pdshashnames.get(hashname, hashname.upper())
+    progress = Progress("SIP", len(hashedfiles))
     for url, digest, lidvid in sorted(hashedfiles):
         if baseurl.endswith("/"):
             baseurl = baseurl[:-1]
@@ -174,11 +288,12 @@ def _writetable(hashedfiles, hashname, manifest, baseurl, bp):
         manifest.write(entry)
         size += len(entry)
         count += 1
-        if count % 100 == 0:
-            _logger.info("⏰ Wrote %d entries into the SIP", count)
+        progress.advance()
+    progress.finish()
     return hashish.hexdigest(), size
 
 
+@timed("label")
 def writelabel(
     logicalid,
     versionid,
@@ -322,11 +437,13 @@ def writelabel(
 
 def addsiparguments(parser):
     """Add submission information package argument handling to the given argument ``parser``."""
-    # TODO: Temporarily commenting out this argument until an input manifest is available
-    # parser.add_argument(
-    #     '-a', '--algorithm', default='MD5', choices=sorted(HASH_ALGORITHMS.keys()),
-    #     help='File hash (checksum) algorithm; default %(default)s'
-    # )
+    parser.add_argument(
+        "-a",
+        "--algorithm",
+        default="MD5",
+        choices=sorted(HASH_ALGORITHMS.keys()),
+        help="File hash (checksum) algorithm; default %(default)s",
+    )
     parser.add_argument(
         "-s", "--site", required=True, choices=PROVIDER_SITE_IDS, help="Provider site ID for the manifest's label"
     )
@@ -355,62 +472,50 @@ def addsiparguments(parser):
     )
 
 
-def _populate(lid, vid, lidvidstofiles, allcollections, con):
+def _populate(lid, vid, lidvidstofiles, allcollections, con, root=None):
     """Populate the LIDVIDs-to-files.
 
     Populate the ``lidvidstofiles`` dict (which maps ``lid::vid`` → set of ``file:`` URLs) with
-    data from ``con`` by recursively looking for file referenced by the label ``lid``::``vid``,
-    following bundle member entires to other XML labels. When those references are full lidvid
-    references, it's easy. But when they're just logical ID references, then we take just the
-    latest version ID except if ``allcollections`` is True, then we take *all* version IDs.
+    data from ``con`` by looking for file referenced by the label ``lid``::``vid``, following
+    bundle member entires to other XML labels. When those references are full lidvid references,
+    it's easy. But when they're just logical ID references, then we take just the latest version
+    ID except if ``allcollections`` is True, then we take *all* version IDs. If ``root`` is given,
+    only labels and files in and under that directory count.
     """
     _logger.debug("📥 Organizing files by %s::%s", lid, vid)
-    lidvid = f"{lid}::{vid}"
     cursor = con.cursor()
-    cursor.execute("SELECT filepath FROM label_file_references WHERE lid = ? AND vid = ?", ((lid, vid)))
-    matchingfiles = set(["file:" + i[0] for i in cursor.fetchall()])
-    filessofar = lidvidstofiles.get(lidvid, set())
-    filessofar |= matchingfiles
-    lidvidstofiles[lidvid] = filessofar
-    _logger.debug("⧟ Following inter-label references from %s::%s with allcollections=%r", lid, vid, allcollections)
-    cursor.execute("SELECT to_lid, to_vid FROM inter_label_references WHERE lid = ? AND vid = ?", ((lid, vid)))
-    for to_lid, to_vid in cursor.fetchall():
-        # lid-only reference: capture ``allcollections`` or just the latest
-        if to_vid is None:
-            if allcollections:
-                cursor.execute("SELECT vid FROM labels WHERE lid = ?", (to_lid,))
-                for to_vid in [i[0] for i in cursor.fetchall()]:
-                    _populate(to_lid, to_vid, lidvidstofiles, allcollections, con)
-            else:
-                # Note that ``max(vid)`` isn't sufficient since it's text and therefore 2.0 > 10.0; however
-                # to do this right we'd have to make (major, minor) ver cols out of version IDs or provide a
-                # sqlite3 C extension with a custom collator. Close 'nuff for gov't work 😁
-                cursor.execute("SELECT max(vid) FROM labels WHERE lid = ?", (to_lid,))
-                to_vid = cursor.fetchone()[0]
-                _populate(to_lid, to_vid, lidvidstofiles, allcollections, con)
-        else:
-            # It's a specific lid+vid
-            _populate(to_lid, to_vid, lidvidstofiles, allcollections, con)
-
-
-def _gettitle(tree):
+    for to_lid, to_vid in resolvelabels(con, lid, vid, allcollections, root):
+        cursor.execute("SELECT filepath FROM label_file_references WHERE lid = ? AND vid = ?", (to_lid, to_vid))
+        lidvidstofiles.setdefault(f"{to_lid}::{to_vid}", set()).update(
+            _fileurlprefix + i[0] for i in cursor.fetchall() if root is None or isunder(i[0], root)
+        )
+
+
+def _gettitle(info):
     """Get the title.
 
-    Get the title of the XML label in the given ``tree`` by following from the root of
-    the tree to the Identification Area and thence the title, returning a sentinel string
-    if it's not found.
+    Get the title of the XML label described by the given ``LabelInfo``, returning a sentinel
+    string if it's not found.
     """
-    root = tree.getroot()
-    matches = root.findall(f"./{{{PDS_NS_URI}}}Identification_Area/{{{PDS_NS_URI}}}title")
-    if matches:
-        return matches[0].text.strip()
+    if info.title is not None:
+        return info.title
     else:
         _logger.warning("❓ Bundle missing <title>")
         return "«unknown»"
 
 
 def produce(
-    bundle, hashname, registryserviceurl, insecureconnectionflag, site, baseurl, aipfile, allcollections, con, timestamp
+    bundle,
+    hashname,
+    registryserviceurl,
+    insecureconnectionflag,
+    site,
+    baseurl,
+    aipfile,
+    allcollections,
+    con,
+    timestamp,
+    root=None,
 ):
     """Produce the submission information package.
 
@@ -421,21 +526,24 @@ def produce(
     latest version of such referenced labels unless ``allcollections`` is True.  Return the names
     of the manifest file and the label file generated. ``con`` is a sqlite3 database connection
     we can use as lookup and storage. The ``timestamp`` is used for the creation date in the
-    label for the SIP and also in filenames or the label and SIP.
+    label for the SIP and also in filenames or the label and SIP. Only labels and files in and under
+    the ``root`` directory count; it defaults to the bundle's own directory, since ``con`` may catalog
+    more than that. The catalog already knows the latest versions there, so that default costs nothing extra.
     """
     _logger.info("🏃‍♀️ Starting SIP generation for %s", bundle.name)
 
-    tree = parsexml(bundle)
-    lid, vid = getlogicalversionidentifier(tree)
-    title = _gettitle(tree)
+    info = getlabelinfo(bundle.name)
+    lid, vid = info.lid, info.vid
+    title = _gettitle(info)
     strippedlogicalid = lid.split(":")[-1] + "_v" + vid
     filename = strippedlogicalid + "_" + timestamp.date().strftime("%Y%m%d") + "_sip_v" + AIP_SIP_DEFAULT_VERSION
     manifestfilename = filename + PDS_TABLE_FILENAME_EXTENSION
     labelfilename = filename + PDS_LABEL_FILENAME_EXTENSION
     bundle = os.path.abspath(bundle.name)
+    root = os.path.dirname(bundle) if root is None else root
     lidvidstofiles = {}
 
-    _populate(lid, vid, lidvidstofiles, allcollections, con)
+    _populate(lid, vid, lidvidstofiles, allcollections, con, root)
     hashedfiles = _getdigests(lidvidstofiles, hashname)
     with open(manifestfilename, "wb") as manifest:
         md5, size = _writetable(hashedfiles, hashname, manifest, baseurl, os.path.dirname(os.path.dirname(bundle)))
@@ -467,6 +575,12 @@ def main():
     addbundlearguments(parser)
     addsiparguments(parser)
     addloggingarguments(parser)
+    addcatalogarguments(parser)
+    addhashingarguments(parser)
+    addmetricsarguments(parser)
+    addprogressarguments(parser)
+    addcheckpointarguments(parser)
+    addverifyarguments(parser)
     parser.add_argument(
         "bundle",
         type=argparse.FileType("rb"),
@@ -483,6 +597,20 @@ def main():
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel, format="%(levelname)s %(message)s")
     _logger.debug("⚙️ command line args = %r", args)
+    setblocksize(args.block_size)
+    setprogressinterval(args.progress_interval)
+    if args.verify:
+        # Check an existing SIP table against the bundle; its URLs map to files via the bundle base URL
+        dn, metrics = os.path.dirname(os.path.abspath(args.bundle.name)), openmetrics(args)
+        try:
+            entries = readsiptable(args.verify, args.bundle_base_url, os.path.dirname(dn))
+            status = runverification(args, entries, dn, (args.verify,))
+        finally:
+            if metrics is not None:
+                metrics.write(args.metrics)
+        sys.exit(status)
+    checkpoint = opencheckpoint(parser, args)
+    cache, metrics = opendigestcache(args), openmetrics(args)
 
     # https://github.com/NASA-PDS/pds-deep-archive/issues/102
     if not args.disable_url_validation:
@@ -491,25 +619,25 @@ def main():
     tempdir = tempfile.mkdtemp(suffix=".dir", prefix="sip")
     try:
         # Survey the surgical field
-        dbfile = os.path.join(tempdir, "pds-deep-archive.sqlite3")
+        dbfile = args.catalog or os.path.join(tempdir, "pds-deep-archive.sqlite3")
         con = sqlite3.connect(dbfile)
-        _logger.debug("⚙️ Creating potentially future-mulitprocessing–capable DB in %s", dbfile)
+        _logger.debug("⚙️ Using potentially future-mulitprocessing–capable DB in %s", dbfile)
         with con:
             createschema(con)
-            comprehenddirectory(os.path.dirname(os.path.abspath(args.bundle.name)), con)
+            comprehenddirectory(os.path.dirname(os.path.abspath(args.bundle.name)), con, args.workers)
 
-        # Make a timestamp but drop the microsecond resolution
-        ts = datetime.utcnow()
-        ts = datetime(ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.second, microsecond=0, tzinfo=None)
+        # Use the checkpoint's timestamp so a resumed run makes the same files
+        if checkpoint is not None:
+            checkpoint.markcataloged()
+        ts = checkpoint.timestamp if checkpoint is not None else maketimestamp()
 
         # Let's get the show on the road
         manifest, label = produce(
             bundle=args.bundle,
+            hashname=HASH_ALGORITHMS[args.algorithm],
             # TODO: Temporarily hardcoding these values until other modes are available
-            # hashname=HASH_ALGORITHMS[args.algorithm],
             # registryserviceurl=args.url,
             # insecureconnectionflag=args.insecure,
-            hashname=HASH_ALGORITHMS["MD5"],
             registryserviceurl=None,
             insecureconnectionflag=False,
             site=args.site,
@@ -524,6 +652,10 @@ def main():
         _logger.debug("🖥 Here is the exception: %r", ex, exc_info=ex)
     finally:
         shutil.rmtree(tempdir, ignore_errors=True)
+        if cache is not None:
+            cache.close()
+        if metrics is not None:
+            metrics.write(args.metrics)
     _logger.info("👋 All done for now.")
     sys.exit(0)
 
@@ -0,0 +1,372 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Stand-in for the PDS API.
+
+``pds-deep-registry-archive`` normally talks to the PDS API of the PDS Registry Service, which isn't
+reachable from everywhere we'd like to test and benchmark it. This module serves just the parts of
+the PDS API that it uses—``/products/{lidvid}``, ``/products/{lidvid}/members`` with ``search-after``
+paging, and ``/products?q=`` queries of ``lidvid eq "…"`` terms joined with ``or``—from the labels in
+a local bundle directory or from a JSON fixture. Latency, a rate of failed requests, and the biggest
+page size honored can all be set so crawls behave reproducibly.
+
+This module also provides ``pds-registry-standin``, a program to run such a server.
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os.path
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import unquote
+from urllib.parse import urlparse
+
+from . import VERSION
+from .constants import PRODUCT_BUNDLE_TAG
+from .constants import PRODUCT_COLLECTION_TAG
+from .utils import addloggingarguments
+from .utils import comprehenddirectory
+from .utils import createschema
+from .utils import fraction
+from .utils import getlabelinfo
+from .utils import getmd5
+
+
+# Constants
+# ---------
+
+# Module metadata:
+__version__ = VERSION
+
+# For ``--help``; note this is hand-wrapped at 80 columns:
+_description = """Serve a stand-in for the PDS API from a local bundle directory
+or a JSON fixture, for testing and benchmarking ``pds-deep-registry-archive``
+without the PDS Registry Service."""
+
+_searchkey = "ops:Harvest_Info.ops:harvest_date_time"  # What products get sorted and paged by
+_propdataurl = "ops:Data_File_Info.ops:file_ref"
+_propdatamd5 = "ops:Data_File_Info.ops:md5_checksum"
+_proplabelurl = "ops:Label_File_Info.ops:file_ref"
+_proplabelmd5 = "ops:Label_File_Info.ops:md5_checksum"
+_propcollections = "ref_lidvid_collection"
+_defaultlimit = 100  # Products per page when the request doesn't say
+_defaultdataurl = "https://pds.example.org/data/"  # Where files of bundles served from directories seem to be
+_defaultport = 8000  # Where to listen
+_epoch = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)  # Made-up harvest times start here
+_pathmatcher = re.compile(r"^.*?/products(?:/([^/]+)(/members)?)?/?$")  # Paths we serve
+_lidvidmatcher = re.compile(r'lidvid\s+eq\s+"([^"]+)"')  # Terms of ``q=`` queries
+
+# Logging:
+_logger = logging.getLogger(__name__)
+
+
+# Classes
+# -------
+
+
+class Registry(object):
+    """The products of a stand-in PDS Registry.
+
+    ``products`` maps lidvids to the documents the PDS API gives for them, and ``members`` maps the
+    lidvids of collections to the lidvids of their member products, in harvest order.
+    """
+
+    def __init__(self, products, members):
+        """Make a registry with the given ``products`` and ``members``."""
+        self.products, self.members = products, members
+
+    @classmethod
+    def fromdirectory(cls, dn, dataurl=_defaultdataurl):
+        """Make a registry of the PDS labels in and under the directory ``dn``.
+
+        Files get URLs made by putting their paths relative to the parent of ``dn`` after ``dataurl``.
+        """
+        con = sqlite3.connect(":memory:")
+        try:
+            createschema(con)
+            comprehenddirectory(dn, con)
+            return cls._fromcatalog(con, os.path.dirname(os.path.abspath(dn)), dataurl)
+        finally:
+            con.close()
+
+    @classmethod
+    def _fromcatalog(cls, con, root, dataurl):
+        """Make a registry from the catalog in ``con`` of labels under ``root`` with files under ``dataurl``."""
+
+        def url(filepath):
+            return dataurl.rstrip("/") + "/" + os.path.relpath(filepath, root).replace(os.sep, "/")
+
+        def md5(filepath):
+            with open(filepath, "rb") as i:
+                return getmd5(i)
+
+        def resolve(lid, vid):
+            """Resolve the references of ``lid``::``vid`` to lidvids, taking lid-only ones to the latest."""
+            rows = con.execute(
+                "SELECT r.to_lid, coalesce(r.to_vid, l.vid) FROM inter_label_references r"
+                " LEFT JOIN latest_versions l ON l.root = '' AND l.lid = r.to_lid WHERE r.lid = ? AND r.vid = ? ORDER BY r.rowid",
+                (lid, vid),
+            )
+            return [f"{to_lid}::{to_vid}" for to_lid, to_vid in rows if to_vid is not None]
+
+        products, members = {}, {}
+        rows = con.execute("SELECT labelpath, lid, vid FROM catalog_labels WHERE lid IS NOT NULL ORDER BY labelpath")
+        for count, (labelpath, lid, vid) in enumerate(rows.fetchall()):
+            lidvid, info = f"{lid}::{vid}", getlabelinfo(labelpath)
+            datafiles = [
+                i[0] for i in con.execute(
+                    "SELECT filepath FROM label_file_references WHERE lid = ? AND vid = ? AND filepath != ?"
+                    " ORDER BY rowid",
+                    (lid, vid, labelpath.replace("\\", "/")),
+                )
+            ]
+            harvested = _epoch + datetime.timedelta(seconds=count)
+            properties = {
+                _proplabelurl: [url(labelpath)],
+                _proplabelmd5: [md5(labelpath)],
+                _searchkey: [harvested.strftime("%Y-%m-%dT%H:%M:%S.%fZ")],
+            }
+            if datafiles:
+                properties[_propdataurl] = [url(i) for i in datafiles]
+                properties[_propdatamd5] = [md5(i) for i in datafiles]
+            if info.roottag == PRODUCT_BUNDLE_TAG:
+                properties[_propcollections] = resolve(lid, vid)
+            elif info.roottag == PRODUCT_COLLECTION_TAG:
+                members[lidvid] = resolve(lid, vid)
+            products[lidvid] = {"id": lidvid, "title": info.title, "properties": properties}
+        for lidvid, lidvids in members.items():
+            members[lidvid] = sorted(
+                (i for i in lidvids if i in products), key=lambda i: products[i]["properties"][_searchkey]
+            )
+        return cls(products, members)
+
+    @classmethod
+    def fromfixture(cls, fn):
+        """Make a registry from the JSON fixture ``fn`` written by ``dump``."""
+        with open(fn, "r", encoding="utf-8") as i:
+            fixture = json.load(i)
+        return cls({p["id"]: p for p in fixture["products"]}, fixture["members"])
+
+    def dump(self, fn):
+        """Write the registry as a JSON fixture to ``fn``."""
+        with open(fn, "w", encoding="utf-8") as o:
+            json.dump({"products": list(self.products.values()), "members": self.members}, o, indent=1)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """An HTTP server of a stand-in PDS API for a ``Registry``.
+
+    Each request waits ``latency`` seconds first, fails with 503 Service Unavailable with probability
+    ``errorrate`` (drawn from a random number generator seeded with ``seed``), and pages of members get
+    no bigger than ``pagelimit`` products no matter how many are asked for, if ``pagelimit`` is given.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, registry, latency=0.0, errorrate=0.0, pagelimit=None, seed=None):
+        """Serve the ``registry`` at the (host, port) ``address``; see the class for the rest."""
+        super(StandInServer, self).__init__(address, _Handler)
+        self.registry, self.latency, self.errorrate, self.pagelimit = registry, latency, errorrate, pagelimit
+        self.requests, self.errors = 0, 0
+        self._random, self._lock = random.Random(seed), threading.Lock()
+
+    @property
+    def url(self):
+        """The URL of the PDS API this serves, suitable for a ``RegistryClient``."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/search/1"
+
+    def shouldfail(self):
+        """Count a request and decide if it should fail."""
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.errorrate:
+                self.errors += 1
+                return True
+            return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Handles requests of a ``StandInServer``."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Log requests at debug level rather than writing them to stderr."""
+        _logger.debug("🛰 %s %s", self.address_string(), format % args)
+
+    def do_GET(self):  # noqa: N802
+        """Handle a GET request."""
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.shouldfail():
+            self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"message": "Injected failure"})
+            return
+        url = urlparse(self.path)
+        match, query = _pathmatcher.match(unquote(url.path)), parse_qs(url.query)
+        if match is None:
+            self._send(HTTPStatus.NOT_FOUND, {"message": f"No such path {url.path}"})
+            return
+        lidvid, members = match.groups()
+        registry, fields = server.registry, _getfields(query)
+        if lidvid is None:
+            lidvids = _lidvidmatcher.findall(query.get("q", [""])[0])
+            products = [registry.products[i] for i in lidvids if i in registry.products]
+            self._sendpage(products, len(products), int(query.get("limit", [_defaultlimit])[0]), fields)
+        elif lidvid not in registry.products:
+            self._send(HTTPStatus.NOT_FOUND, {"message": f"No product {lidvid}"})
+        elif members:
+            products = [registry.products[i] for i in registry.members.get(lidvid, [])]
+            after = query.get("search-after", [None])[0]
+            if after is not None:
+                products = [p for p in products if p["properties"][_searchkey][0] > after]
+            self._sendpage(products, len(registry.members.get(lidvid, [])), self._getlimit(query), fields)
+        else:
+            self._send(HTTPStatus.OK, _project(registry.products[lidvid], fields))
+
+    def _getlimit(self, query):
+        """Get the page size of members the ``query`` asks for, capped at the server's page limit."""
+        limit = int(query.get("limit", [_defaultlimit])[0])
+        return min(limit, self.server.pagelimit) if self.server.pagelimit else limit
+
+    def _sendpage(self, products, hits, limit, fields):
+        """Send the first ``limit`` ``products`` of ``hits`` of them, projected to ``fields``."""
+        page = [_project(p, fields) for p in products[:limit]]
+        self._send(HTTPStatus.OK, {"summary": {"hits": hits, "limit": limit}, "data": page})
+
+    def _send(self, status, document):
+        """Send the JSON ``document`` with the HTTP ``status``, honoring validators and compression."""
+        body = json.dumps(document).encode("utf-8")
+        etag = '"' + hashlib.md5(body, usedforsecurity=False).hexdigest() + '"'
+        if status == HTTPStatus.OK and self.headers.get("If-None-Match") == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if status == HTTPStatus.OK:
+            self.send_header("ETag", etag)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Functions
+# ---------
+
+
+def _getfields(query):
+    """Get the property names that ``query`` asks to project products to, or ``None`` for all of them."""
+    fields = query.get("fields")
+    return set(",".join(fields).split(",")) if fields else None
+
+
+def _project(product, fields):
+    """Return the ``product`` with just the given ``fields`` of its properties, or all of them if ``None``."""
+    if fields is None:
+        return product
+    return dict(product, properties={k: v for k, v in product["properties"].items() if k in fields})
+
+
+def loadregistry(source, dataurl=_defaultdataurl):
+    """Load a ``Registry`` from ``source``, which is either a bundle directory or a JSON fixture file."""
+    if os.path.isdir(source):
+        return Registry.fromdirectory(source, dataurl)
+    return Registry.fromfixture(source)
+
+
+def main():
+    """Check the command-line for options and serve a stand-in PDS API."""
+    parser = argparse.ArgumentParser(description=_description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    addloggingarguments(parser)
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on [%(default)s]")
+    parser.add_argument("-p", "--port", type=int, default=_defaultport, help="Port to listen on [%(default)s]")
+    parser.add_argument(
+        "--data-url",
+        default=_defaultdataurl,
+        help="URL under which files of a bundle directory seem to be [%(default)s]",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, metavar="SECONDS", help="Delay every response this long [%(default)s]"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=fraction,
+        default=0.0,
+        metavar="FRACTION",
+        help="Fail this fraction (0–1) of requests with 503 Service Unavailable [%(default)s]",
+    )
+    parser.add_argument("--page-limit", type=int, metavar="N", help="Never return more than N members per page")
+    parser.add_argument("--seed", type=int, help="Seed for deciding which requests fail, for reproducible runs")
+    parser.add_argument("--dump", metavar="FIXTURE.JSON", help="Write the products as a JSON fixture and exit")
+    parser.add_argument("source", help="Bundle directory or JSON fixture to serve products from")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.loglevel, format="%(levelname)s %(message)s")
+    _logger.debug("⚙️ command line args = %r", args)
+
+    registry = loadregistry(args.source, args.data_url)
+    _logger.info("📦 Loaded %d products from %s", len(registry.products), args.source)
+    if args.dump:
+        registry.dump(args.dump)
+        _logger.info("📄 Wrote fixture %s", args.dump)
+        sys.exit(0)
+    server = StandInServer(
+        (args.host, args.port), registry, args.latency, args.error_rate, args.page_limit, args.seed
+    )
+    _logger.info("🛰 Serving a stand-in PDS API at %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        _logger.info("👋 Served %d requests (%d failed on purpose)", server.requests, server.errors)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,22 +28,34 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 """Utilities."""
+import argparse
+import collections
+import concurrent.futures
+import dataclasses
 import functools
-import hashlib
 import logging
 import os.path
 import re
 import sqlite3
-import urllib
+import sys
+import threading
+import urllib.error
+import urllib.request
 from urllib.parse import urlparse
 from urllib.parse import urlunparse
 
 from lxml import etree
 from zope.interface import implementer
 
+from .constants import DIGEST_BLOCK_SIZE
 from .constants import PDS_NS_URI
+from .constants import PRODUCT_BUNDLE_TAG
 from .constants import PRODUCT_COLLECTION_TAG
+from .hashing import digeststream
 from .interfaces import IURLValidator
+from .metrics import phase
+from .metrics import timed
+from .progress import Progress
 
 
 # Logging
@@ -54,9 +66,25 @@ _logger = logging.getLogger(__name__)
 # Private Constants
 # -----------------
 
-_bufsiz = 512  # Byte buffer
-_xmlcachesize = 2 ** 16  # XML files to cache in memory
+_labelcachesize = 2 ** 26  # Bytes of extracted label metadata to cache in memory
 _digestcachesize = 2 ** 16  # Message digests to cache in memory
+_comprehensionchunksize = 64  # Labels to hand each worker process at a time
+_loadbatchsize = 2 ** 14  # Rows to hand to each ``executemany`` when loading the catalog
+
+# Unique indexes on the label tables as (name, table, columns)
+_uniqueindexes = (
+    ("lidvidIndex", "labels", ("lid", "vid")),
+    ("lidvidlidMapping", "inter_label_references", ("lid", "vid", "to_lid", "to_vid")),
+    ("lidvidfileIndex", "label_file_references", ("lid", "vid", "filepath")),
+)
+
+# SQLite settings that make bulk loads fast at the expense of durability
+_bulkloadpragmas = (
+    ("journal_mode", "MEMORY"),
+    ("synchronous", "OFF"),
+    ("cache_size", -(2 ** 18)),  # Negative means kibibytes, so this is 256 MiB
+    ("mmap_size", 2 ** 30),
+)
 _plinematcher = re.compile(r"^[Pp],\s*([^\s]+)::([^\s]+)")  # Match separate lids and vids in "P/p" lines in .tab files
 
 # Help message for ``--include-latest-collection-only``:
@@ -65,6 +93,28 @@ collections in the bundle. By default, the software includes all versions of all
 root directory.
 """
 
+# Help message for ``--workers``:
+_workershelp = """Number of processes to use to parse the PDS labels in the bundle; by default, %(default)s, which
+parses them all in this process.
+"""
+
+# Help message for ``--catalog``:
+_cataloghelp = """SQLite file in which to keep the catalog of PDS labels from run to run; by default, the catalog
+is temporary. With a catalog, later runs re-parse only the labels (and product collection inventory tables)
+that were added, changed, or deleted since the last run.
+"""
+
+# Help message for ``--block-size``:
+_blocksizehelp = """Number of bytes to read at a time when computing message digests of files; default
+%(default)s. Larger blocks mean fewer reads, which helps on network filesystems.
+"""
+
+# Help message for ``--digest-cache``:
+_digestcachehelp = """Remember message digests of files in this SQLite database and re-use them on later runs for
+files that haven't changed (same path, size, modification time, inode, and device); use ``pds-digest-cache`` to
+prune it.
+"""
+
 
 # Functions
 # ---------
@@ -92,7 +142,6 @@ def createschema(con):
         vid text NOT NULL
     )"""
     )
-    cursor.execute("CREATE UNIQUE INDEX lidvidIndex ON labels (lid, vid)")
     cursor.execute(
         """CREATE TABLE IF NOT EXISTS inter_label_references (
         lid text NOT NULL,
@@ -101,7 +150,6 @@ def createschema(con):
         to_vid text
     )"""
     )
-    cursor.execute("CREATE UNIQUE INDEX lidvidlidMapping ON inter_label_references (lid, vid, to_lid, to_vid)")
     cursor.execute(
         """CREATE TABLE IF NOT EXISTS label_file_references (
         lid text NOT NULL,
@@ -109,7 +157,106 @@ def createschema(con):
         filepath text NOT NULL
     )"""
     )
-    cursor.execute("CREATE UNIQUE INDEX lidvidfileIndex on label_file_references (lid, vid, filepath)")
+    _createindexes(cursor)
+
+    # The latest version of each lid, as ordered by ``versionkey``: of those in ``labels`` for a ``root`` of
+    # '', and of those whose labels are in and under each bundle's directory for a ``root`` of that directory
+    if "root" not in {row[1] for row in cursor.execute("PRAGMA table_info(latest_versions)")}:
+        cursor.execute("DROP TABLE IF EXISTS latest_versions")  # From before roots; it gets rebuilt anyway
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS latest_versions (
+        root text NOT NULL,
+        lid text NOT NULL,
+        vid text NOT NULL,
+        PRIMARY KEY (root, lid)
+    )"""
+    )
+
+    # These track what label files (and product collection inventory tables) went into the above so that
+    # ``comprehenddirectory`` can update a catalog that persists from run to run
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS catalog_labels (
+        labelpath text PRIMARY KEY,
+        size integer NOT NULL,
+        mtime_ns integer NOT NULL,
+        lid text,
+        vid text,
+        roottag text
+    )"""
+    )
+    if "roottag" not in {row[1] for row in cursor.execute("PRAGMA table_info(catalog_labels)")}:
+        # A catalog from before we noted root tags; have every label in it re-parsed so they get noted
+        cursor.execute("ALTER TABLE catalog_labels ADD COLUMN roottag text")
+        cursor.execute("UPDATE catalog_labels SET mtime_ns = -1")
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS catalog_tables (
+        tablepath text NOT NULL,
+        size integer NOT NULL,
+        mtime_ns integer NOT NULL,
+        labelpath text NOT NULL
+    )"""
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS catalogtablesIndex on catalog_tables (labelpath)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS cataloglabelsLidIndex on catalog_labels (lid)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS cataloglabelsRoottagIndex on catalog_labels (roottag)")
+
+
+def _createindexstatement(name, table, columns):
+    """Make the SQL statement that creates the unique index ``name`` on the ``columns`` of ``table``."""
+    return f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+
+
+def _createindexes(cursor):
+    """Create the unique indexes on the label tables with the given ``cursor`` if they're not already there."""
+    for name, table, columns in _uniqueindexes:
+        cursor.execute(_createindexstatement(name, table, columns))
+
+
+@timed("sqlite")
+def _startbulkload(con):
+    """Start a bulk load.
+
+    Get the database ``con``nection ready for loading lots of rows in a hurry by tuning its settings and
+    dropping the unique indexes on the label tables. Return the settings to put back afterwards.
+    """
+    settings = []
+    for pragma, value in _bulkloadpragmas:
+        if pragma == "journal_mode" and con.in_transaction:
+            continue  # Can't change the journal in the middle of a transaction
+        current = con.execute(f"PRAGMA {pragma}").fetchone()
+        if current is None:
+            continue  # Not supported by this database (like ``mmap_size`` for in-memory ones)
+        settings.append((pragma, current[0]))
+        con.execute(f"PRAGMA {pragma} = {value}")
+    for name, _table, _columns in _uniqueindexes:
+        con.execute(f"DROP INDEX IF EXISTS {name}")
+    return settings
+
+
+@timed("sqlite")
+def _finishbulkload(con, settings):
+    """Finish a bulk load.
+
+    Bring back the unique indexes on the label tables in ``con``, first removing any duplicate rows
+    they would've rejected, update the statistics the query planner uses, and commit. Then put back
+    the previous ``settings`` of the connection.
+    """
+    for name, table, columns in _uniqueindexes:
+        statement = _createindexstatement(name, table, columns)
+        try:
+            con.execute(statement)
+        except sqlite3.IntegrityError:
+            # Like the unique index would have, treat rows with NULLs as distinct and keep the first of the rest
+            distinct = " AND ".join(f"{column} IS NOT NULL" for column in columns)
+            con.execute(
+                f"DELETE FROM {table} WHERE {distinct} AND rowid NOT IN"
+                f" (SELECT min(rowid) FROM {table} WHERE {distinct} GROUP BY {', '.join(columns)})"
+            )
+            con.execute(statement)
+    con.execute("ANALYZE")
+    con.commit()
+    for pragma, value in settings:
+        con.execute(f"PRAGMA {pragma} = {value}")
 
 
 def getlogicalversionidentifier(tree):
@@ -129,111 +276,384 @@ def getlogicalversionidentifier(tree):
     return lid, vid
 
 
-def _addinterlabelreferencesfromtabfile(lid, vid, tabfile, con):
-    """Add inter-label references.
+def _findlabels(dn):
+    """Generate the paths to all PDS labels (``.xml`` or ``.lblx`` files) in and under the directory ``dn``."""
+    for dirpath, _dirnames, filenames in os.walk(dn):
+        for fn in filenames:
+            if fn.lower().endswith(".xml") or fn.lower().endswith(".lblx"):
+                yield os.path.join(dirpath, fn)
+
 
-    Open the PDS tab file ``tabfile`` and find all "P lines" in it, adding them as destination
-    references from the given logical version identifier ``lid`` and version identifier ``vid``
-    to the ``inter_label_references`` table in the database ``con``nection.
-    """
+def _readplines(tabfile):
+    """Read the "P lines" from the PDS tab file ``tabfile`` and return them as a list of (lid, vid) pairs."""
+    references = []
     with open(tabfile, "r") as f:
         for line in f:
             match = _plinematcher.match(line)
-            if not match:
-                continue
+            if match:
+                references.append((match.group(1), match.group(2)))
+    return references
+
+
+@timed("parse")
+def _extractlabel(xmlfile):
+    """Extract just what we need from a label.
+
+    Stream-parse the PDS label at ``xmlfile`` without building a tree and return the ``LabelInfo``
+    that a ``_LabelTarget`` finds in it, or ``None`` if it's not well-formed XML.
+    """
+    try:
+        return etree.parse(xmlfile, etree.XMLParser(target=_LabelTarget()))
+    except etree.XMLSyntaxError:
+        _logger.warning("👀 Cannot parse XML document at «%s»; ignoring it", xmlfile)
+        return None
+
+
+def _deconstructlabel(xmlfile):
+    """Deconstruct a label.
+
+    Parse the PDS label at ``xmlfile`` and find its various references to other labels and files.
+    Return ``None`` if it's not a label we can work with; otherwise return a quintuple of:
+
+    • the label's logical identifier
+    • its version identifier
+    • the tag of its root element
+    • a sequence of (lid, vid) primary bundle member references, where vid may be ``None``
+    • a sequence of (filepath, references) for files the label describes, where references are the
+      (lid, vid) "P lines" in the file if the label is for a product collection, or ``None`` otherwise
+
+    This touches nothing but the filesystem so it's safe to run in a separate process.
+    """
+    _logger.debug("📄 Deconstructing %s", xmlfile)
+    extraction = _extractlabel(xmlfile)
+    if extraction is None:
+        return None
+    lid, vid = extraction.lid, extraction.vid
+    isproductcollection = extraction.roottag == PRODUCT_COLLECTION_TAG
+    if not (lid and vid):
+        return None
+
+    # OK, got an XML file we can work with; see if it refers to other XML files
+    memberreferences = []
+    for lidref, vidref, ordinality in extraction.members:
+        # Do "primary" references only (https://github.com/NASA-PDS/pds-deep-archive/issues/92)
+        if ordinality is None:
+            raise ValueError(f"Bundle {xmlfile} contains a <Bundle_Member_Entry> with no <member_status>")
+        if lidref and ordinality == "Primary":
+            memberreferences.append((lidref, vidref))
+
+    # And see if it refers to other files
+    filereferences = []
+    dirpath = os.path.dirname(xmlfile)
+    for text, dn in extraction.files:
+        # Reject relative paths (#145)
+        if ".." in text:
+            message = (
+                f'Bundle {xmlfile} contains a <file_name> ``{text}`` which contains a'
+                ' relative path ``..``, which is invalid'
+            )
+            raise ValueError(message)
+        fn = text.strip()
+        filepath = os.path.join(dirpath, dn, fn) if dn else os.path.join(dirpath, fn)
+        if os.path.isfile(filepath):
+            # Weird (to a certain degree of weird) case: <file_name> may refer to a file that contains
+            # even more inter_label_references, but only if this label is product collections.
+            filereferences.append((filepath, _readplines(filepath) if isproductcollection else None))
+        else:
+            _logger.warning("⚠️ File %s referenced by %s does not exist; ignoring", fn, xmlfile)
+
+    return lid, vid, extraction.roottag, memberreferences, filereferences
+
+
+def _storelabel(xmlfile, identity, deconstruction, loader):
+    """Store a label.
+
+    Add the ``deconstruction`` of the label at ``xmlfile`` (as made by ``_deconstructlabel``) to the
+    tables via the ``_CatalogLoader`` ``loader``, noting the label's ``identity`` (its size and
+    modification time) in the catalog.
+    """
+    if deconstruction is None:
+        # Remember it anyway so we don't bother trying to parse it again until it changes
+        loader.add("INSERT OR REPLACE INTO catalog_labels (labelpath, size, mtime_ns) VALUES (?,?,?)", (xmlfile, *identity))
+        return
+    lid, vid, roottag, memberreferences, filereferences = deconstruction
+    loader.add(
+        "INSERT OR REPLACE INTO catalog_labels (labelpath, size, mtime_ns, lid, vid, roottag) VALUES (?,?,?,?,?,?)",
+        (xmlfile, *identity, lid, vid, roottag),
+    )
+    loader.add("INSERT OR IGNORE INTO labels (lid, vid) VALUES (?, ?)", (lid, vid))
+    loader.add(
+        "INSERT OR IGNORE INTO label_file_references (lid, vid, filepath) VALUES (?,?,?)",
+        (lid, vid, xmlfile.replace("\\", "/")),
+    )
+    for lidref, vidref in memberreferences:
+        loader.add(
+            "INSERT OR IGNORE INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES (?,?,?,?)",
+            (lid, vid, lidref, vidref or None),
+        )
+    for filepath, references in filereferences:
+        loader.add(
+            "INSERT OR IGNORE INTO label_file_references (lid, vid, filepath) VALUES (?,?,?)",
+            (lid, vid, filepath.replace("\\", "/")),
+        )
+        if references is None:
+            continue
+        loader.addmany(
+            "INSERT OR IGNORE INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES (?,?,?,?)",
+            ((lid, vid, to_lid, to_vid) for to_lid, to_vid in references),
+        )
+        loader.add(
+            "INSERT INTO catalog_tables (tablepath, size, mtime_ns, labelpath) VALUES (?,?,?,?)",
+            (filepath, *_identify(filepath), xmlfile),
+        )
+
+
+def _identify(filepath):
+    """Return the size and modification time (in nanoseconds) of the file at ``filepath``."""
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+@timed("scan")
+def _findchangedlabels(dn, con):
+    """Find changed labels.
+
+    Find the labels in and under the directory ``dn`` that the catalog in ``con`` doesn't already know
+    about as they are now: those that are new or whose size or modification time changed, as well as
+    those describing product collection inventory tables that changed. Drop everything the catalog
+    knows from them as well as from labels that have been deleted. Labels that share a lidvid with
+    any of those get dropped too since we can't tell whose rows are whose.
+
+    Return a dict of the labels to (re-)parse mapped to their current identities, in the order found.
+    """
+    current = {}
+    with Progress("scan") as progress:
+        for xmlfile in _findlabels(dn):
+            current[xmlfile] = _identify(xmlfile)
+            progress.advance()
+    known = {
+        labelpath: ((size, mtime_ns), (lid, vid))
+        for labelpath, size, mtime_ns, lid, vid in con.execute(
+            "SELECT labelpath, size, mtime_ns, lid, vid FROM catalog_labels"
+        )
+    }
+    if not known:
+        return current
+
+    prefix = os.path.join(os.fspath(dn), "")
+    dirty = {xmlfile for xmlfile, identity in current.items() if xmlfile not in known or known[xmlfile][0] != identity}
+    deleted = {i for i in known if i.startswith(prefix) and i not in current}
+    for tablepath, size, mtime_ns, labelpath in con.execute(
+        "SELECT tablepath, size, mtime_ns, labelpath FROM catalog_tables"
+    ):
+        if labelpath in current and labelpath not in dirty:
             try:
-                con.execute(
-                    "INSERT INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES (?,?,?,?)",
-                    (lid, vid, match.group(1), match.group(2)),
-                )
-            except sqlite3.IntegrityError:
-                pass
+                if _identify(tablepath) != (size, mtime_ns):
+                    dirty.add(labelpath)
+            except FileNotFoundError:
+                dirty.add(labelpath)
+    affected = {known[i][1] for i in dirty | deleted if i in known and known[i][1][0] is not None}
+    # A label elsewhere sharing an affected lidvid just gets forgotten so its own directory re-parses it
+    dirty |= {i for i, (identity, lidvid) in known.items() if lidvid in affected}
+    _logger.info("📚 Catalog has %d labels; %d to re-parse, %d deleted", len(known), len(dirty), len(deleted))
+
+    for table in ("labels", "inter_label_references", "label_file_references"):
+        con.executemany(f"DELETE FROM {table} WHERE lid = ? AND vid = ?", affected)
+    for table in ("catalog_labels", "catalog_tables"):
+        con.executemany(f"DELETE FROM {table} WHERE labelpath = ?", [(i,) for i in dirty | deleted])
+    return {xmlfile: identity for xmlfile, identity in current.items() if xmlfile in dirty}
+
+
+def versionkey(vid):
+    """Make a sort key for the version ID ``vid`` so that, for example, 10.0 comes after 2.0.
+
+    Numeric parts of ``vid`` compare as numbers; anything else compares as text, but before any number.
+    """
+    return tuple((int(part), "") if part.isdigit() else (-1, part) for part in vid.split("."))
+
+
+def _latestversion(vids):
+    """Return the latest of the version IDs ``vids``, or ``None`` if there aren't any."""
+    return max(vids, key=lambda vid: (versionkey(vid), vid), default=None)
+
+
+@timed("sqlite")
+def _updatelatestversions(con):
+    """Update latest versions.
+
+    Work out the latest version of each lid in the labels in ``con``, both in all and in and under the
+    directory of each bundle in the catalog, and note them in ``latest_versions``.
+    """
+    versions = {}  # (root, lid) → vids
+    for lid, vid in con.execute("SELECT lid, vid FROM labels"):
+        versions.setdefault(("", lid), []).append(vid)
+    roots = {
+        os.path.dirname(labelpath)
+        for labelpath, in con.execute("SELECT labelpath FROM catalog_labels WHERE roottag = ?", (PRODUCT_BUNDLE_TAG,))
+    }
+    if roots:
+        for labelpath, lid, vid in con.execute("SELECT labelpath, lid, vid FROM catalog_labels WHERE lid IS NOT NULL"):
+            dn, parent = os.path.dirname(labelpath), None
+            while dn != parent:  # Up to the top, since bundles may be nested
+                if dn in roots:
+                    versions.setdefault((dn, lid), []).append(vid)
+                dn, parent = os.path.dirname(dn), dn
+    con.execute("DELETE FROM latest_versions")
+    con.executemany(
+        "INSERT INTO latest_versions (root, lid, vid) VALUES (?,?,?)",
+        ((root, lid, _latestversion(vids)) for (root, lid), vids in versions.items()),
+    )
+
+
+@timed("resolve")
+def resolvelabels(con, lid, vid, allcollections, root=None):
+    """Resolve labels.
+
+    Find every label reachable in the database ``con`` from the label ``lid``::``vid`` by following
+    inter-label references. When a reference is by lid only, follow it to just the latest version of
+    that lid in ``con`` (according to ``versionkey``), or to every version of it if ``allcollections``
+    is True. Each label is visited
+    just once no matter how many paths lead to it, so cycles are harmless, and each lid-only reference
+    is looked up just once per lid. If ``root`` is given, a lid-only reference considers only the
+    versions whose labels are in and under that directory, so that a catalog of many bundles side by
+    side resolves each one as if it were cataloged alone; for a bundle's own directory, the latest of
+    those comes straight from ``latest_versions``.
+
+    Return a list of (lid, vid) pairs in breadth-first order, starting with ``lid``::``vid`` itself.
+    Note that a reference to a label not in ``con`` still appears; it just has no references of its own.
+    """
+    _logger.debug("🕸 Resolving references from %s::%s with allcollections=%r", lid, vid, allcollections)
+    versions = {}  # lid → vids that lid-only references to it resolve to
+    cursor = con.cursor()
+    labels, seen, queue = [], {(lid, vid)}, collections.deque([(lid, vid)])
+    while queue:
+        lidvid = queue.popleft()
+        labels.append(lidvid)
+        cursor.execute("SELECT to_lid, to_vid FROM inter_label_references WHERE lid = ? AND vid = ?", lidvid)
+        for to_lid, to_vid in cursor.fetchall():
+            if to_vid is not None:
+                to_vids = (to_vid,)
+            elif to_lid in versions:
+                to_vids = versions[to_lid]
+            elif root is not None:
+                # When ``root`` is a bundle's directory, ``latest_versions`` already knows the latest there
+                row = None
+                if not allcollections:
+                    cursor.execute("SELECT vid FROM latest_versions WHERE root = ? AND lid = ?", (root, to_lid))
+                    row = cursor.fetchone()
+                if row is None:
+                    vids = _versionsunder(cursor, to_lid, root)
+                    row = vids if allcollections or not vids else (_latestversion(vids),)
+                to_vids = versions[to_lid] = row
+            else:
+                # lid-only, so what's it gonna be, all or latest 🤷‍♀️
+                if allcollections:
+                    cursor.execute("SELECT vid FROM labels WHERE lid = ?", (to_lid,))
+                    to_vids = versions[to_lid] = tuple(i[0] for i in cursor.fetchall())
+                else:
+                    # Note that ``max(vid)`` doesn't cut it since it would make 2.0 > 10.0, so we use the
+                    # ``latest_versions`` worked out after comprehension, falling back to sorting it out here
+                    cursor.execute("SELECT vid FROM latest_versions WHERE root = '' AND lid = ?", (to_lid,))
+                    row = cursor.fetchone()
+                    if row is None:
+                        cursor.execute("SELECT vid FROM labels WHERE lid = ?", (to_lid,))
+                        row = (_latestversion(i[0] for i in cursor.fetchall()),)
+                    to_vids = versions[to_lid] = row
+            for to_vid in to_vids:
+                if (to_lid, to_vid) not in seen:
+                    seen.add((to_lid, to_vid))
+                    queue.append((to_lid, to_vid))
+    return labels
+
+
+def _versionsunder(cursor, lid, root):
+    """Return the version IDs of ``lid`` whose labels the catalog at ``cursor`` found in and under ``root``."""
+    cursor.execute("SELECT labelpath, vid FROM catalog_labels WHERE lid = ?", (lid,))
+    return tuple(sorted({vid for labelpath, vid in cursor.fetchall() if isunder(labelpath, root)}))
+
+
+def isunder(path, root):
+    """Tell if the file ``path`` is in or under the directory ``root``."""
+    return path.replace("\\", "/").startswith(os.path.join(root, "").replace("\\", "/"))
+
+
+def findbundles(con, root):
+    """Find bundles.
+
+    Return the paths of the labels of every ``Product_Bundle`` in and under the directory ``root`` that
+    the catalog in ``con`` knows about, sorted.
+    """
+    rows = con.execute("SELECT labelpath FROM catalog_labels WHERE roottag = ? ORDER BY labelpath", (PRODUCT_BUNDLE_TAG,))
+    return [labelpath for labelpath, in rows.fetchall() if isunder(labelpath, root)]
+
 
+def _initworker(loglevel):
+    """Set up logging in a worker process at the given ``loglevel``."""
+    logging.basicConfig(level=loglevel, format="%(levelname)s %(message)s")
 
-def comprehenddirectory(dn, con):
+
+def comprehenddirectory(dn, con, workers=1):
     """Fathom a directory.
 
     In and under the given directory ``dn`` ,look for XML files and their various references to other
-    files, populating tables in ``con``.
+    files, populating tables in ``con``. If ``workers`` is more than one, parse the labels in that many
+    separate processes; either way, only this process writes to ``con``.
+
+    The catalog in ``con`` may already know about ``dn`` from an earlier run, in which case only labels
+    (and product collection inventory tables) added, changed, or deleted since then get re-parsed.
+    Note that the files that unchanged labels describe are assumed to still be there. If the catalog
+    is empty, the rows get bulk-loaded and then indexed, and ``con`` is committed.
     """
-    for dirpath, _dirnames, filenames in os.walk(dn):
-        for fn in filenames:
-            if fn.lower().endswith(".xml") or fn.lower().endswith(".lblx"):
-                xmlfile = os.path.join(dirpath, fn)
-                _logger.debug("📄 Deconstructing %s", xmlfile)
-                tree = parsexml(xmlfile)
-                if tree is None:
-                    continue
-                isproductcollection = tree.getroot().tag == PRODUCT_COLLECTION_TAG
-                lid, vid = getlogicalversionidentifier(tree)
-                if lid and vid:
-                    # OK, got an XML file we can work with
-                    con.execute("INSERT OR IGNORE INTO labels (lid, vid) VALUES (?, ?)", (lid, vid))
-                    con.execute(
-                        "INSERT OR IGNORE INTO label_file_references (lid, vid, filepath) VALUES (?,?,?)",
-                        (lid, vid, xmlfile.replace("\\", "/")),
-                    )
-
-                    # Now see if it refers to other XML files
-                    matches = tree.getroot().findall(f"./{{{PDS_NS_URI}}}Bundle_Member_Entry")
-                    for match in matches:
-                        # Do "primary" references only (https://github.com/NASA-PDS/pds-deep-archive/issues/92)
-                        lidref = vidref = ordinality = None
-                        for child in match:
-                            if child.tag == f"{{{PDS_NS_URI}}}lid_reference":
-                                lidref = child.text.strip()
-                            elif child.tag == f"{{{PDS_NS_URI}}}lidvid_reference":
-                                lidref, vidref = child.text.strip().split("::")
-                            elif child.tag == f"{{{PDS_NS_URI}}}member_status":
-                                ordinality = child.text.strip()
-                        if ordinality is None:
-                            raise ValueError(
-                                f"Bundle {xmlfile} contains a <Bundle_Member_Entry> with no <member_status>"
-                            )
-                        if lidref and ordinality == "Primary":
-                            if vidref:
-                                con.execute(
-                                    "INSERT OR IGNORE INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES (?,?,?,?)",
-                                    (lid, vid, lidref, vidref),
-                                )
-                            else:
-                                con.execute(
-                                    "INSERT OR IGNORE INTO inter_label_references (lid, vid, to_lid) VALUES (?,?,?)",
-                                    (lid, vid, lidref),
-                                )
-
-                    # And see if it refers to other files
-                    matches = tree.getroot().findall(f".//{{{PDS_NS_URI}}}file_name")
-                    for match in matches:
-                        # Reject relative paths (#145)
-                        if ".." in match.text:
-                            message = (
-                                f'Bundle {xmlfile} contains a <file_name> ``{match.text}`` which contains a'
-                                ' relative path ``..``, which is invalid'
-                            )
-                            raise ValueError(message)
-                        # any sibling directory_path_name?
-                        dpnnode = match.getparent().find(f"./{{{PDS_NS_URI}}}directory_path_name")
-                        fn = match.text.strip()
-                        dn = None if dpnnode is None else dpnnode.text.strip()
-                        filepath = os.path.join(dirpath, dn, fn) if dn else os.path.join(dirpath, fn)
-                        if os.path.isfile(filepath):
-                            con.execute(
-                                "INSERT OR IGNORE INTO label_file_references (lid, vid, filepath) VALUES (?,?,?)",
-                                (lid, vid, filepath.replace("\\", "/")),
-                            )
-                            # Weird (to a certain degree of weird) case: <file_name> may refer to a file
-                            # that contains even more inter_label_references, but only if this label is
-                            # product collections.
-                            if isproductcollection:
-                                _addinterlabelreferencesfromtabfile(lid, vid, filepath, con)
-                        else:
-                            _logger.warning("⚠️ File %s referenced by %s does not exist; ignoring", fn, xmlfile)
-
-
-@functools.lru_cache(maxsize=_xmlcachesize)
+    # Starting from nothing, it's quicker to index everything once at the end than to index as we go
+    bulk = con.execute("SELECT 1 FROM labels LIMIT 1").fetchone() is None
+    settings = _startbulkload(con) if bulk else None
+    labels = _findchangedlabels(dn, con)
+    loader = _CatalogLoader(con)
+    progress = Progress("parse", len(labels), sum(size for size, _mtime in labels.values()))
+    if workers > 1 and len(labels) > 1:
+        _logger.debug("👯‍♀️ Deconstructing labels with %d workers", workers)
+        # The workers' own timing of ``_extractlabel`` goes nowhere, so time the parse phase from here instead
+        with phase("parse"), concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_initworker, initargs=(_logger.getEffectiveLevel(),)
+        ) as executor:
+            # ``map`` gives back results in the same order as the labels
+            deconstructions = executor.map(_deconstructlabel, labels, chunksize=_comprehensionchunksize)
+            for (xmlfile, identity), deconstruction in zip(labels.items(), deconstructions):
+                _storelabel(xmlfile, identity, deconstruction, loader)
+                progress.advance(1, identity[0])
+    else:
+        for xmlfile, identity in labels.items():
+            _storelabel(xmlfile, identity, _deconstructlabel(xmlfile), loader)
+            progress.advance(1, identity[0])
+    progress.finish()
+    loader.flush()
+    _updatelatestversions(con)
+    if bulk:
+        _logger.debug("🏗 Indexing the %d rows loaded", loader.count)
+        _finishbulkload(con, settings)
+
+
+def getlabelinfo(xmlfile):
+    """Get label info.
+
+    Return the ``LabelInfo`` for the PDS label at path ``xmlfile``, or ``None`` if it's not well-formed
+    XML, consulting and filling in the ``labelcache`` as we go.
+    """
+    key = os.path.abspath(xmlfile)
+    info = labelcache.get(key)
+    if info is None:
+        info = _extractlabel(key)
+        if info is not None:
+            labelcache.put(key, info)
+    return info
+
+
 def parsexml(f):
-    """Parse the XML in object ``f``."""
+    """Parse the XML in object ``f``.
+
+    This builds an entire tree, and nothing caches it; use ``getlabelinfo`` when all you need is a
+    label's identifiers, title, or references.
+    """
     try:
         return etree.parse(f)
     except etree.XMLSyntaxError:
@@ -244,27 +664,22 @@ def parsexml(f):
 @functools.lru_cache(maxsize=_digestcachesize)
 def getdigest(url, hashname):
     """Compute a digest of the object at url and return it as a hex string."""
-    # Use usedforsecurity=False for MD5 to support FIPS mode (checksums, not crypto)
-    hashish = hashlib.new(hashname, usedforsecurity=False) if hashname.lower() == 'md5' else hashlib.new(hashname)
     _logger.debug("Getting «%s» for hashing with %s", url, hashname)
     with urllib.request.urlopen(url) as i:
-        while True:
-            buf = i.read(_bufsiz)
-            if len(buf) == 0:
-                break
-            hashish.update(buf)
-    return hashish.hexdigest()  # XXX We do not support hashes with varialbe-length digests
+        return digeststream(i, hashname)  # XXX We do not support hashes with varialbe-length digests
+
+
+def filesize(filepath):
+    """Return the size of the local file at ``filepath``, or zero if it can't be had."""
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        return 0
 
 
 def getmd5(i):
     """Compute an MD5 digest of the input stream ``i`` and return it as a hex string."""
-    md5 = hashlib.new("md5", usedforsecurity=False)
-    while True:
-        buf = i.read(_bufsiz)
-        if len(buf) == 0:
-            break
-        md5.update(buf)
-    return md5.hexdigest()
+    return digeststream(i, "md5")
 
 
 def addloggingarguments(parser):
@@ -298,6 +713,50 @@ def addbundlearguments(parser):
     parser.add_argument("--include-latest-collection-only", action="store_true", help=_allcollectionshelp)
 
 
+def positiveint(value):
+    """Convert the command-line ``value`` into an integer, insisting that it be at least one."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def addcatalogarguments(parser):
+    """Add command-line arguments to the given argument ``parser`` to control the parsing of labels."""
+    parser.add_argument("-w", "--workers", type=positiveint, default=1, metavar="N", help=_workershelp)
+    parser.add_argument("--catalog", metavar="CATALOG.SQLITE3", help=_cataloghelp)
+
+
+def fraction(value):
+    """Convert the command-line ``value`` into a number from 0 to 1."""
+    fraction = float(value)
+    if not 0.0 <= fraction <= 1.0:
+        raise argparse.ArgumentTypeError(f"{value} is not between 0 and 1")
+    return fraction
+
+
+def addhashingarguments(parser):
+    """Add command-line arguments to the given argument ``parser`` to tune the computation of message digests."""
+    parser.add_argument(
+        "--block-size", type=positiveint, default=DIGEST_BLOCK_SIZE, metavar="BYTES", help=_blocksizehelp
+    )
+    parser.add_argument("--digest-cache", metavar="CACHE.SQLITE3", help=_digestcachehelp)
+    parser.add_argument(
+        "--digest-cache-verify",
+        type=fraction,
+        default=0.0,
+        metavar="FRACTION",
+        help="Re-read this fraction (0–1) of files whose digests are cached anyway, warning if they no longer"
+        " match; default %(default)s",
+    )
+    parser.add_argument(
+        "--digest-cache-max-age",
+        type=float,
+        metavar="DAYS",
+        help="Re-read files whose cached digests were computed more than this many days ago",
+    )
+
+
 # Classes
 # -------
 
@@ -336,3 +795,204 @@ class URLValidator(object):
             raise
         finally:
             self._checked = True
+
+
+class _CatalogLoader(object):
+    """Something that gathers rows bound for the catalog and hands them to ``executemany`` in batches."""
+
+    def __init__(self, con, batchsize=_loadbatchsize):
+        """Load rows into the database ``con``nection, ``batchsize`` at a time."""
+        self.con, self.batchsize, self.count = con, batchsize, 0
+        self._pending, self._size = {}, 0  # SQL statement → rows for it; and how many rows in all
+
+    def add(self, statement, row):
+        """Add the ``row`` of parameters for the SQL ``statement``."""
+        self._pending.setdefault(statement, []).append(row)
+        self._size += 1
+        if self._size >= self.batchsize:
+            self.flush()
+
+    def addmany(self, statement, rows):
+        """Add each of the ``rows`` of parameters for the SQL ``statement``."""
+        pending = self._pending.setdefault(statement, [])
+        count = len(pending)
+        pending.extend(rows)
+        self._size += len(pending) - count
+        if self._size >= self.batchsize:
+            self.flush()
+
+    def flush(self):
+        """Execute everything pending."""
+        with phase("sqlite"):
+            for statement, rows in self._pending.items():
+                self.con.executemany(statement, rows)
+        self.count += self._size
+        self._pending, self._size = {}, 0
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class LabelInfo:
+    """What we need to know about a PDS label, without the rest of it.
+
+    Any of the identifiers or the title may be ``None`` if the label lacks them. ``members`` has a
+    (lidref, vidref, member_status) triple for each ``Bundle_Member_Entry`` under the root, any of which
+    may be ``None``. ``files`` has a (file_name, directory_path_name) pair for each ``file_name`` anywhere
+    in the label; the directory path comes from a sibling element and may be ``None``.
+    """
+
+    roottag: str
+    lid: str
+    vid: str
+    title: str
+    members: tuple
+    files: tuple
+
+
+def _sizeof(obj):
+    """Approximate how many bytes ``obj``—a ``LabelInfo`` or some part of one—takes up in memory."""
+    if isinstance(obj, LabelInfo):
+        return sys.getsizeof(obj) + sum(_sizeof(getattr(obj, i.name)) for i in dataclasses.fields(obj))
+    elif isinstance(obj, tuple):
+        return sys.getsizeof(obj) + sum(_sizeof(i) for i in obj)
+    elif obj is None:
+        return 0  # It's a singleton
+    return sys.getsizeof(obj)
+
+
+class LabelCache(object):
+    """A least-recently-used cache of ``LabelInfo`` bounded by (approximately) how many bytes it holds.
+
+    It's safe to use from multiple threads.
+    """
+
+    def __init__(self, maxsize=_labelcachesize):
+        """Make a cache that holds at most ``maxsize`` bytes' worth of ``LabelInfo``."""
+        self.maxsize, self.size, self.hits, self.misses = maxsize, 0, 0, 0
+        self._entries = collections.OrderedDict()  # key → (info, size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Tell how many labels are cached."""
+        return len(self._entries)
+
+    def get(self, key):
+        """Get the ``LabelInfo`` cached under ``key``, or ``None`` if there isn't one."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, info):
+        """Cache ``info`` under ``key``, evicting the least recently used entries to make room."""
+        size = _sizeof(key) + _sizeof(info)
+        if size > self.maxsize:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = info, size
+            self.size += size
+            while self.size > self.maxsize:
+                dummy, (dummy, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        """Empty the cache and reset its statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.size = self.hits = self.misses = 0
+
+    def stats(self):
+        """Return a dict of the cache's hits, misses, number of entries, size in bytes, and maximum size."""
+        with self._lock:
+            return dict(
+                hits=self.hits, misses=self.misses, entries=len(self._entries), size=self.size, maxsize=self.maxsize
+            )
+
+
+# The one cache for ``getlabelinfo``; clear it between phases of a run if you need the memory back
+labelcache = LabelCache()
+
+
+class _LabelTarget(object):
+    """An lxml parser target that picks out what we need from a PDS label as it streams by.
+
+    Rather than build a tree, this keeps just a stack of the elements currently open. When parsing
+    finishes, ``close`` gives a ``LabelInfo``. All but the ``file_name`` text in it are stripped of
+    surrounding whitespace.
+    """
+
+    _identificationarea = f"{{{PDS_NS_URI}}}Identification_Area"
+    _logicalidentifier = f"{{{PDS_NS_URI}}}logical_identifier"
+    _versionid = f"{{{PDS_NS_URI}}}version_id"
+    _title = f"{{{PDS_NS_URI}}}title"
+    _bundlememberentry = f"{{{PDS_NS_URI}}}Bundle_Member_Entry"
+    _lidreference = f"{{{PDS_NS_URI}}}lid_reference"
+    _lidvidreference = f"{{{PDS_NS_URI}}}lidvid_reference"
+    _memberstatus = f"{{{PDS_NS_URI}}}member_status"
+    _filename = f"{{{PDS_NS_URI}}}file_name"
+    _directorypathname = f"{{{PDS_NS_URI}}}directory_path_name"
+
+    def __init__(self):
+        """Get ready to parse a label."""
+        self.roottag = self.lid = self.vid = self.title = None
+        self.members, self.files = [], []
+        # Each open element gets [tag, text or None, whether it's had children, its directory_path_name]
+        self.stack = []
+
+    def start(self, tag, attrib):
+        """Handle the start of an element with the given ``tag`` and ``attrib``utes."""
+        if self.stack:
+            self.stack[-1][2] = True
+        else:
+            self.roottag = tag
+        self.stack.append([tag, None, False, None])
+        if tag == self._bundlememberentry and len(self.stack) == 2:
+            self.members.append([None, None, None])
+
+    def data(self, data):
+        """Handle character ``data``, which matters only if it comes before any child element."""
+        top = self.stack[-1]
+        if not top[2]:
+            top[1] = data if top[1] is None else top[1] + data
+
+    def end(self, tag):
+        """Handle the end of the element with the given ``tag``."""
+        dummy, text, dummy, dummy = self.stack.pop()
+        depth = len(self.stack)
+        if depth == 0:
+            return
+        parent = self.stack[-1]
+        if tag == self._filename:
+            # Its directory_path_name sibling may come after it, so hang on to the parent to check later
+            self.files.append((text, parent))
+        elif tag == self._directorypathname:
+            if parent[3] is None:
+                parent[3] = text
+        elif depth == 2 and parent[0] == self._identificationarea:
+            if tag == self._logicalidentifier and self.lid is None:
+                self.lid = text.strip()
+            elif tag == self._versionid and self.vid is None:
+                self.vid = text.strip()
+            elif tag == self._title and self.title is None and text:
+                self.title = text.strip()
+        elif depth == 2 and parent[0] == self._bundlememberentry:
+            member = self.members[-1]
+            if tag == self._lidreference:
+                member[0] = text.strip()
+            elif tag == self._lidvidreference:
+                member[0], member[1] = text.strip().split("::")
+            elif tag == self._memberstatus:
+                member[2] = text.strip()
+
+    def close(self):
+        """Finish parsing and return what we found."""
+        if self.lid is None:
+            self.vid = None
+        files = tuple((text, None if parent[3] is None else parent[3].strip()) for text, parent in self.files)
+        return LabelInfo(self.roottag, self.lid, self.vid, self.title, tuple(tuple(i) for i in self.members), files)
@@ -0,0 +1,242 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Verification.
+
+Long after a delivery, the files of a bundle should still match what its deep archive says about them.
+Rather than making a deep archive all over again, ``aipgen --verify`` reads an AIP's checksum manifest
+(and ``sipgen --verify`` a SIP's table) and re-reads every file it lists, several at once, reporting
+files whose digests no longer match, files that have gone missing, and files in the bundle's directory
+that aren't listed at all.
+"""
+import concurrent.futures
+import dataclasses
+import logging
+import os
+import random
+import threading
+import time
+
+from .constants import HASH_ALGORITHMS
+from .hashing import digestfile
+from .progress import Progress
+from .utils import filesize
+from .utils import fraction
+from .utils import positiveint
+
+
+# Constants
+# ---------
+
+_verifywindow = 1024  # Most files to have in flight at once, so millions of them don't all become futures
+_defaultthreads = os.cpu_count() or 4  # Files to verify at once; digests release the GIL so these hash in parallel
+
+# Logging:
+_logger = logging.getLogger(__name__)
+
+
+# Classes
+# -------
+
+
+@dataclasses.dataclass(slots=True)
+class Verification:
+    """What verifying a manifest found.
+
+    Of the ``checked`` files (``bytes`` bytes in all), the paths of those whose digests didn't match
+    are in ``mismatched``, those that weren't there in ``missing``, and those that couldn't be read
+    (say, for lack of permission or an I/O error) in ``unreadable``. ``extra`` has the paths of files
+    in the bundle's directory that the manifest doesn't list.
+    """
+
+    checked: int = 0
+    bytes: int = 0
+    mismatched: list = dataclasses.field(default_factory=list)
+    missing: list = dataclasses.field(default_factory=list)
+    unreadable: list = dataclasses.field(default_factory=list)
+    extra: list = dataclasses.field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        """True if every file checked was there, readable, and matched; extra files don't count against it."""
+        return not self.mismatched and not self.missing and not self.unreadable
+
+
+# Functions
+# ---------
+
+
+def readchecksummanifest(fn, basedir):
+    """Read an AIP checksum manifest.
+
+    Return a list of (file path, hash name, hex digest) triples, one for each line of the AIP checksum
+    manifest ``fn``, whose paths are relative to the bundle directory ``basedir``.
+    """
+    entries = []
+    with open(fn, "r", encoding="utf-8", newline="") as i:
+        for line in i:
+            digest, path = line.rstrip("\r\n").split("\t", 1)
+            entries.append((os.path.join(basedir, path), "md5", digest.lower()))
+    return entries
+
+
+def readsiptable(fn, baseurl, basedir):
+    """Read a SIP table.
+
+    Return a list of (file path, hash name, hex digest) triples for the files in the SIP table ``fn``.
+    The URLs in it start with ``baseurl`` and the rest of each is a path relative to ``basedir`` (the
+    directory that contains the bundle's directory). A file listed under several lidvids is returned
+    just once. URLs that don't start with ``baseurl`` can't be found locally and are skipped.
+    """
+    entries, seen, prefix = [], set(), baseurl.rstrip("/")
+    with open(fn, "r", encoding="utf-8", newline="") as i:
+        for line in i:
+            digest, hashname, url = line.rstrip("\r\n").split("\t")[:3]
+            if not url.startswith(prefix):
+                _logger.warning("⚠️ %s isn't under %s so it can't be verified", url, baseurl)
+                continue
+            path = os.path.join(basedir, url[len(prefix):].lstrip("/"))
+            if path not in seen:
+                seen.add(path)
+                entries.append((path, HASH_ALGORITHMS.get(hashname, hashname.lower()), digest.lower()))
+    return entries
+
+
+def findextras(dn, entries, ignore=()):
+    """Return the sorted paths of files in and under ``dn`` that aren't in the ``entries`` or ``ignore``."""
+    listed = {os.path.abspath(path) for path, _hashname, _digest in entries}
+    listed.update(os.path.abspath(path) for path in ignore)
+    extras = []
+    for dirpath, _dirnames, filenames in os.walk(dn):
+        paths = (os.path.join(dirpath, fn) for fn in filenames)
+        extras.extend(path for path in paths if os.path.abspath(path) not in listed)
+    return sorted(extras)
+
+
+def verify(entries, threads=_defaultthreads, failfast=False, sample=1.0, seed=None):
+    """Verify files.
+
+    Re-read the files of the ``entries`` (triples of file path, hash name, and expected hex digest)
+    using up to ``threads`` threads and return a ``Verification`` of which were mismatched, missing,
+    or unreadable. With ``failfast``, stop at the first such file. If ``sample`` is less than 1, check just that
+    fraction of the entries, chosen at random (reproducibly so for a given ``seed``).
+    """
+    if sample < 1.0:
+        entries = sorted(random.Random(seed).sample(entries, round(len(entries) * sample)))
+        _logger.info("🎲 Checking a sample of %d files", len(entries))
+    sizes = [filesize(path) for path, _hashname, _digest in entries]
+    result, lock, failed = Verification(), threading.Lock(), threading.Event()
+
+    def check(entry, size):
+        path, hashname, expected = entry
+        if failfast and failed.is_set():
+            return
+        try:
+            actual = digestfile(path, (hashname,))[hashname]
+        except FileNotFoundError:
+            _logger.error("❌ Missing %s", path)
+            bad = result.missing
+        except OSError as ex:
+            _logger.error("❌ Unreadable %s: %s", path, ex)
+            bad = result.unreadable
+        else:
+            bad = result.mismatched if actual != expected else None
+            if bad is not None:
+                _logger.error("❌ Mismatched %s: its %s is %s but should be %s", path, hashname, actual, expected)
+        with lock:
+            result.checked += 1
+            result.bytes += size
+            if bad is not None:
+                bad.append(path)
+                failed.set()
+        progress.advance(1, size)
+
+    with Progress("verify", len(entries), sum(sizes)) as progress:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            for start in range(0, len(entries), _verifywindow):
+                if failfast and failed.is_set():
+                    break
+                window = zip(entries[start:start + _verifywindow], sizes[start:start + _verifywindow])
+                for future in [executor.submit(check, entry, size) for entry, size in window]:
+                    future.result()
+    result.mismatched.sort()
+    result.missing.sort()
+    result.unreadable.sort()
+    return result
+
+
+def runverification(args, entries, dn, ignore=()):
+    """Run a verification.
+
+    Verify the ``entries`` of a manifest as the parsed command-line ``args`` say, then look for extra
+    files in the bundle directory ``dn`` (other than those in ``ignore``), log a summary, and return
+    the exit status: 0 if everything checked was readable and matched, 1 otherwise.
+    """
+    _logger.info("🔍 Verifying %d files listed in %s", len(entries), args.verify)
+    start = time.perf_counter()
+    result = verify(entries, args.threads, args.fail_fast, args.sample, args.seed)
+    elapsed = time.perf_counter() - start
+    if result.ok or not args.fail_fast:
+        result.extra = findextras(dn, entries, ignore)
+        for path in result.extra:
+            _logger.warning("⚠️ Extra %s isn't in the manifest", path)
+    _logger.info(
+        "🔍 Checked %d files (%.1f MB) in %.1fs at %.1f MB/s: %d mismatched, %d missing, %d unreadable, %d extra",
+        result.checked,
+        result.bytes / 1e6,
+        elapsed,
+        result.bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+        len(result.mismatched),
+        len(result.missing),
+        len(result.unreadable),
+        len(result.extra),
+    )
+    return 0 if result.ok else 1
+
+
+def addverifyarguments(parser):
+    """Add command-line arguments to the given argument ``parser`` to verify an existing manifest."""
+    parser.add_argument(
+        "--verify",
+        metavar="MANIFEST.TAB",
+        help="Instead of making anything, re-read the files listed in this manifest and report those that are"
+        " mismatched, missing, unreadable, or extra",
+    )
+    parser.add_argument("--fail-fast", action="store_true", help="Stop verifying at the first bad file")
+    parser.add_argument(
+        "--sample", type=fraction, default=1.0, metavar="FRACTION", help="Verify just this fraction of files [%(default)s]"
+    )
+    parser.add_argument("--seed", type=int, help="Seed for choosing which files to --sample, for reproducibility")
+    parser.add_argument(
+        "--threads",
+        type=positiveint,
+        default=_defaultthreads,
+        metavar="N",
+        help="Number of files to verify at once [%(default)s]",
+    )
@@ -109,6 +109,10 @@ class SIPFunctionalTestCase(_FunctionalTestCase):
         """Return the site ID for the manifest's label."""
         raise NotImplementedError("Subclasses must implement ``getsiteid``")
 
+    def gethashname(self):
+        """Return the name of the hash algorithm for the SIP manifest's digests."""
+        return "md5"
+
     def setUp(self):
         """Set up this text fixture, duh."""
         super(SIPFunctionalTestCase, self).setUp()
@@ -118,7 +122,7 @@ class SIPFunctionalTestCase(_FunctionalTestCase):
         """Test if a SIP manifest works as expected."""
         manifest, ignoredlabel = produce_sip(
             bundle=self.input,
-            hashname="md5",
+            hashname=self.gethashname(),
             registryserviceurl=None,
             insecureconnectionflag=True,
             site=self.getsiteid(),
@@ -28,11 +28,21 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 """PDS AIP-GEN functional tests."""
+import argparse
+import glob
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
+from datetime import datetime
 from urllib.error import URLError
 
 from base import AIPFunctionalTestCase
 from base import SIPFunctionalTestCase
+from pds2.aipgen.main import _archive
+from pds2.aipgen.utils import comprehenddirectory
+from pds2.aipgen.utils import createschema
 
 
 class LADEESIPTest(SIPFunctionalTestCase):
@@ -67,6 +77,18 @@ class LADEESIPTest(SIPFunctionalTestCase):
         return "PDS_ATM"
 
 
+class LADEESHA256SIPTest(LADEESIPTest):
+    """Test case for SIP generation from the LADEE test bundle using SHA-256 digests instead of MD5."""
+
+    def getvalidsipfilename(self):
+        """Get the valid SIP file name."""
+        return "data/ladee_test/valid/ladee_mission_bundle_v1.0_sip_v1.0_sha256.tab"
+
+    def gethashname(self):
+        """Get the hash algorithm name."""
+        return "sha256"
+
+
 class LADEELBLXSIPTest(SIPFunctionalTestCase):
     """Test case for SIP generation for all collections from the LADEE test bundle but
     with an ``.lblx`` file extension.
@@ -404,6 +426,47 @@ class NAIF3SIPWithBadbaseurlTest(SIPFunctionalTestCase):
             super().test_sip()
 
 
+class InsightLatestDeepArchiveTest(unittest.TestCase):
+    """Test that pds-deep-archive gives the SIP step the same choice of collections as the AIP step."""
+
+    def setUp(self):
+        """Catalog the Insight Documents test bundle and work in a temporary directory."""
+        super().setUp()
+        self.cwd, self.testdir = os.getcwd(), tempfile.mkdtemp()
+        data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "insight_documents")
+        self.bundlefile = os.path.join(data, "urn-nasa-pds-insight_documents", "bundle_insight_documents.xml")
+        self.dbfile = os.path.join(self.testdir, "catalog.sqlite3")
+        con = sqlite3.connect(self.dbfile)
+        with con:
+            createschema(con)
+            comprehenddirectory(os.path.dirname(self.bundlefile), con)
+        con.close()
+        os.chdir(self.testdir)
+
+    def tearDown(self):
+        """Clean up the temporary directory."""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.testdir, ignore_errors=True)
+        super().tearDown()
+
+    def test_latest_collection_only(self):
+        """Make sure --include-latest-collection-only makes a SIP of just the latest collections."""
+        args = argparse.Namespace(
+            include_latest_collection_only=True,
+            algorithm="MD5",
+            site="PDS_GEO",
+            bundle_base_url="https://pds.nasa.gov/data/pds4/test-bundles/",
+        )
+        with open(self.bundlefile, "rb") as bundle:
+            _archive(bundle, args, self.dbfile, datetime(2020, 7, 2))
+        (sip,), (transfer,) = glob.glob("*_sip_v1.0.tab"), glob.glob("*_transfer_manifest_v*.tab")
+        with open(sip, "rb") as i:
+            siplidvids = {line.split(b"\t")[3].strip() for line in i}
+        with open(transfer, "rb") as i:
+            aiplidvids = {line[:255].strip() for line in i}
+        self.assertEqual(aiplidvids, siplidvids)
+
+
 def test_suite():
     """Return a suite of tests, duh flake8."""
     return unittest.TestSuite(
@@ -412,9 +475,11 @@ def test_suite():
             unittest.defaultTestLoader.loadTestsFromTestCase(InsightAllAIPTest),
             unittest.defaultTestLoader.loadTestsFromTestCase(InsightAllSIPTest),
             unittest.defaultTestLoader.loadTestsFromTestCase(InsightLatestAIPTest),
+            unittest.defaultTestLoader.loadTestsFromTestCase(InsightLatestDeepArchiveTest),
             unittest.defaultTestLoader.loadTestsFromTestCase(InsightLatestSIPTest),
             unittest.defaultTestLoader.loadTestsFromTestCase(LADEEAIPTest),
             unittest.defaultTestLoader.loadTestsFromTestCase(LADEESIPTest),
+            unittest.defaultTestLoader.loadTestsFromTestCase(LADEESHA256SIPTest),
             unittest.defaultTestLoader.loadTestsFromTestCase(LADEELBLXAIPTest),
             unittest.defaultTestLoader.loadTestsFromTestCase(LADEELBLXSIPTest),
             unittest.defaultTestLoader.loadTestsFromTestCase(NAIF3SIPWithBadbaseurlTest),
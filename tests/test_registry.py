@@ -0,0 +1,212 @@
+# encoding: utf-8
+#
+# Copyright © 2026 California Institute of Technology ("Caltech").
+# ALL RIGHTS RESERVED. U.S. Government sponsorship acknowledged.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# • Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+# • Redistributions must reproduce the above copyright notice, this list of
+#   conditions and the following disclaimer in the documentation and/or other
+#   materials provided with the distribution.
+# • Neither the name of Caltech nor its operating division, the Jet Propulsion
+#   Laboratory, nor the names of its contributors may be used to endorse or
+#   promote products derived from this software without specific prior written
+#   permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""PDS AIP-GEN: Unit tests of registry-based deep archives, against a stand-in PDS API"""
+import glob
+import importlib.resources
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import requests
+from pds2.aipgen import registry
+from pds2.aipgen.httpcache import ResponseCache
+from pds2.aipgen.registry import _comprehendregistry
+from pds2.aipgen.registry import _File
+from pds2.aipgen.registry import _PageSizer
+from pds2.aipgen.registry import generatedeeparchive
+from pds2.aipgen.registry import RegistryClient
+from pds2.aipgen.standin import Registry
+from pds2.aipgen.standin import StandInServer
+
+
+BUNDLE = "urn:nasa:pds:ladee_mission_bundle::1.0"
+
+
+def _serve(registry, **kwargs):
+    """Start serving the ``registry`` from a stand-in PDS API on some free port and return the server."""
+    server = StandInServer(("127.0.0.1", 0), registry, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _sortedtables(dn):
+    """Return a dict of the kind of each table in the directory ``dn`` to its lines, sorted."""
+    tables = {}
+    for fn in glob.glob(os.path.join(dn, "*.tab")):
+        kind = "sip" if "_sip_" in fn else "transfer" if "_transfer_" in fn else "checksum"
+        with open(fn, "rb") as i:
+            tables[kind] = sorted(i.read().splitlines())
+    return tables
+
+
+def _bac(bac):
+    """Make the ``bac`` comparable, ignoring the order of files in each set."""
+    return [(lidvid, sorted(files)) for lidvid, files in bac.items()]
+
+
+class FileTestCase(unittest.TestCase):
+    """Test the compact representation of files in the PDS Registry"""
+
+    def test_file(self):
+        """Ensure files keep their URLs and MD5s and compare and sort by them"""
+        a = _File.make("https://x.org//data/b/a.xml", "0123456789abcdef0123456789abcdef")
+        b = _File.make("https://x.org/data/b/b.xml", "0123456789ABCDEF0123456789ABCDEF")
+        self.assertEqual("https://x.org/data/b/a.xml", a.url)
+        self.assertEqual("0123456789abcdef0123456789abcdef", a.md5)
+        self.assertEqual("0123456789ABCDEF0123456789ABCDEF", b.md5)
+        self.assertIs(a.directory, b.directory)
+        self.assertEqual(a, _File.make("https://x.org/data/b/a.xml", "0123456789abcdef0123456789abcdef"))
+        self.assertNotEqual(a, _File.make("https://x.org/data/b/a.xml", "0123456789abcdef0123456789abcdee"))
+        self.assertEqual([a, b], sorted([b, a]))
+        self.assertEqual(1, len({a, _File.make(a.url, a.md5)}))
+
+
+class RegistryTestCase(unittest.TestCase):
+    """Test making deep archives from a stand-in PDS API serving the LADEE test bundle"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(RegistryTestCase, cls).setUpClass()
+        with importlib.resources.as_file(importlib.resources.files(__name__).joinpath("data/ladee_test")) as dn:
+            cls.valid = _sortedtables(os.path.join(dn, "valid"))
+            cls.registry = Registry.fromdirectory(os.path.join(dn, "mission_bundle"))
+        cls.server = _serve(cls.registry)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(RegistryTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        super(RegistryTestCase, self).setUp()
+        self.cwd, self.testdir = os.getcwd(), tempfile.mkdtemp()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.testdir, ignore_errors=True)
+        super(RegistryTestCase, self).tearDown()
+
+    def _generate(self, subdir, **kwargs):
+        """Generate a deep archive into ``subdir`` of the test directory and return its sorted tables."""
+        dn = os.path.join(self.testdir, subdir)
+        os.mkdir(dn)
+        os.chdir(dn)
+        generatedeeparchive(self.server.url, BUNDLE, "PDS_ATM", **kwargs)
+        return _sortedtables(dn)
+
+    def test_deep_archive(self):
+        """Ensure registry-based AIP manifests match those made from the bundle directory"""
+        tables = self._generate("normal")
+        self.assertEqual(self.valid["checksum"], tables["checksum"])
+        self.assertEqual(self.valid["transfer"], tables["transfer"])
+
+    def test_streaming(self):
+        """Ensure streaming makes the same tables, order aside"""
+        self.assertEqual(self._generate("normal"), self._generate("streaming", streaming=True))
+
+    def test_failed_streaming(self):
+        """Ensure streaming leaves no half-written tables behind when the crawl fails partway through"""
+        original = registry._crawl
+
+        def failingcrawl(*args, **kwargs):
+            crawl = original(*args, **kwargs)
+            yield next(crawl)
+            raise requests.exceptions.ConnectionError("Lost the PDS API")
+
+        registry._crawl = failingcrawl
+        try:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self._generate("failed", streaming=True)
+        finally:
+            registry._crawl = original
+        self.assertEqual([], os.listdir(os.path.join(self.testdir, "failed")))
+
+    def test_crawl(self):
+        """Ensure the B.A.C. is the same no matter the concurrency or page sizes"""
+        with RegistryClient(self.server.url) as client:
+            expected = _bac(_comprehendregistry(client, BUNDLE, concurrency=1)[0])
+            self.assertEqual(expected, _bac(_comprehendregistry(client, BUNDLE, concurrency=4)[0]))
+        limited = _serve(self.registry, pagelimit=1)
+        try:
+            with RegistryClient(limited.url, pagesize=3) as client:
+                self.assertEqual(expected, _bac(_comprehendregistry(client, BUNDLE)[0]))
+        finally:
+            limited.shutdown()
+            limited.server_close()
+
+    def test_response_cache(self):
+        """Ensure cached responses get revalidated rather than downloaded again"""
+        cache = ResponseCache(os.path.join(self.testdir, "cache.sqlite3"))
+        try:
+            with RegistryClient(self.server.url, cache=cache) as client:
+                expected = _bac(_comprehendregistry(client, BUNDLE)[0])
+                self.assertEqual((0, 0), (cache.hits, cache.revalidations))
+                misses = cache.misses
+                self.assertEqual(expected, _bac(_comprehendregistry(client, BUNDLE)[0]))
+                self.assertEqual((misses, misses), (cache.misses, cache.revalidations))
+        finally:
+            cache.close()
+
+    def test_page_sizes(self):
+        """Ensure page sizes adapt to how quickly pages come, unless they have to stay put for caching"""
+        pages = _PageSizer(10, 40)
+        pages.succeeded(0.0)
+        self.assertEqual(20, pages.size)
+        self.assertTrue(pages.failed())
+        self.assertEqual(10, pages.size)
+        pages = _PageSizer(10, 40, adaptive=False)
+        pages.succeeded(0.0)
+        self.assertEqual(10, pages.size)
+
+    def test_fixture(self):
+        """Ensure a registry survives a round trip through a JSON fixture"""
+        fn = os.path.join(self.testdir, "fixture.json")
+        self.registry.dump(fn)
+        registry = Registry.fromfixture(fn)
+        self.assertEqual(self.registry.products, registry.products)
+        self.assertEqual(self.registry.members, registry.members)
+
+    def test_injected_errors(self):
+        """Ensure the stand-in PDS API fails requests when asked to"""
+        failing = _serve(self.registry, errorrate=1.0)
+        try:
+            r = requests.get(f"{failing.url}/products/{BUNDLE}")
+            self.assertEqual(503, r.status_code)
+            self.assertEqual((1, 1), (failing.requests, failing.errors))
+        finally:
+            failing.shutdown()
+            failing.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
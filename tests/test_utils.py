@@ -29,20 +29,72 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """PDS AIP-GEN: Unit tests of the Utilities package"""
 import argparse
+import concurrent.futures
+import datetime
+import functools
+import gzip
+import hashlib
+import http.server
+import io
 import logging
 import os
+import shutil
+import sqlite3
 import tempfile
+import threading
+import time
 import unittest
 
 import zope.component  # type: ignore
+from pds2.aipgen import hashing
+from pds2.aipgen.aip import process as produce_aip
+from pds2.aipgen.checkpoint import Checkpoint
+from pds2.aipgen.constants import PDS_NS_URI
+from pds2.aipgen.constants import PRODUCT_BUNDLE_TAG
+from pds2.aipgen.constants import PRODUCT_COLLECTION_TAG
+from pds2.aipgen.digestcache import DigestCache
+from pds2.aipgen.digestcache import prune
+from pds2.aipgen.hashing import digestfile
+from pds2.aipgen.hashing import DigestStore
+from pds2.aipgen.interfaces import IDigestCache
+from pds2.aipgen.interfaces import IMetrics
+from pds2.aipgen.interfaces import IProgressListener
 from pds2.aipgen.interfaces import IURLValidator
+from pds2.aipgen.main import _duplicatebundles
+from pds2.aipgen.main import _outermostdirectories
+from pds2.aipgen.metrics import Metrics
+from pds2.aipgen.metrics import phase
+from pds2.aipgen.progress import addprogressarguments
+from pds2.aipgen.progress import Progress
+from pds2.aipgen.progress import PROGRESS_INTERVAL
+from pds2.aipgen.progress import setprogressinterval
+from pds2.aipgen.sip import _getdigests
+from pds2.aipgen.sip import _writetable
+from pds2.aipgen.sip import produce as produce_sip
+from pds2.aipgen.utils import _extractlabel
+from pds2.aipgen.utils import _finishbulkload
+from pds2.aipgen.utils import _startbulkload
+from pds2.aipgen.utils import _updatelatestversions
 from pds2.aipgen.utils import addloggingarguments
+from pds2.aipgen.utils import comprehenddirectory
+from pds2.aipgen.utils import createschema
+from pds2.aipgen.utils import findbundles
 from pds2.aipgen.utils import fixmultislashes
 from pds2.aipgen.utils import getdigest
+from pds2.aipgen.utils import getlabelinfo
 from pds2.aipgen.utils import getlogicalversionidentifier
 from pds2.aipgen.utils import getmd5
+from pds2.aipgen.utils import LabelCache
+from pds2.aipgen.utils import labelcache
+from pds2.aipgen.utils import LabelInfo
 from pds2.aipgen.utils import parsexml
+from pds2.aipgen.utils import resolvelabels
 from pds2.aipgen.utils import URLValidator
+from pds2.aipgen.utils import versionkey
+from pds2.aipgen.verify import findextras
+from pds2.aipgen.verify import readchecksummanifest
+from pds2.aipgen.verify import readsiptable
+from pds2.aipgen.verify import verify
 
 
 EMPTY_SHA1 = "da39a3ee5e6b4b0d3255bfef95601890afd80709"
@@ -67,10 +119,282 @@ class HashingTestCase(unittest.TestCase):
         with open(self.emptyFileName, "rb") as i:
             self.assertEqual(EMPTY_MD5, getmd5(i))
 
+    def test_blocks(self):
+        """Ensure the hashing engine gets the same digests however it reads a file"""
+        data = os.urandom(100000)
+        fd, fn = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        expected = hashlib.sha256(data).hexdigest()
+        threshold = hashing._mmapthreshold
+        try:
+            hashing.setblocksize(4096)
+            for hashing._mmapthreshold in (2 ** 40, 0):
+                self.assertEqual(expected, getdigest("file:" + fn, "sha256"))
+                getdigest.cache_clear()
+                self.assertEqual(expected, DigestStore().digest(fn, "sha256"))
+        finally:
+            hashing._mmapthreshold = threshold
+            hashing.setblocksize(hashing.DIGEST_BLOCK_SIZE)
+            os.unlink(fn)
+
+    def test_fetched_digests(self):
+        """Ensure SIP digests come from local files and web servers alike, skipping those that are missing"""
+        dn = os.path.dirname(self.emptyFileName)
+        handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=dn)
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            web = f"http://127.0.0.1:{server.server_port}/{os.path.basename(self.emptyFileName)}"
+            lidvidstofiles = {"a::1": {web, "file:" + self.emptyFileName}, "b::1": {web, web + "-missing"}}
+            with self.assertLogs("pds2.aipgen.sip", logging.INFO):
+                digests = _getdigests(lidvidstofiles, "md5")
+            local = "file:" + self.emptyFileName
+            expected = [(web, EMPTY_MD5, "a::1"), (web, EMPTY_MD5, "b::1"), (local, EMPTY_MD5, "a::1")]
+            self.assertEqual(sorted(expected), digests)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_content_encoded_digests(self):
+        """Ensure SIP digests are of the files as they are, even when a server says they're gzip-encoded"""
+        encodings = []
+
+        class GzipEncodingHandler(http.server.BaseHTTPRequestHandler):
+            """Serve gzipped bytes as some servers do ``.gz`` files: with a ``Content-Encoding`` of gzip."""
+
+            def do_GET(self):  # noqa: N802
+                encodings.append(self.headers["Accept-Encoding"])
+                body = gzip.compress(b"Hello")
+                self.send_response(200)
+                self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), GzipEncodingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            web = f"http://127.0.0.1:{server.server_port}/hello.txt.gz"
+            digests = _getdigests({"a::1": {web}}, "md5")
+            self.assertEqual([(web, hashlib.md5(gzip.compress(b"Hello")).hexdigest(), "a::1")], digests)
+            self.assertEqual(["identity"], encodings)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_sip_hash_names(self):
+        """Ensure SIP tables name algorithms the PDS way, and others by their upper-cased hashlib names"""
+        for hashname, expected in (("sha256", b"\tSHA-256\t"), ("sha512", b"\tSHA512\t")):
+            table = io.BytesIO()
+            _writetable([("file:/data/bundle/a.xml", "0", "urn:nasa:pds:a::1.0")], hashname, table, "https://x/", "/data")
+            self.assertIn(expected, table.getvalue())
+
+    def test_digeststore(self):
+        """Ensure the digest store reads each file just once per algorithm"""
+        store = DigestStore()
+        self.assertEqual(EMPTY_MD5, store.digest(self.emptyFileName, "md5"))
+        self.assertEqual(EMPTY_MD5, store.digest(self.emptyFileName, "md5"))
+        self.assertEqual(EMPTY_SHA1, store.digest(self.emptyFileName, "sha1"))
+        self.assertEqual((1, 2), (store.hits, store.misses))
+
+        # A store that computes several digests at once needs just one read
+        store = DigestStore(("md5", "sha1"))
+        self.assertEqual(EMPTY_MD5, store.digest(self.emptyFileName, "md5"))
+        self.assertEqual(EMPTY_SHA1, store.digest(self.emptyFileName, "sha1"))
+        self.assertEqual((1, 1), (store.hits, store.misses))
+
+        # Threads wanting the same file at once share a single read
+        store, reads = DigestStore(), []
+        original = hashing.digestfile
+
+        def slowdigestfile(filepath, hashnames):
+            reads.append(filepath)
+            time.sleep(0.2)
+            return original(filepath, hashnames)
+
+        hashing.digestfile = slowdigestfile
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                futures = [executor.submit(store.digest, self.emptyFileName, "md5") for _ in range(8)]
+                digests = [future.result() for future in futures]
+        finally:
+            hashing.digestfile = original
+        self.assertEqual([EMPTY_MD5] * 8, digests)
+        self.assertEqual([self.emptyFileName], reads)
+        self.assertEqual((7, 1), (store.hits, store.misses))
+
+    def test_digestcache(self):
+        """Ensure the persistent digest cache re-uses digests only of unchanged files"""
+        cachedir = tempfile.mkdtemp()
+        cache = DigestCache(os.path.join(cachedir, "cache.sqlite3"))
+        zope.component.provideUtility(cache)
+        try:
+            self.assertEqual({"md5": EMPTY_MD5}, digestfile(self.emptyFileName, ("md5",)))
+            self.assertEqual({"md5": EMPTY_MD5}, digestfile(self.emptyFileName, ("md5",)))
+            self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+            # Change the file and it should get read again
+            with open(self.emptyFileName, "wb") as o:
+                o.write(b"Hello")
+            self.assertEqual(hashlib.md5(b"Hello").hexdigest(), digestfile(self.emptyFileName, ("md5",))["md5"])
+            self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+            # Streams that aren't named for the files they read don't get cached under a shared name
+            fd, other = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                for fn in (self.emptyFileName, other, self.emptyFileName):
+                    with open(fn, "rb") as f:
+                        expected = hashlib.md5(f.read()).hexdigest()
+                    self.assertEqual(expected, getdigest("file:" + fn, "md5"))
+                    getdigest.cache_clear()
+                self.assertEqual((1, 2), (cache.hits, cache.misses))
+            finally:
+                os.unlink(other)
+        finally:
+            zope.component.getGlobalSiteManager().unregisterUtility(cache, IDigestCache)
+            cache.close()
+            shutil.rmtree(cachedir, ignore_errors=True)
+
+    def test_prune(self):
+        """Ensure pruning counts every digest removed, not just every file"""
+        cachedir = tempfile.mkdtemp()
+        fn = os.path.join(cachedir, "cache.sqlite3")
+        cache = DigestCache(fn)
+        zope.component.provideUtility(cache)
+        try:
+            fd, gone = tempfile.mkstemp(dir=cachedir)
+            os.close(fd)
+            digestfile(gone, ("md5", "sha1"))
+            digestfile(self.emptyFileName, ("md5",))
+        finally:
+            zope.component.getGlobalSiteManager().unregisterUtility(cache, IDigestCache)
+            cache.close()
+        os.unlink(gone)
+        con = sqlite3.connect(fn)
+        try:
+            self.assertEqual(2, prune(con))
+            self.assertEqual(1, con.execute("SELECT count(*) FROM digests").fetchone()[0])
+        finally:
+            con.close()
+            shutil.rmtree(cachedir, ignore_errors=True)
+
+    def test_metrics(self):
+        """Ensure hashing gets measured, with nested phases reported exclusively"""
+        metrics = Metrics()
+        zope.component.provideUtility(metrics)
+        try:
+            with open(self.emptyFileName, "wb") as o:
+                o.write(b"Hello")
+            with phase("write"):
+                digestfile(self.emptyFileName, ("md5",))
+            report = metrics.report()
+            self.assertEqual((1, 5), (report["hashing"]["files"], report["hashing"]["bytes"]))
+            write, hashed = report["phases"]["write"], report["phases"]["hash"]
+            self.assertEqual(1, hashed["calls"])
+            self.assertAlmostEqual(write["wall"], write["exclusive_wall"] + hashed["wall"])
+        finally:
+            zope.component.getGlobalSiteManager().unregisterUtility(metrics, IMetrics)
+
     def tearDown(self):
         os.unlink(self.emptyFileName)
 
 
+class ProgressTestCase(unittest.TestCase):
+    def test_progress(self):
+        """Ensure progress gets reported to a listener with an estimate of the time to go"""
+        statuses = []
+        listener = statuses.append
+        zope.component.provideUtility(listener, IProgressListener)
+        setprogressinterval(1e-9)
+        try:
+            with Progress("test", 4, 400) as progress:
+                progress.advance(1, 100)
+                progress.advance(1, 100)
+            self.assertEqual([1, 2, 2], [i.files for i in statuses])
+            self.assertEqual([False, False, True], [i.finished for i in statuses])
+            self.assertEqual(200, statuses[-1].bytes)
+            self.assertIsNotNone(statuses[0].eta)
+            self.assertIn("2 of 4 files", statuses[-1].describe())
+        finally:
+            setprogressinterval(PROGRESS_INTERVAL)
+            zope.component.getGlobalSiteManager().unregisterUtility(listener, IProgressListener)
+
+
+class CheckpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dn = tempfile.mkdtemp()
+
+    def test_checkpoint(self):
+        """Ensure a resumed run gets the same timestamp and an incomplete catalog gets thrown away"""
+        checkpoint = Checkpoint(self.dn, ["bundle.xml"])
+        sqlite3.connect(checkpoint.catalog).close()
+        resumed = Checkpoint(self.dn, ["bundle.xml"], resume=True)
+        self.assertEqual(checkpoint.timestamp, resumed.timestamp)
+        self.assertFalse(os.path.exists(resumed.catalog))
+
+        # A complete catalog stays, even for a new run
+        sqlite3.connect(resumed.catalog).close()
+        resumed.markcataloged()
+        self.assertTrue(Checkpoint(self.dn, ["bundle.xml"]).cataloged)
+        self.assertTrue(os.path.exists(resumed.catalog))
+
+        # But it's no good for resuming some other bundle
+        with self.assertRaises(ValueError):
+            Checkpoint(self.dn, ["other.xml"], resume=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.dn, ignore_errors=True)
+
+
+class VerificationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dn = tempfile.mkdtemp()
+        self.bundledir = os.path.join(self.dn, "mission_bundle")
+        shutil.copytree(os.path.join(os.path.dirname(__file__), "data", "ladee_test", "mission_bundle"), self.bundledir)
+        self.valid = os.path.join(os.path.dirname(__file__), "data", "ladee_test", "valid")
+
+    def test_verification(self):
+        """Ensure verifying a manifest finds mismatched, missing, and extra files"""
+        fn = os.path.join(self.valid, "ladee_mission_bundle_v1.0_checksum_manifest_v1.0.tab")
+        entries = readchecksummanifest(fn, self.bundledir)
+        self.assertTrue(verify(entries, threads=4).ok)
+        with open(os.path.join(self.bundledir, "LADEE_Bundle_1101.xml"), "ab") as f:
+            f.write(b"\n")
+        os.remove(os.path.join(self.bundledir, "context", "collection_mission_context_inventory.tab"))
+        result = verify(entries, threads=4)
+        self.assertEqual([os.path.join(self.bundledir, "LADEE_Bundle_1101.xml")], result.mismatched)
+        self.assertEqual([os.path.join(self.bundledir, "context", "collection_mission_context_inventory.tab")], result.missing)
+        self.assertEqual(len(entries), result.checked)
+        # A file that can't be read gets reported rather than stopping the run
+        unreadable = os.path.join(self.bundledir, "context", "collection_mission_context.xml")
+        os.remove(unreadable)
+        os.mkdir(unreadable)
+        result = verify(entries, threads=4)
+        self.assertEqual([unreadable], result.unreadable)
+        self.assertFalse(result.ok)
+        self.assertEqual(len(entries), result.checked)
+        result = verify(entries, threads=1, failfast=True)
+        self.assertEqual(1, len(result.mismatched) + len(result.missing) + len(result.unreadable))
+        self.assertEqual(3, verify(entries, sample=0.25, seed=1).checked)
+        self.assertEqual([os.path.join(self.bundledir, "xml_schema", "empty.xml")], findextras(self.bundledir, entries))
+
+    def test_sip_verification(self):
+        """Ensure a SIP table's URLs map back to the bundle's files"""
+        fn = os.path.join(self.valid, "ladee_mission_bundle_v1.0_sip_v1.0.tab")
+        entries = readsiptable(fn, "https://atmos.nmsu.edu/PDS/data/PDS4/LADEE/", self.dn)
+        self.assertEqual(13, len(entries))
+        self.assertTrue(all(path.startswith(self.bundledir) and hashname == "md5" for path, hashname, _ in entries))
+        self.assertTrue(verify(entries).ok)
+
+    def tearDown(self):
+        shutil.rmtree(self.dn, ignore_errors=True)
+
+
 class BundleParsingTestCase(unittest.TestCase):
     """Test handling of bundle XML files"""
 
@@ -91,6 +415,326 @@ class BundleParsingTestCase(unittest.TestCase):
         super(BundleParsingTestCase, self).tearDown()
 
 
+class ComprehensionTestCase(unittest.TestCase):
+    """Test comprehension of bundle directories"""
+
+    def _rows(self, con):
+        """Return the rows of the label tables in ``con``."""
+        rows = {}
+        for table in ("labels", "inter_label_references", "label_file_references"):
+            rows[table] = sorted(con.execute(f"SELECT * FROM {table}").fetchall(), key=repr)
+        return rows
+
+    def _comprehend(self, workers, bundle_dir=None):
+        """Comprehend the Insight documents test bundle with ``workers`` processes and return its table rows."""
+        if bundle_dir is None:
+            test_dir = os.path.dirname(__file__)
+            bundle_dir = os.path.join(test_dir, "data", "insight_documents", "urn-nasa-pds-insight_documents")
+        con = sqlite3.connect(":memory:")
+        with con:
+            createschema(con)
+            comprehenddirectory(bundle_dir, con, workers)
+        rows = self._rows(con)
+        con.close()
+        return rows
+
+    def test_parallel_comprehension(self):
+        """Ensure parsing labels in worker processes gives the same rows as parsing them serially"""
+        serial, parallel = self._comprehend(1), self._comprehend(3)
+        self.assertTrue(len(serial["labels"]) > 0)
+        self.assertEqual(serial, parallel)
+
+    def test_parallel_parse_metrics(self):
+        """Ensure parsing labels in worker processes still shows up as the parse phase"""
+        metrics = Metrics()
+        zope.component.provideUtility(metrics)
+        try:
+            self._comprehend(3)
+            self.assertEqual(1, metrics.report()["phases"]["parse"]["calls"])
+        finally:
+            zope.component.getGlobalSiteManager().unregisterUtility(metrics, IMetrics)
+
+    def test_bulk_load(self):
+        """Ensure bulk loading drops the same duplicates the unique indexes would"""
+        con = sqlite3.connect(":memory:")
+        createschema(con)
+        settings = _startbulkload(con)
+        rows = [("a", "1", "b", "1"), ("a", "1", "b", "1"), ("a", "1", "c", None), ("a", "1", "c", None)]
+        con.executemany("INSERT INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES (?,?,?,?)", rows)
+        _finishbulkload(con, settings)
+        self.assertEqual(rows[1:], con.execute("SELECT * FROM inter_label_references ORDER BY rowid").fetchall())
+        self.assertRaises(
+            sqlite3.IntegrityError,
+            con.execute,
+            "INSERT INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES (?,?,?,?)",
+            rows[0],
+        )
+        con.close()
+
+    def test_label_extraction(self):
+        """Ensure streaming extraction of labels finds what we need in document order"""
+        tempdir = tempfile.mkdtemp()
+        try:
+            xmlfile = os.path.join(tempdir, "label.xml")
+            with open(xmlfile, "w") as f:
+                f.write(
+                    f"""<Product_Bundle xmlns="{PDS_NS_URI}">
+                    <Identification_Area><logical_identifier> urn:nasa:pds:b </logical_identifier>
+                    <version_id>1.0</version_id></Identification_Area>
+                    <Bundle_Member_Entry><lidvid_reference>urn:nasa:pds:b:c::2.0</lidvid_reference>
+                    <member_status>Primary</member_status></Bundle_Member_Entry>
+                    <File_Area><File><file_name>a.txt</file_name><directory_path_name>d</directory_path_name></File>
+                    </File_Area><File_Area><File><file_name> b.txt </file_name></File></File_Area>
+                    </Product_Bundle>"""
+                )
+            self.assertEqual(
+                LabelInfo(
+                    f"{{{PDS_NS_URI}}}Product_Bundle",
+                    "urn:nasa:pds:b",
+                    "1.0",
+                    None,
+                    (("urn:nasa:pds:b:c", "2.0", "Primary"),),
+                    (("a.txt", "d"), (" b.txt ", None)),
+                ),
+                _extractlabel(xmlfile),
+            )
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+    def test_label_cache(self):
+        """Ensure the label cache counts hits and misses and stays within its size"""
+        test_dir = os.path.dirname(__file__)
+        bundle_dir = os.path.join(test_dir, "data", "insight_documents", "urn-nasa-pds-insight_documents")
+        xmlfile = os.path.join(bundle_dir, "bundle_insight_documents.xml")
+        labelcache.clear()
+        info = getlabelinfo(xmlfile)
+        self.assertEqual("urn:nasa:pds:insight_documents", info.lid)
+        self.assertIsNotNone(info.title)
+        self.assertIs(info, getlabelinfo(xmlfile))
+        stats = labelcache.stats()
+        self.assertEqual((1, 1, 1), (stats["hits"], stats["misses"], stats["entries"]))
+        self.assertTrue(0 < stats["size"] <= stats["maxsize"])
+
+        cache = LabelCache(maxsize=labelcache.size + 1)
+        cache.put("a", info)
+        cache.put("b", info)
+        self.assertEqual((None, info), (cache.get("a"), cache.get("b")))
+        self.assertTrue(cache.size <= cache.maxsize)
+        cache.clear()
+        self.assertEqual((0, 0), (len(cache), cache.size))
+        labelcache.clear()
+
+    def test_incremental_comprehension(self):
+        """Ensure updating a persistent catalog gives the same rows as starting from scratch"""
+        test_dir = os.path.dirname(__file__)
+        tempdir = tempfile.mkdtemp()
+        try:
+            bundle_dir = os.path.join(tempdir, "urn-nasa-pds-insight_documents")
+            shutil.copytree(
+                os.path.join(test_dir, "data", "insight_documents", "urn-nasa-pds-insight_documents"), bundle_dir
+            )
+            con = sqlite3.connect(os.path.join(tempdir, "catalog.sqlite3"))
+            with con:
+                createschema(con)
+                comprehenddirectory(bundle_dir, con)
+            original = self._rows(con)
+
+            # Nothing changed, so nothing should change
+            with con:
+                createschema(con)
+                comprehenddirectory(bundle_dir, con)
+            self.assertEqual(original, self._rows(con))
+
+            # Delete a label, rewrite a collection's inventory table, and add a stray label
+            os.remove(os.path.join(bundle_dir, "document_rise", "release_notes.xml"))
+            inventory = os.path.join(bundle_dir, "document_ida", "collection_document_ida_inventory.csv")
+            with open(inventory, "r", newline="") as f:
+                lines = f.readlines()
+            with open(inventory, "w", newline="") as f:
+                f.writelines(lines[:-1])
+            with open(os.path.join(bundle_dir, "stray.xml"), "w") as f:
+                f.write("<stray/>")
+            with con:
+                comprehenddirectory(bundle_dir, con)
+            self.assertEqual(self._comprehend(1, bundle_dir), self._rows(con))
+            self.assertNotEqual(original, self._rows(con))
+            con.close()
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+
+class ResolutionTestCase(unittest.TestCase):
+    """Test resolution of inter-label references"""
+
+    def test_resolution(self):
+        """Ensure each reachable label comes up once, even with cycles and lid-only references"""
+        con = sqlite3.connect(":memory:")
+        createschema(con)
+        con.executemany(
+            "INSERT INTO labels (lid, vid) VALUES (?,?)", [("b", "1"), ("c", "10.0"), ("c", "2.0"), ("d", "1")]
+        )
+        con.executemany(
+            "INSERT INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES (?,?,?,?)",
+            [("b", "1", "c", None), ("b", "1", "d", "1"), ("c", "10.0", "d", "1"), ("d", "1", "b", "1")],
+        )
+        self.assertEqual([("b", "1"), ("c", "10.0"), ("d", "1")], resolvelabels(con, "b", "1", False))
+        self.assertEqual([("b", "1"), ("c", "10.0"), ("c", "2.0"), ("d", "1")], resolvelabels(con, "b", "1", True))
+        _updatelatestversions(con)
+        self.assertEqual([("", "c", "10.0")], con.execute("SELECT * FROM latest_versions WHERE lid = 'c'").fetchall())
+        self.assertEqual([("b", "1"), ("c", "10.0"), ("d", "1")], resolvelabels(con, "b", "1", False))
+        con.close()
+
+    def test_rooted_resolution(self):
+        """Ensure resolving within a root ignores versions whose labels are elsewhere"""
+        con = sqlite3.connect(":memory:")
+        createschema(con)
+        con.executemany(
+            "INSERT INTO catalog_labels (labelpath, size, mtime_ns, lid, vid) VALUES (?,0,0,?,?)",
+            [("/v1/b.xml", "b", "1"), ("/v1/c.xml", "c", "1.0"), ("/v2/b.xml", "b", "2"), ("/v2/c.xml", "c", "2.0")],
+        )
+        con.executemany(
+            "INSERT INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES (?,?,?,?)",
+            [("b", "1", "c", None), ("b", "2", "c", None)],
+        )
+        self.assertEqual([("b", "1"), ("c", "1.0")], resolvelabels(con, "b", "1", False, "/v1"))
+        self.assertEqual([("b", "2"), ("c", "2.0")], resolvelabels(con, "b", "2", True, "/v2"))
+        con.close()
+
+    def test_rooted_latest_versions(self):
+        """Ensure resolving within a bundle's directory gets latest versions from ``latest_versions``"""
+        con = sqlite3.connect(":memory:")
+        createschema(con)
+        con.executemany(
+            "INSERT INTO catalog_labels (labelpath, size, mtime_ns, lid, vid, roottag) VALUES (?,0,0,?,?,?)",
+            [
+                ("/v1/b.xml", "b", "1", PRODUCT_BUNDLE_TAG),
+                ("/v1/c/c.xml", "c", "1.0", PRODUCT_COLLECTION_TAG),
+                ("/v1/c/c2.xml", "c", "1.10", PRODUCT_COLLECTION_TAG),
+                ("/v2/b.xml", "b", "2", PRODUCT_BUNDLE_TAG),
+                ("/v2/c.xml", "c", "2.0", PRODUCT_COLLECTION_TAG),
+            ],
+        )
+        con.execute("INSERT INTO labels (lid, vid) SELECT lid, vid FROM catalog_labels")
+        con.execute("INSERT INTO inter_label_references (lid, vid, to_lid, to_vid) VALUES ('b', '1', 'c', NULL)")
+        _updatelatestversions(con)
+        self.assertEqual(
+            [("", "c", "2.0"), ("/v1", "c", "1.10"), ("/v2", "c", "2.0")],
+            con.execute("SELECT root, lid, vid FROM latest_versions WHERE lid = 'c' ORDER BY root").fetchall(),
+        )
+        statements = []
+        con.set_trace_callback(statements.append)
+        self.assertEqual([("b", "1"), ("c", "1.10")], resolvelabels(con, "b", "1", False, "/v1"))
+        self.assertTrue(any("latest_versions" in i for i in statements))
+        self.assertFalse(any("catalog_labels" in i for i in statements))
+
+        # Anywhere else, or for every version, it's back to the labels under the root
+        statements.clear()
+        self.assertEqual([("b", "1"), ("c", "1.10")], resolvelabels(con, "b", "1", False, "/v1/c"))
+        self.assertTrue(any("catalog_labels" in i for i in statements))
+        self.assertEqual([("b", "1"), ("c", "1.0"), ("c", "1.10")], resolvelabels(con, "b", "1", True, "/v1"))
+        con.close()
+
+    def test_single_bundle_latest_versions(self):
+        """Ensure making an AIP of a bundle alone uses ``latest_versions`` rather than sorting versions itself"""
+        dn, cwd = tempfile.mkdtemp(), os.getcwd()
+        bundlefile = os.path.join(os.path.dirname(__file__), "data", "ladee_test", "mission_bundle", "LADEE_Bundle_1101.xml")
+        con = sqlite3.connect(":memory:")
+        try:
+            createschema(con)
+            comprehenddirectory(os.path.dirname(os.path.abspath(bundlefile)), con)
+            statements = []
+            con.set_trace_callback(statements.append)
+            os.chdir(dn)
+            with open(bundlefile, "rb") as bundle:
+                produce_aip(bundle, False, con, datetime.datetime(2026, 1, 1))
+            self.assertTrue(any("FROM latest_versions" in i for i in statements))
+            self.assertFalse(any("FROM catalog_labels" in i for i in statements))
+        finally:
+            os.chdir(cwd)
+            con.close()
+            shutil.rmtree(dn, ignore_errors=True)
+
+    def test_shared_catalog(self):
+        """Ensure a catalog shared by two copies of a bundle gives each only its own files"""
+        dn, cwd = tempfile.mkdtemp(), os.getcwd()
+        source = os.path.join(os.path.dirname(__file__), "data", "ladee_test", "mission_bundle")
+        con = sqlite3.connect(os.path.join(dn, "catalog.sqlite3"))
+        try:
+            createschema(con)
+            for copy in ("a", "b"):
+                shutil.copytree(source, os.path.join(dn, copy, "mission_bundle"))
+                comprehenddirectory(os.path.join(dn, copy, "mission_bundle"), con)
+            os.chdir(dn)
+            with open(os.path.join(dn, "b", "mission_bundle", "LADEE_Bundle_1101.xml"), "rb") as bundle:
+                chksumfn = produce_aip(bundle, True, con, datetime.datetime(2026, 1, 1))[0]
+                bundle.seek(0)
+                ts = datetime.datetime(2026, 1, 1)
+                sipfn = produce_sip(bundle, "md5", None, False, "PDS_ATM", "file:/", None, True, con, ts)[0]
+            for fn in (chksumfn, sipfn):
+                with open(fn, "rb") as f:
+                    self.assertEqual(13, len(f.readlines()))
+        finally:
+            os.chdir(cwd)
+            con.close()
+            shutil.rmtree(dn, ignore_errors=True)
+
+    def test_bundle_discovery(self):
+        """Ensure bundles get found under a root"""
+        test_dir = os.path.dirname(__file__)
+        root = os.path.join(test_dir, "data", "ladee_test")
+        con = sqlite3.connect(":memory:")
+        createschema(con)
+        comprehenddirectory(root, con)
+        self.assertEqual([os.path.join(root, "mission_bundle", "LADEE_Bundle_1101.xml")], findbundles(con, root))
+        con.close()
+
+    def test_duplicate_bundles(self):
+        """Ensure bundles sharing a lidvid are caught before they overwrite each other's archives"""
+        dn = tempfile.mkdtemp()
+        source = os.path.join(os.path.dirname(__file__), "data", "ladee_test", "mission_bundle")
+        con = sqlite3.connect(":memory:")
+        try:
+            createschema(con)
+            for copy in ("a", "b"):
+                shutil.copytree(source, os.path.join(dn, copy, "mission_bundle"))
+            comprehenddirectory(dn, con)
+            found = findbundles(con, dn)
+            self.assertEqual(2, len(found))
+            bundles = [open(i, "rb") for i in found]
+            try:
+                self.assertEqual({"urn:nasa:pds:ladee_mission_bundle::1.0": found}, _duplicatebundles(con, bundles))
+                self.assertEqual({}, _duplicatebundles(con, bundles[:1]))
+            finally:
+                for bundle in bundles:
+                    bundle.close()
+        finally:
+            con.close()
+            shutil.rmtree(dn, ignore_errors=True)
+
+    def test_catalog_migration(self):
+        """Ensure a catalog from before root tags were noted gets every label re-parsed"""
+        con = sqlite3.connect(":memory:")
+        con.execute(
+            "CREATE TABLE catalog_labels (labelpath text PRIMARY KEY, size integer NOT NULL,"
+            " mtime_ns integer NOT NULL, lid text, vid text)"
+        )
+        con.execute("INSERT INTO catalog_labels VALUES ('/b/bundle.xml', 1, 2, 'urn:nasa:pds:b', '1.0')")
+        createschema(con)
+        self.assertEqual([(-1, None)], con.execute("SELECT mtime_ns, roottag FROM catalog_labels").fetchall())
+        createschema(con)  # And only once
+        self.assertEqual(1, con.execute("SELECT count(*) FROM catalog_labels").fetchone()[0])
+        con.close()
+
+    def test_outermost_directories(self):
+        """Ensure batch mode catalogs each bundle directory once, and not their common parent"""
+        dirs = ["/data/a/bundle", "/mnt/b/bundle", "/data/a/bundle/nested", "/data/a/bundle-2", "/mnt/b/bundle"]
+        self.assertEqual(["/data/a/bundle", "/data/a/bundle-2", "/mnt/b/bundle"], _outermostdirectories(dirs))
+
+    def test_version_ordering(self):
+        """Ensure version IDs sort numerically"""
+        self.assertEqual(["1.0", "1.9", "1.10", "2.0", "10.0"], sorted(["10.0", "1.10", "2.0", "1.0", "1.9"], key=versionkey))
+
+
 class ArgumentTestCase(unittest.TestCase):
     """Test command-line argument parsing"""
 
@@ -107,6 +751,19 @@ class ArgumentTestCase(unittest.TestCase):
         self.assertEqual(logging.WARNING, parser.parse_args(["--quiet"]).loglevel)
         self.assertRaises(ValueError, parser.parse_args, ["--debug", "--quiet"])
 
+    def test_progress_arguments(self):
+        """Ensure the progress interval has to be a positive number"""
+        class NonExitingArgumentParser(argparse.ArgumentParser):
+            def exit(self, status=0, message=None):
+                raise ValueError("Bad args")
+
+        parser = NonExitingArgumentParser(usage="")
+        addprogressarguments(parser)
+        self.assertEqual(PROGRESS_INTERVAL, parser.parse_args([]).progress_interval)
+        self.assertEqual(0.5, parser.parse_args(["--progress-interval", "0.5"]).progress_interval)
+        for bad in ("0", "-1", "nan", "soon"):
+            self.assertRaises(ValueError, parser.parse_args, ["--progress-interval", bad])
+
 
 # https://github.com/NASA-PDS/pds-deep-archive/issues/102
 class URLValidatorTest(unittest.TestCase):